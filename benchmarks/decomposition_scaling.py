@@ -0,0 +1,57 @@
+""" Scaling of add_decomposed_ts over 1 to N cores, with worker processes (n_jobs) and scipy.fft threads (workers).
+Checks that every parallel result is identical to the serial one.
+
+    python -m benchmarks.decomposition_scaling --columns 240 --years 5
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.helpers.fft import add_decomposed_ts
+
+
+def synthetic_frame(n_columns, n_years, seed=0):
+    """ Random hourly frame with (region, variable) columns, shaped like the PECD data. """
+    rng = np.random.default_rng(seed)
+    n = n_years * 8760
+    index = pd.date_range('1982-01-01', periods=n, freq='h')
+    variables = ['load', 'pv', 'onshore', 'offshore']
+    regions = [f'R{i:03d}' for i in range(int(np.ceil(n_columns / len(variables))))]
+    columns = pd.MultiIndex.from_product([regions, variables], names=['region', 'variable'])[:n_columns]
+    return pd.DataFrame(rng.random((n, len(columns))), index=index, columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--columns', type=int, default=240)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--max-cores', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.columns, args.years)
+    print(f"{df.shape[1]} columns x {df.shape[0]} hours, {os.cpu_count()} cores available")
+    reference = add_decomposed_ts(df)
+    cores = sorted({1, 2, 4, 8, 16, 32, args.max_cores} & set(range(1, args.max_cores + 1)))
+    print(f"{'cores':>5} {'n_jobs [s]':>11} {'speedup':>8} {'workers [s]':>12} {'speedup':>8}")
+    serial = None
+    for k in cores:
+        timings = []
+        for kwargs in ({'n_jobs': k}, {'workers': k}):
+            best = np.inf
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = add_decomposed_ts(df, **kwargs)
+                best = min(best, time.perf_counter() - start)
+            if not np.array_equal(result.values, reference.values):
+                raise AssertionError(f"{kwargs} differs from the serial result")
+            timings.append(best)
+        serial = serial or timings[0]
+        print(f"{k:>5} {timings[0]:>11.2f} {serial / timings[0]:>8.2f} {timings[1]:>12.2f} {serial / timings[1]:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+""" Import-time budget of the core modules. Every module is imported in a fresh interpreter; the best wall time of
+--repeat imports is compared against its budget and the modules it pulled in are checked against the heavy modules
+it must not import (the UI and plotting requirements, pandas and scipy for the array-only decomposition used by the
+worker processes). Exceeding a budget or importing a forbidden module makes the run fail.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 5 --budget-factor 2 --output import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+UI = ['ipywidgets', 'IPython', 'plotly', 'anywidget']
+HEAVY = UI + ['pandas', 'scipy', 'openpyxl']
+
+# module -> budget in seconds (on top of the interpreter start) and the modules it must not import
+BUDGETS = {
+    'src.helpers': {'seconds': 0.05, 'forbidden': HEAVY + ['numpy']},
+    'src.pecd_handling': {'seconds': 0.05, 'forbidden': HEAVY + ['numpy']},
+    'src.pipeline': {'seconds': 0.05, 'forbidden': HEAVY + ['numpy']},
+    'src.dashboards': {'seconds': 0.05, 'forbidden': HEAVY + ['numpy']},
+    'src.helpers.fft': {'seconds': 0.25, 'forbidden': HEAVY},
+    'src.helpers.parallel_fft': {'seconds': 0.25, 'forbidden': HEAVY},
+    'src.helpers.flex_requirements': {'seconds': 1.0, 'forbidden': UI + ['scipy', 'openpyxl']},
+    'src.helpers.energy_yield': {'seconds': 1.0, 'forbidden': UI + ['scipy', 'openpyxl']},
+    'src.pecd_handling.pecd_import': {'seconds': 1.0, 'forbidden': UI + ['scipy', 'openpyxl']},
+    'src.pecd_handling.aggregation': {'seconds': 1.0, 'forbidden': UI + ['scipy', 'openpyxl']},
+    'src.pipeline.runner': {'seconds': 1.0, 'forbidden': UI + ['scipy', 'openpyxl']},
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module, repeat=3):
+    """ Imports module in repeat fresh interpreters (from the repository root).
+    :param module: str
+    :param repeat: int
+    :return: dict (seconds: best wall time of the import, modules: top-level packages loaded by it)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best, modules = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module)], cwd=root, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best = result['seconds'] if best is None else min(best, result['seconds'])
+        modules = sorted({m.split('.')[0] for m in result['modules']})
+    return {'seconds': best, 'modules': modules}
+
+
+def check_budgets(budgets=None, repeat=3, budget_factor=1.0):
+    """
+    :param budgets: dict (see BUDGETS)
+    :param repeat: int
+    :param budget_factor: float (scales all time budgets, e.g. for slow machines)
+    :return: dict (module -> seconds, budget, forbidden modules that were imported, ok)
+    """
+    results = {}
+    for module, budget in (budgets or BUDGETS).items():
+        measured = measure_import(module, repeat)
+        seconds = budget['seconds'] * budget_factor
+        imported = [m for m in budget['forbidden'] if m in measured['modules']]
+        results[module] = {'seconds': measured['seconds'], 'budget': seconds, 'forbidden_imported': imported,
+                           'ok': measured['seconds'] <= seconds and not imported}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', choices=sorted(BUDGETS), help='default: all')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget-factor', type=float, default=1.0)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args(argv)
+
+    budgets = {m: BUDGETS[m] for m in args.modules} if args.modules else BUDGETS
+    results = check_budgets(budgets, args.repeat, args.budget_factor)
+    for module, r in results.items():
+        note = f"imports {', '.join(r['forbidden_imported'])}" if r['forbidden_imported'] else ''
+        print(f"{module:<32} {r['seconds'] * 1e3:8.1f} ms  (budget {r['budget'] * 1e3:6.0f} ms)  "
+              f"{'ok' if r['ok'] else 'FAILED'}  {note}".rstrip())
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r['ok'] for r in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
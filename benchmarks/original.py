@@ -0,0 +1,219 @@
+""" The original implementations of the project (baseline commit), vendored verbatim so that the benchmark suite can
+check the fast paths against them and record a baseline of the original code (python -m benchmarks.suite --original).
+Only the data preparation of the dashboards is taken out of their plot methods. Two changes keep the code running
+with pandas 3: `axis=0` is dropped from groupby, and values are written with `.iloc[:, :] =` instead of through
+`.values`, which is read-only with copy-on-write. Nothing here is used by src.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.stats as st
+from scipy.fftpack import rfft, irfft, rfftfreq
+
+
+# --- src/pecd_handling/pecd_import.py --- #
+
+def read_pecd_xls_file(path):
+    """ Reads one xls file in the PECD format and combines all sheets to a dataframe.
+    :param path: str (file should be in folder)
+    :return: pd.DataFrame
+    """
+    print("Now opening file:", path)
+    csv_filepath = path.replace('.xlsx', '.csv')
+    # pickle_filepath = path.replace('.xlsx', '.pkl')
+    if os.path.isfile(csv_filepath):
+        print("Cached .csv version found, this import will be fast.")
+        df = pd.read_csv(csv_filepath, index_col=0, header=[0], parse_dates=True)
+        df.columns.name = 'region'
+    else:
+        print("Seems like you are importing for the first time, this may take up to an hour. "
+              "Future imports will be faster as we are storing a .csv version.")
+        start_time = time.time()
+        xls = pd.read_excel(path, sheet_name=None, skiprows=10)
+        print(f"File {path} took {(time.time() - start_time)/60:.1f} minutes to load")
+        for sheet in list(xls.keys()):
+            # Let's drop sheets that are empty (some PECD zones are empty in the DB)
+            if xls[sheet].dropna().empty or sheet in []:  # list of sheetnames that do not contain PECD timeseries.
+                del xls[sheet]
+        regions = xls.keys()
+        df = pd.concat([sheet_to_series(xls[r]) for r in regions], keys=[r for r in regions], names=['region'], axis=1)
+        df.to_csv(csv_filepath)
+    return df
+
+
+def sheet_to_series(sheet):
+    """ Turns one sheet of a PECD excel file into a pandas Series with datetime index.
+    :param sheet: pd.DataFrame
+    :return: pd.Series
+    """
+    sheet[['day', 'month']] = sheet.Date.str.split(".", n=1, expand=True)
+    sheet.month = sheet.month.str.split('.').str[0]#.strip('.')
+    sheet.dropna(inplace=True)
+    sheet.drop(labels=['Date'], axis=1, inplace=True)
+    sheet.rename(columns={'Hour': 'hour'}, inplace=True)
+    sheet['hour'] = sheet['hour'].astype(int) - 1
+    sheet = sheet.set_index(['month', 'day', 'hour'])
+    sheet.columns.name = 'year'
+    sheet = sheet.stack('year')
+    sheet = sheet.reorder_levels(['year', 'month', 'day', 'hour'])
+    sheet.index = pd.to_datetime(pd.DataFrame(sheet.index.to_list(), columns=sheet.index.names)).values
+    sheet = sheet.sort_index()
+    return sheet
+
+
+# --- src/helpers/fft.py --- #
+
+# Add default frequency cuts in unit hours, define labels along with it
+# two-element list of hourly cuts (e.g. 5-24 hrs)
+DURATION_CUTS = {
+    'seasonally':   (1*30*24,   1e6),
+    'monthly':      (7*24,      1*30*24),
+    'weekly':       (24,        7*24),
+    'daily':        (4,         24),
+    'hourly':       (0.25,      4),
+}
+
+
+def add_decomposed_ts(df, duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True):
+    """
+    Applies Fourier and appends a level to the dataframe with the decomposed time-series in the defined duration cuts.
+    Removes the DC component (mean) before applying Fourier.
+    :param df: pd.DataFrame (time-series dataframe)
+    :param duration_cuts: dict
+    :param remove_dc: bool
+    :return: pd.DataFrame
+    """
+    if accumulate_spectra:
+        _max = max(i[1] for i in DURATION_CUTS.values())
+        duration_cut_values = [(i[0], _max) for i in DURATION_CUTS.values()]
+    else:
+        duration_cut_values = list(duration_cuts.values())
+    freq_cuts = set_frequency_spectrum(duration_cut_values)
+    temp = df.copy()
+    temp.iloc[:, :] = rfft(df.subtract(df.mean()).values, axis=0)
+
+    dc_component = 0 if remove_dc else df.mean()
+    d = {
+        k: process_freq_cut(temp, freq_cuts[i]) + dc_component
+        for i, k in enumerate(duration_cuts.keys())
+    }
+    d.update({f'raw_data': df})
+    dff = pd.concat(d, names=['spectrum'], axis=1)
+    lvl_order = list(dff.columns.names)
+    lvl_order.remove('spectrum')
+    lvl_order.append('spectrum')  # So that spectrum is the last level in the dataframe
+    dff = dff.reorder_levels(lvl_order, axis=1).sort_index(axis=1)
+    return dff
+
+
+def process_freq_cut(df, freq_cut):
+    """
+    Cut a time series dataframe into the freq_cut.
+    :param df: pd.DataFrame
+    :param freq_cut: np.ndarray (shape (2, )) lower and upper cut
+    :return: pd.DataFrame
+    """
+    dT = 3600  # seconds of one time step
+    n = len(df)  # window size
+    freq = rfftfreq(n, dT)  # frequency vector for fft
+
+    temp = df.copy()
+    temp[abs(freq) < freq_cut[0]] = 0
+    temp[abs(freq) > freq_cut[1]] = 0
+    temp.iloc[:, :] = irfft(temp.values, axis=0)
+    return temp
+
+
+def set_frequency_spectrum(duration_cuts, verbose=True):
+    """
+    Translates duration cuts into frequency cuts
+    :param duration_cuts: list of 2-elements tuples
+    :return:
+    """
+    """
+
+    Parameters
+    ----------
+    duration_cuts : list/bool
+        list of duration cuts (each a 2-element list) in hours
+    """
+    dT = 3600  # seconds of one time step
+    freq_cuts = np.sort(1/(2.*np.array(duration_cuts))/dT)  # Hz
+    if np.max(duration_cuts) >= 1e6:
+        freq_cuts[freq_cuts == np.min(freq_cuts)] = 0
+    if verbose:
+        print(f"In total: {len(freq_cuts)} frequency cuts have been created")
+    return freq_cuts
+
+
+# --- src/helpers/time_model.py --- #
+
+def datetime_index_to_hour_of_year(df):
+    dff = df.copy()
+    ref = pd.Timestamp('2018-01-01 00:00:00')
+    dff.loc[:, 'year'] = dff.index.year
+    hour_of_year = lambda x: (x.replace(year=2018) - ref).total_seconds() / 3600
+    dff.loc[:, 'hour_of_year'] = dff.index.map(hour_of_year).astype(int) + 1
+    dff = dff.set_index(['year', 'hour_of_year'])
+    return dff
+
+
+# --- src/helpers/confidence_interval.py --- #
+
+def upper_ci(x):
+    return st.t.interval(0.95, len(x) - 1, loc=np.mean(x), scale=st.sem(x))[1]
+
+
+def lower_ci(x):
+    return st.t.interval(0.95, len(x) - 1, loc=np.mean(x), scale=st.sem(x))[0]
+
+
+upper_ci.__name__ = 'upper_ci'
+lower_ci.__name__ = 'lower_ci'
+
+
+# --- src/dashboards/flex_req.py, data preparation of FlexibilityRequirementDashboard --- #
+
+DEFAULT_PERCENTILES = list(range(0, 80, 5)) + list(range(80, 101, 1))
+
+
+def percentile_func(percentile):
+    filtr = lambda x: np.where(x <= 0, x, np.nan)
+    perc = lambda x: np.nanpercentile(np.abs(filtr(x)), percentile)
+    return perc
+
+
+def flexibility_requirements(data):
+    data = datetime_index_to_hour_of_year(data)
+    _cols = data.columns.names
+    _percentile_aggregation = [(p, percentile_func(p)) for p in DEFAULT_PERCENTILES]
+    data = data.groupby(level='year').agg(_percentile_aggregation)
+    data.columns.names = _cols + ['percentile']
+    data = data.stack('percentile')
+    return data
+
+
+def percentile_confidence_interval(data):
+    agg = [upper_ci, 'mean', lower_ci]
+    _cols = data.columns.names
+    data = data.groupby(level='percentile').agg(agg)
+    data.columns.names = _cols + ['aggregation']
+    return data
+
+
+# --- src/dashboards/time_series.py, data preparation of TimeSeriesDashboard --- #
+
+def hour_of_year_aggregation(data, agg):
+    data = datetime_index_to_hour_of_year(data)
+    _cols = list(data.columns.names)
+    data = data.groupby(level='hour_of_year').agg(agg)
+    data.columns.names = _cols + ['aggregation']
+    return data
+
+
+# --- src/dashboards/energy_yield.py, data preparation of EnergyYieldDashboard --- #
+
+def annualized_energy_yield(data):
+    return data.sum() / 1e6 / len(data) * 8760
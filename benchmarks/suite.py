@@ -0,0 +1,437 @@
+""" Offline benchmark suite of the import, the decomposition and the aggregations behind the dashboards.
+Every case runs in a fresh process and reports the best wall time of --repeat runs, the peak resident memory of the
+run and the throughput (MB of input values per second). Before timing, the result of every case is checked against
+the original code of the project (benchmarks.original) on a few columns; --original times the original code instead.
+The results are written as JSON and, if a baseline is given, compared against it: cases that are slower or need
+more memory than the baseline (beyond the tolerances) or that fail the numerical check make the run fail.
+
+    python -m benchmarks.suite --scale small --original --output baseline.json
+    python -m benchmarks.suite --scale small --baseline baseline.json --tolerance 0.25
+    python -m benchmarks.suite --zones 50 --variables 4 --years 35 --cases decomposition flexibility_requirements
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pecd_sample')
+SAMPLE_FILES = {
+    'load': 'MAF2020_DemandTimeSeries_2030.csv',
+    'pv': 'PECD_2030_PV.csv',
+    'onshore': 'PECD_2030_Onshore.csv',
+    'offshore': 'PECD_2030_Offshore.csv',
+}
+SCALES = {  # (zones, variables, climate years), 'sample' uses data/pecd_sample
+    'sample': None,
+    'small': (10, 4, 5),
+    'medium': (50, 4, 10),
+    'large': (100, 4, 35),
+}
+IMPORT_ZONES = 10  # zones (sheets) of the synthetic excel file of the import cases
+CHECK_COLUMNS = 8  # columns checked against the original code
+RTOL = 1e-9  # relative tolerance of the numerical checks (float32 results: 1e-6)
+MIN_SECONDS = 0.02  # slowdowns below this are timer noise, whatever the ratio
+
+
+def load_sample():
+    """ data/pecd_sample as (region, variable) frame. """
+    from src.pecd_handling import read_pecd_xls_file
+    frames = {}
+    for variable, file_name in SAMPLE_FILES.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            frames[variable] = read_pecd_xls_file(os.path.join(SAMPLE_DIR, file_name), cache=None)
+    df = pd.concat(frames, names=['variable'], axis=1)
+    return df.reorder_levels(['region', 'variable'], axis=1).sort_index(axis=1)
+
+
+def make_data(scale):
+    """ :param scale: dict (zones, variables, years or sample) :return: pd.DataFrame """
+    if scale.get('sample'):
+        return load_sample()
+    from .synthetic import pecd_frame
+    return pecd_frame(scale['zones'], scale['variables'], scale['years'])
+
+
+# Every case: setup(data, tmp_dir) -> inputs (not timed), run(inputs) -> result (timed),
+# original(inputs) -> result of the original code, both checked on the first CHECK_COLUMNS columns
+# (check_inputs(inputs) -> inputs with few columns, checked(result) -> the part of the result the original computes),
+# and the number of input bytes for the throughput.
+
+def _columns(df, n):
+    return df.iloc[:, :n]
+
+
+def _clear_time_models():
+    """ The TimeModel of an index is cached (see get_time_model), every timed run starts without it. """
+    from src.helpers import time_model
+    del time_model._TIME_MODELS[:]
+
+
+def _setup_excel(data, tmp_dir, cached=False):
+    from src.pecd_handling import read_pecd_xls_file
+    from .synthetic import write_pecd_excel
+    variable = 'pv' if 'pv' in data.columns.get_level_values('variable') else data.columns[0][1]
+    regions = data.xs(variable, axis=1, level='variable').iloc[:, :IMPORT_ZONES]
+    path = os.path.join(tmp_dir, f"pecd_{'cached' if cached else 'excel'}.xlsx")
+    write_pecd_excel(path, regions)
+    if cached:
+        from . import original
+        read_pecd_xls_file(path, cache='npy')
+        original.read_pecd_xls_file(path)  # its .csv cache
+    return {'path': path, 'nbytes': regions.to_numpy().nbytes}
+
+
+def _run_import(inputs, cache=None):
+    from src.pecd_handling import read_pecd_xls_file
+    return read_pecd_xls_file(inputs['path'], cache=cache)
+
+
+def _original_import(inputs):
+    """ The original import stores a .csv next to the file (part of its cost), which later runs would read. """
+    from . import original
+    df = original.read_pecd_xls_file(inputs['path'])
+    os.remove(os.path.splitext(inputs['path'])[0] + '.csv')
+    return df
+
+
+def _original_import_cached(inputs):
+    from . import original
+    return original.read_pecd_xls_file(inputs['path'])
+
+
+def _run_decomposition(inputs, **kwargs):
+    from src.helpers import add_decomposed_ts
+    return add_decomposed_ts(inputs['df'], **kwargs)
+
+
+def _run_windowed_decomposition(inputs, **kwargs):
+    from src.helpers import windowed_decomposition
+    _clear_time_models()
+    return windowed_decomposition(inputs['df'], **kwargs)
+
+
+def _run_hour_of_year(inputs):
+    from src.helpers import datetime_index_to_hour_of_year
+    _clear_time_models()
+    return datetime_index_to_hour_of_year(inputs['df'])
+
+
+def _run_flexibility_requirements(inputs):
+    from src.helpers import flexibility_requirements
+    from src.helpers.flex_requirements import DEFAULT_PERCENTILES
+    _clear_time_models()
+    return flexibility_requirements(inputs['df'], DEFAULT_PERCENTILES)
+
+
+def _setup_confidence_interval(data, tmp_dir):
+    from src.helpers import flexibility_requirements
+    df = flexibility_requirements(data)
+    return {'df': df, 'nbytes': df.to_numpy().nbytes}
+
+
+def _run_confidence_interval(inputs):
+    from src.helpers import grouped_confidence_interval
+    return grouped_confidence_interval(inputs['df'], level='percentile')
+
+
+def _run_hour_of_year_aggregation(inputs):
+    from src.helpers.time_model import aggregate_by_hour_of_year
+    _clear_time_models()
+    return aggregate_by_hour_of_year(inputs['df'], confidence_interval=True)
+
+
+def _run_energy_yields(inputs):
+    from src.helpers import energy_yields
+    _clear_time_models()
+    return energy_yields(inputs['df'])
+
+
+def _original(name, *args):
+    def run(inputs):
+        from . import original
+        return getattr(original, name)(inputs['df'], *args)
+    return run
+
+
+def _original_per_year(inputs):
+    """ The original decomposition applied to every climate year on its own. """
+    from . import original
+    df = inputs['df']
+    return pd.concat([original.add_decomposed_ts(year) for _, year in df.groupby(df.index.year)])
+
+
+def _original_hour_of_year_aggregation(inputs):
+    from . import original
+    return original.hour_of_year_aggregation(inputs['df'], [original.upper_ci, 'mean', original.lower_ci])
+
+
+def _with_mean_bounds(original):
+    """ Applies the one intended change of the confidence intervals to the result of the original code: groups without
+    variance get upper_ci == lower_ci == mean in src.helpers, scipy (and the original code) returns nan bounds. """
+    def run(inputs):
+        data = original(inputs)
+        aggregation = data.columns.get_level_values('aggregation')
+        values = data.to_numpy(dtype=np.float64, copy=True)
+        mean = values[:, aggregation == 'mean']
+        for bound in ('upper_ci', 'lower_ci'):
+            columns = aggregation == bound
+            values[:, columns] = np.where(np.isnan(values[:, columns]), mean, values[:, columns])
+        return pd.DataFrame(values, index=data.index, columns=data.columns)
+    return run
+
+
+def _setup_frame(data, tmp_dir):
+    return {'df': data, 'nbytes': data.to_numpy().nbytes}
+
+
+def _check_frame_columns(inputs):
+    return dict(inputs, df=_columns(inputs['df'], CHECK_COLUMNS))
+
+
+CASES = {
+    'import_excel': {
+        'setup': _setup_excel, 'run': _run_import, 'original': _original_import,
+    },
+    'import_cached': {
+        'setup': lambda data, tmp_dir: _setup_excel(data, tmp_dir, cached=True),
+        'run': lambda inputs: _run_import(inputs, cache='npy'), 'original': _original_import_cached,
+    },
+    'decomposition': {
+        'setup': _setup_frame, 'run': _run_decomposition, 'original': _original('add_decomposed_ts'),
+        'check_inputs': _check_frame_columns,
+    },
+    'decomposition_compact': {
+        'setup': _setup_frame, 'run': lambda inputs: _run_decomposition(inputs, compact=True),
+        'original': _original('add_decomposed_ts'), 'check_inputs': _check_frame_columns, 'rtol': 1e-6,
+    },
+    'decomposition_per_year': {
+        'setup': _setup_frame, 'run': lambda inputs: _run_windowed_decomposition(inputs, window='year'),
+        'original': _original_per_year, 'check_inputs': _check_frame_columns,
+    },
+    'hour_of_year': {
+        'setup': _setup_frame, 'run': _run_hour_of_year, 'original': _original('datetime_index_to_hour_of_year'),
+        'check_inputs': _check_frame_columns,
+    },
+    'flexibility_requirements': {
+        'setup': _setup_frame, 'run': _run_flexibility_requirements, 'original': _original('flexibility_requirements'),
+        'check_inputs': _check_frame_columns,
+    },
+    'confidence_interval': {
+        'setup': _setup_confidence_interval, 'run': _run_confidence_interval,
+        'original': _with_mean_bounds(_original('percentile_confidence_interval')),
+        'check_inputs': _check_frame_columns,
+    },
+    'hour_of_year_aggregation': {
+        'setup': _setup_frame, 'run': _run_hour_of_year_aggregation,
+        'original': _with_mean_bounds(_original_hour_of_year_aggregation),
+        'check_inputs': lambda inputs: dict(inputs, df=_columns(inputs['df'], 1)),  # two scipy calls per hour
+        'original_repeat': 1,  # minutes per run
+    },
+    'energy_yields': {
+        'setup': _setup_frame, 'run': _run_energy_yields, 'original': _original('annualized_energy_yield'),
+        'check_inputs': _check_frame_columns, 'checked': lambda result: result[1],  # the original has no yearly sums
+    },
+}
+
+
+def compare_results(result, expected, rtol=RTOL):
+    """ Compares (tuples of) frames or series: same labels and values within rtol of the largest absolute value.
+    :return: dict (max_abs_error, ok)
+    """
+    if not isinstance(result, (tuple, pd.Series, pd.DataFrame)):  # e.g. CompactDecomposition
+        result = result.to_frame()
+    if isinstance(result, tuple):
+        checks = [compare_results(r, e, rtol) for r, e in zip(result, expected)]
+        return {'max_abs_error': max(c['max_abs_error'] for c in checks), 'ok': all(c['ok'] for c in checks)}
+    axes_equal = result.index.equals(expected.index) and \
+        (isinstance(result, pd.Series) or result.columns.equals(expected.columns))
+    if not axes_equal or result.shape != expected.shape:
+        return {'max_abs_error': None, 'ok': False}
+    a, b = result.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64)
+    if not np.array_equal(np.isnan(a), np.isnan(b)):
+        return {'max_abs_error': None, 'ok': False}
+    error = float(np.nanmax(np.abs(a - b), initial=0))
+    scale = float(np.nanmax(np.abs(b), initial=0))
+    return {'max_abs_error': error, 'ok': error <= rtol * max(scale, 1e-12)}
+
+
+def run_case(name, scale, repeat, check=True, original=False):
+    """ Worker: builds the data, checks the case against the original code and times it (or the original code).
+    :return: dict (seconds (best run), seconds_median, seconds_all, peak_rss_mb, rss_before_mb (resident memory with
+        the inputs), peak_children_rss_mb (largest worker process of the case, e.g. of the import), input_mb,
+        throughput_mb_s, check)
+    """
+    case = CASES[name]
+    if original:
+        run, check = case['original'], False
+        repeat = min(repeat, case.get('original_repeat', repeat))
+    else:
+        run = case['run']
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(io.StringIO()), \
+            warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # e.g. percentiles of columns without values <= 0
+        data = make_data(scale)
+        inputs = case['setup'](data, tmp_dir)
+        del data
+        if check:
+            check_inputs = case.get('check_inputs', lambda i: i)(inputs)
+            result = case.get('checked', lambda r: r)(run(check_inputs))
+            checked = compare_results(result, case['original'](check_inputs), case.get('rtol', RTOL))
+        else:
+            checked = None
+        seconds = []
+        peak = None
+        for _ in range(repeat):
+            reset_peak_rss()
+            rss_before = peak_rss_mb()
+            start = time.perf_counter()
+            result = run(inputs)
+            seconds.append(time.perf_counter() - start)
+            del result
+            peak = max(peak or 0, peak_rss_mb() or 0) or None
+    return {
+        'seconds': min(seconds),
+        'seconds_median': float(np.median(seconds)),
+        'seconds_all': seconds,
+        'peak_rss_mb': peak,
+        'rss_before_mb': rss_before,
+        'peak_children_rss_mb': peak_rss_mb(children=True),
+        'input_mb': inputs['nbytes'] / 2**20,
+        'throughput_mb_s': inputs['nbytes'] / 2**20 / min(seconds),
+        'check': checked,
+    }
+
+
+def reset_peak_rss():
+    """ Resets the peak resident memory of the process to its current value (Linux only), so the peak of every run
+    excludes the memory needed to build the inputs. """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb(children=False):
+    from src.helpers.instrumentation import peak_rss_mb
+    return peak_rss_mb(children)
+
+
+def run_suite(cases, scale, repeat=3, check=True, original=False):
+    """ Runs every case in a fresh process.
+    :param cases: list of str (see CASES)
+    :param scale: dict (zones, variables, years or sample)
+    :param repeat: int
+    :param check: bool (compare with the original code)
+    :param original: bool (time the original code instead, e.g. to record a baseline)
+    :return: dict (meta, cases)
+    """
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in cases:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results[name] = executor.submit(run_case, name, scale, repeat, check, original).result()
+        r = results[name]
+        status = '' if r['check'] is None else ('check ok' if r['check']['ok'] else 'CHECK FAILED')
+        if r['peak_children_rss_mb']:
+            status += f"  (workers {r['peak_children_rss_mb']:.0f} MB)"
+        print(f"{name:<26} {r['seconds']:>8.3f} s {r['peak_rss_mb'] or float('nan'):>8.0f} MB "
+              f"(+{(r['peak_rss_mb'] or 0) - (r['rss_before_mb'] or 0):>5.0f}) "
+              f"{r['throughput_mb_s']:>8.1f} MB/s  {status}")
+    meta = {
+        'scale': scale,
+        'code': 'original' if original else 'src',
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    return {'meta': meta, 'cases': results}
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25, memory_tolerance=0.25, min_seconds=MIN_SECONDS):
+    """ A case is slower if its best time exceeds the baseline by more than tolerance and by more than min_seconds.
+    :return: tuple (list of str report lines, bool whether all cases are within the tolerances)
+    """
+    ok = True
+    lines = [f"{'case':<26} {'time [s]':>9} {'baseline':>9} {'ratio':>6} {'RSS [MB]':>9} {'baseline':>9}  status"]
+    if results['meta']['scale'] != baseline['meta']['scale']:
+        lines.append(f"WARNING: baseline scale {baseline['meta']['scale']} differs from {results['meta']['scale']}")
+    for name, r in results['cases'].items():
+        b = baseline['cases'].get(name)
+        failed = r['check'] is not None and not r['check']['ok']
+        if b is None:
+            lines.append(f"{name:<26} {r['seconds']:>9.3f} {'-':>9} {'-':>6} {'-':>9} {'-':>9}  "
+                         f"{'CHECK FAILED' if failed else 'new'}")
+            ok &= not failed
+            continue
+        ratio = r['seconds'] / b['seconds']
+        status = []
+        if ratio > 1 + tolerance and r['seconds'] - b['seconds'] > min_seconds:
+            status.append('SLOWER')
+        if any(r.get(key) and b.get(key) and r[key] > b[key] * (1 + memory_tolerance)
+               for key in ('peak_rss_mb', 'peak_children_rss_mb')):
+            status.append('MORE MEMORY')
+        if failed:
+            status.append('CHECK FAILED')
+        ok &= not status
+        lines.append(f"{name:<26} {r['seconds']:>9.3f} {b['seconds']:>9.3f} {ratio:>6.2f} "
+                     f"{r['peak_rss_mb'] or float('nan'):>9.0f} {b['peak_rss_mb'] or float('nan'):>9.0f}  "
+                     f"{', '.join(status) or 'ok'}")
+    return lines, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=list(SCALES), default='small')
+    parser.add_argument('--zones', type=int, help='synthetic data: number of zones (overrides --scale)')
+    parser.add_argument('--variables', type=int, default=4, help='synthetic data: number of variables')
+    parser.add_argument('--years', type=int, default=5, help='synthetic data: number of climate years')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-check', action='store_true', help='skip the checks against the original code')
+    parser.add_argument('--original', action='store_true', help='time the original code (benchmarks.original)')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help='allowed relative peak RSS increase')
+    parser.add_argument('--min-difference', type=float, default=MIN_SECONDS,
+                        help='slowdowns below this many seconds are ignored')
+    args = parser.parse_args()
+
+    if args.zones:
+        scale = {'zones': args.zones, 'variables': args.variables, 'years': args.years}
+    elif SCALES[args.scale] is None:
+        scale = {'sample': True}
+    else:
+        scale = dict(zip(['zones', 'variables', 'years'], SCALES[args.scale]))
+    results = run_suite(args.cases, scale, repeat=args.repeat, check=not args.no_check, original=args.original)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    ok = all(r['check'] is None or r['check']['ok'] for r in results['cases'].values())
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines, ok = compare_to_baseline(results, json.load(f), args.tolerance, args.memory_tolerance,
+                                            args.min_difference)
+        print('\n'.join(lines))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
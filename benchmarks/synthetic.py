@@ -0,0 +1,88 @@
+""" Synthetic data shaped like the PECD time series: one column per (region, variable) and 8760 hours per climate
+year (no February 29, as in the PECD excel files). The number of zones, variables and climate years can be scaled
+freely, so the benchmarks run offline and at any size.
+"""
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from src.pecd_handling.pecd_import import PECD_HEADER_ROWS
+
+VARIABLES = ['load', 'pv', 'onshore', 'offshore']
+FIRST_YEAR = 1982
+HOURS_PER_YEAR = 8760
+
+
+def pecd_index(n_years, first_year=FIRST_YEAR):
+    """ Hourly index of n_years climate years with 8760 hours each, leap days are skipped.
+    :param n_years: int
+    :param first_year: int
+    :return: pd.DatetimeIndex
+    """
+    days = np.arange('2018-01-01', '2019-01-01', dtype='datetime64[D]')  # a year without February 29
+    month = days.astype('datetime64[M]') - days.astype('datetime64[Y]')
+    day = days - days.astype('datetime64[M]')
+    years = (np.arange(first_year, first_year + n_years) - 1970).astype('datetime64[Y]')
+    dates = (years[:, np.newaxis].astype('datetime64[M]') + month).astype('datetime64[D]') + day
+    hours = dates.astype('datetime64[h]')[:, :, np.newaxis] + np.arange(24).astype('timedelta64[h]')
+    return pd.DatetimeIndex(hours.ravel().astype('datetime64[ns]'))
+
+
+def pecd_frame(n_zones=10, n_variables=4, n_years=5, first_year=FIRST_YEAR, seed=0):
+    """ Random frame with (region, variable) columns: load in MW with daily, weekly and seasonal profiles, and
+    capacity factors in [0, 1] for pv (diurnal and seasonal) and wind (autocorrelated weather).
+    Variables beyond the four PECD ones repeat their generators ('pv_2', ...).
+    :param n_zones: int
+    :param n_variables: int
+    :param n_years: int
+    :param first_year: int
+    :param seed: int
+    :return: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    index = pecd_index(n_years, first_year)
+    variables = [VARIABLES[i % len(VARIABLES)] + (f'_{i // len(VARIABLES) + 1}' if i >= len(VARIABLES) else '')
+                 for i in range(n_variables)]
+    regions = [f'Z{i:03d}' for i in range(n_zones)]
+    columns = pd.MultiIndex.from_product([regions, variables], names=['region', 'variable'])
+
+    hour = np.arange(len(index)) % 24
+    day = np.arange(len(index)) // 24
+    season = np.cos(2 * np.pi * (day % 365) / 365)
+    values = np.empty((len(index), len(columns)), order='F')
+    for i, (_, variable) in enumerate(columns):
+        kind = variable.split('_')[0]
+        if kind == 'load':
+            base = rng.uniform(5e3, 6e4)
+            profile = 1 + 0.15 * np.sin(2 * np.pi * (hour - 8) / 24) - 0.1 * (day % 7 >= 5) + 0.15 * season
+            values[:, i] = base * (profile + 0.03 * rng.standard_normal(len(index)))
+        elif kind == 'pv':
+            sun = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None) * (0.7 - 0.3 * season)
+            values[:, i] = sun * rng.beta(5, 2, len(index))
+        else:
+            weather = lfilter([1], [1, -0.98], rng.standard_normal(len(index))) / 5
+            values[:, i] = 1 / (1 + np.exp(-(weather + 0.3 * season - (0.5 if kind == 'onshore' else 0))))
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def write_pecd_excel(path, df):
+    """ Writes a (time, region) frame as PECD excel file: one sheet per region with the header rows, 'Date' ('dd.mm.'),
+    'Hour' (1 to 24) and one column per climate year.
+    :param path: str (.xlsx)
+    :param df: pd.DataFrame (index as pecd_index, columns: regions)
+    """
+    import openpyxl
+    index = df.index[:HOURS_PER_YEAR]
+    years = np.unique(df.index.year)
+    dates = [f'{d:02d}.{m:02d}.' for d, m in zip(index.day, index.month)]
+    hours = index.hour + 1
+    wb = openpyxl.Workbook(write_only=True)
+    for region in df.columns:
+        ws = wb.create_sheet(str(region))
+        for i in range(PECD_HEADER_ROWS):
+            ws.append([f'synthetic PECD data, zone {region}'] if i == 0 else [])
+        ws.append(['Date', 'Hour'] + [int(y) for y in years])
+        table = df[region].to_numpy().reshape(len(years), HOURS_PER_YEAR).T
+        for date, hour, row in zip(dates, hours, table.tolist()):
+            ws.append([date, int(hour)] + row)
+    wb.save(path)
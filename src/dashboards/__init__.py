@@ -1,3 +1,10 @@
-from .time_series import TimeSeriesDashboard
-from .flex_req import FlexibilityRequirementDashboard
-from .energy_yield import EnergyYieldDashboard
+from src.helpers.lazy_imports import lazy_exports
+
+# name -> module, imported on first use (see src.helpers.lazy_imports), the dashboards need the UI requirements
+_EXPORTS = {
+    'TimeSeriesDashboard': '.time_series',
+    'FlexibilityRequirementDashboard': '.flex_req',
+    'EnergyYieldDashboard': '.energy_yield',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
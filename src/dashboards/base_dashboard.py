@@ -1,27 +1,34 @@
+from collections import OrderedDict
+
 import ipywidgets as widgets
+import pandas as pd
 from IPython.display import display, clear_output
 
 from src.helpers import Expando, detect_none_string
 from src.helpers.fft import DURATION_CUTS
+from src.helpers.instrumentation import get_logger, stage
+from src.helpers.time_model import get_time_model
+
+
+DEFAULT_RESULT_CACHE_BYTES = 256 * 2**20
+
+logger = get_logger(__name__)
 
 
 class DashboardBaseClass(object):
     """ This class is meant to be the base class for various dashboards based on the Fourier Decomposition df. """
-    def __init__(self, data_frame):
+    def __init__(self, data_frame, result_cache_bytes=DEFAULT_RESULT_CACHE_BYTES):
 
-        self.data_frame = data_frame
-
-        _cols = self.data_frame.columns
-        self.regions = list(sorted(_cols.get_level_values('region').unique()))
-        self.variables = list(sorted(_cols.get_level_values('variable').unique()))
+        # aggregated results per (dashboard type, column, aggregation), see _aggregate_selection
+        self.result_cache_bytes = result_cache_bytes
+        self._result_cache = OrderedDict()
+        self._result_cache_nbytes = 0
 
-        # Lets keep the order of DURATION_CUTS
-        _spectra = _cols.get_level_values('spectrum').unique()
-        self.spectra = [
-                           i for i in DURATION_CUTS.keys() if i in _spectra
-                       ] + [
-                           i for i in _spectra if i not in DURATION_CUTS.keys()
-                       ]
+        self.data_frame = data_frame
+        self.regions = None
+        self.variables = None
+        self.spectra = None
+        self.set_column_labels()
 
         self.output = widgets.Output()
 
@@ -53,6 +60,79 @@ class DashboardBaseClass(object):
 
         self.set_generic_control_widgets()
 
+    @property
+    def data_frame(self):
+        return self._data_frame
+
+    @data_frame.setter
+    def data_frame(self, data_frame):
+        """ Replacing the data invalidates all cached results. """
+        self._data_frame = data_frame
+        # (year, hour_of_year) of the time index, computed once and shared by all plots
+        self.time_model = get_time_model(data_frame.index)
+        self.clear_result_cache()
+
+    def set_column_labels(self):
+        """ Reads the regions, variables and spectra of the data. """
+        _cols = self.data_frame.columns
+        self.regions = list(sorted(_cols.get_level_values('region').unique()))
+        self.variables = list(sorted(_cols.get_level_values('variable').unique()))
+
+        # Lets keep the order of DURATION_CUTS
+        _spectra = _cols.get_level_values('spectrum').unique()
+        self.spectra = [
+                           i for i in DURATION_CUTS.keys() if i in _spectra
+                       ] + [
+                           i for i in _spectra if i not in DURATION_CUTS.keys()
+                       ]
+
+    def clear_result_cache(self):
+        self._result_cache.clear()
+        self._result_cache_nbytes = 0
+
+    def _aggregate_selection(self, aggregation, func):
+        """ Aggregated data of the selected regions, variables and spectra.
+        func is applied column-wise, so its results are cached per (dashboard type, column, aggregation) and only the
+        columns that have not been aggregated before are computed. Changing only the plot layout computes nothing.
+        :param aggregation: hashable (identifies the aggregation done by func, e.g. 'mean')
+        :param func: callable (pd.DataFrame -> pd.DataFrame with the same columns and an appended 'aggregation' level)
+        :return: pd.DataFrame
+        """
+        _cols = self.data_frame.columns
+        _key = (list(self.fig_regions), list(self.fig_variables), list(self.fig_spectra))
+        if hasattr(self.data_frame, 'column_positions'):  # e.g. CompactDecomposition (resolved with its axis maps)
+            positions = self.data_frame.column_positions(_key)
+        else:
+            positions = _cols.get_locs(_key)
+        keys = [(type(self).__name__, _cols[p], aggregation) for p in positions]
+        blocks = {}
+        for key in keys:
+            if key in self._result_cache:
+                self._result_cache.move_to_end(key)
+                blocks[key] = self._result_cache[key]
+        missing = [p for p, key in zip(positions, keys) if key not in blocks]
+        if missing:
+            with stage(f'{type(self).__name__}.aggregate', aggregation=str(aggregation), columns=len(missing),
+                       cached_columns=len(positions) - len(missing)):
+                result = func(self.data_frame.iloc[:, missing])
+            # split the result by column (all levels but the appended aggregation level), keeping its column order
+            result_positions = {}
+            for i, c in enumerate(result.columns):
+                result_positions.setdefault(c[:-1], []).append(i)
+            aggregations = result.columns.get_level_values(-1)
+            for c, i in result_positions.items():
+                key = (type(self).__name__, c, aggregation)
+                blocks[key] = result.iloc[:, i].set_axis(aggregations[i], axis=1)
+                self._cache_result(key, blocks[key])
+        return pd.concat([blocks[key] for key in keys], axis=1, keys=_cols[positions], names=list(_cols.names))
+
+    def _cache_result(self, key, result):
+        self._result_cache[key] = result
+        self._result_cache_nbytes += result.memory_usage(index=False).sum()
+        while self._result_cache_nbytes > self.result_cache_bytes and len(self._result_cache) > 1:
+            _, evicted = self._result_cache.popitem(last=False)
+            self._result_cache_nbytes -= evicted.memory_usage(index=False).sum()
+
     def set_specific_control_widgets(self):
         """Placeholder method for child classes."""
         pass
@@ -83,7 +163,7 @@ class DashboardBaseClass(object):
         self._load_figure_settings()
         with self.output:
             clear_output(wait=True)
-            print("Creation of the plots...")
+            logger.info("Creation of the plots...")
             clear_output(wait=True)
             self._specific_plot_from_interact()
 
@@ -102,7 +182,7 @@ class DashboardBaseClass(object):
             self.fig_line_dash_map = None
 
     def _specific_plot_from_interact(self):
-        print('This function is defined in a child class.')
+        logger.warning('This function is defined in a child class.')
         pass
 
     def interact(self):
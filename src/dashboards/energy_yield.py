@@ -1,16 +1,74 @@
 import ipywidgets as widgets
-import plotly.express as px
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import qualitative
 from plotly.subplots import make_subplots
 
+from src.helpers import energy_yields
+from src.helpers.instrumentation import instrumented
+from src.helpers.time_model import HOURS_PER_YEAR
 from .base_dashboard import DashboardBaseClass
 
+COLOR_MAP = {'pv': 'yellow', 'onshore': 'royalblue', 'offshore': 'darkblue'}
+YIELD_CHUNK_COLUMNS = 256  # raw data columns materialized at once while computing the yields
+VIEWS = ['annualized yield', 'yield per climate year']
+
 
 class EnergyYieldDashboard(DashboardBaseClass):
+    """
+    Annualized energy yields and their distribution over the climate years per region and variable.
+    The yields of all columns are computed once when the dashboard is built (see update_yields), the plots only index
+    these small tables.
+    """
     def __init__(self, data_frame):
+        self.yield_per_year = None  # energy per climate year [TWh] (index 'year', columns (region, variable))
+        self.annualized_yield = None  # annualized energy yield [TWh] (index (region, variable))
         super().__init__(data_frame)
         self.widgets.groupby = None
+        self.widgets.view = None
+        self.update_yields()
         self.set_specific_control_widgets()
 
+    def clear_result_cache(self):
+        super().clear_result_cache()
+        self.yield_per_year = None
+        self.annualized_yield = None
+
+    def add_columns(self, data_frame):
+        """ Replaces the data by data_frame, e.g. with new columns after ColumnAggregation.apply. The yields are only
+        computed for the new columns and the columns whose raw data changed.
+        :param data_frame: pd.DataFrame (or LazyFrame)
+        """
+        old, known = self.data_frame, self.yield_per_year
+        self.data_frame = data_frame
+        if known is not None:
+            known = known.loc[:, _unchanged_columns(old, data_frame, known.columns)]
+        self.update_yields(known)
+        self.set_column_labels()
+        for _widget, _options in [(self.widgets.regions, self.regions), (self.widgets.variables, self.variables)]:
+            _value = _widget.value
+            _widget.options = _options
+            _widget.value = [v for v in _value if v in _options]
+
+    @instrumented()
+    def update_yields(self, known=None):
+        """ Computes the yields of all raw_data columns that are not in known, in chunks of columns.
+        :param known: pd.DataFrame (yield_per_year of columns whose data did not change) or None
+        """
+        _cols = self.data_frame.columns
+        positions = np.flatnonzero(_cols.get_level_values('spectrum') == 'raw_data')
+        columns = _cols[positions].droplevel('spectrum')
+        if known is not None:
+            is_known = columns.isin(known.columns)
+            positions = positions[~is_known]
+        blocks = [] if known is None else [known.loc[:, columns[is_known]]]
+        for i0 in range(0, len(positions), YIELD_CHUNK_COLUMNS):
+            data = self.data_frame.iloc[:, positions[i0:i0 + YIELD_CHUNK_COLUMNS]]
+            blocks.append(energy_yields(data.droplevel('spectrum', axis=1), self.time_model)[0])
+        self.yield_per_year = pd.concat(blocks, axis=1).reindex(columns=columns)
+        self.annualized_yield = self.yield_per_year.sum() / len(self.data_frame) * HOURS_PER_YEAR
+
     def set_specific_control_widgets(self):
         self.widgets.variables.default_value = ['pv', 'onshore', 'offshore']
         self.widgets.variables.value = self.widgets.variables.default_value
@@ -21,34 +79,90 @@ class EnergyYieldDashboard(DashboardBaseClass):
             description='Group by',
             disabled=False,
         )
-        _sel = widgets.HBox([self.widgets.regions, self.widgets.variables, self.widgets.groupby])
+        self.widgets.view = widgets.RadioButtons(
+            options=VIEWS,
+            value=VIEWS[0],
+            layout={'width': 'max-content'},
+            description='View',
+            disabled=False,
+        )
+        _sel = widgets.HBox([self.widgets.regions, self.widgets.variables, self.widgets.groupby, self.widgets.view])
         self.controls.selection = _sel
 
+    def _colors(self, level):
+        """ :return: dict (label -> color, the same in all groups and views) """
+        labels = self.regions if level == 'region' else self.variables
+        return {l: COLOR_MAP.get(l, qualitative.Plotly[i % len(qualitative.Plotly)]) for i, l in enumerate(labels)}
+
+    @instrumented()
     def _specific_plot_from_interact(self):
-        _regions = self.fig_regions
-        _variables = self.fig_variables
         _groupby = self.widgets.groupby.value
+        _inv_groupby = 'variable' if _groupby == 'region' else 'region'
+        _view = self.widgets.view.value
 
-        data = self.data_frame.loc(axis=1)[_regions, _variables, 'raw_data']
-        groups = data.columns.get_level_values(_groupby).unique()
+        _cols = self.yield_per_year.columns
+        selected = _cols.get_level_values('region').isin(self.fig_regions) & \
+            _cols.get_level_values('variable').isin(self.fig_variables)
+        _cols = _cols[selected]
+        groups = _cols.get_level_values(_groupby).unique()
+        colors = self._colors(_inv_groupby)
         num_groups = len(groups)
-        fig = make_subplots(rows=1, cols=num_groups,
-                            specs=[[{'type': 'domain'}]*num_groups],
-                            subplot_titles=[g for g in groups]
-                            )
-        for i, g in enumerate(groups):
-            mask = data.columns.get_level_values(_groupby) == g
-            plot_df = (data.loc(axis=1)[mask].sum() / 1e6 / len(data) * 8760).round(2).to_frame('value').reset_index()
-            _inv_groupby = 'variable' if _groupby == 'region' else 'region'
-            fig_yield = px.pie(
-                plot_df,
-                values='value',
-                names=_inv_groupby,
-                labels={'value': 'annualized yield [TWh]'},
-                color=_inv_groupby,
-                color_discrete_map={'pv': 'yellow', 'onshore': 'royalblue', 'offshore': 'darkblue'},
-            )
-            fig_yield.update_layout(showlegend=False)
-            fig.add_trace(fig_yield.data[0], row=1, col=1+i)
-        fig.update_layout(title_text='<b>Energy Yield per Group</b>', title_x=0.5)
+        if _view == VIEWS[0]:
+            fig = make_subplots(rows=1, cols=num_groups, specs=[[{'type': 'domain'}]*num_groups],
+                                subplot_titles=[g for g in groups])
+            annualized = self.annualized_yield[selected].round(2)
+            for i, g in enumerate(groups):
+                group = annualized[_cols.get_level_values(_groupby) == g]
+                labels = group.index.get_level_values(_inv_groupby)
+                fig.add_trace(go.Pie(
+                    labels=labels,
+                    values=group.to_numpy(),
+                    marker={'colors': [colors[l] for l in labels]},
+                    hovertemplate=f'{_inv_groupby}=%{{label}}<br>annualized yield [TWh]=%{{value}}<extra></extra>',
+                    showlegend=False,
+                ), row=1, col=1+i)
+            fig.update_layout(title_text='<b>Energy Yield per Group</b>', title_x=0.5)
+        else:
+            fig = make_subplots(rows=1, cols=num_groups, shared_yaxes=True, subplot_titles=[g for g in groups])
+            per_year = self.yield_per_year.loc[:, selected].round(2)
+            years = per_year.index.to_numpy()
+            for i, g in enumerate(groups):
+                group = per_year.loc[:, _cols.get_level_values(_groupby) == g]
+                for label, values in zip(group.columns.get_level_values(_inv_groupby), group.to_numpy().T):
+                    fig.add_trace(go.Box(
+                        y=values,
+                        name=label,
+                        text=years,
+                        marker_color=colors[label],
+                        boxpoints='all',
+                        hovertemplate=f'{_inv_groupby}={label}<br>climate year=%{{text}}<br>'
+                                      f'yield [TWh]=%{{y}}<extra></extra>',
+                        showlegend=False,
+                    ), row=1, col=1+i)
+            fig.update_yaxes(title_text='yield per climate year [TWh]', row=1, col=1)
+            fig.update_layout(title_text='<b>Energy Yield per Climate Year</b>', title_x=0.5)
         fig.show()
+
+
+def _unchanged_columns(old, new, columns):
+    """ :return: pd.Index (the columns whose raw data is the same in both dataframes, compared in chunks of columns) """
+    old_positions = _raw_data_positions(old, columns)
+    new_positions = _raw_data_positions(new, columns)
+    unchanged = np.zeros(len(columns), dtype=bool)
+    for i0 in range(0, len(columns), YIELD_CHUNK_COLUMNS):
+        i1 = min(i0 + YIELD_CHUNK_COLUMNS, len(columns))
+        found = new_positions[i0:i1] >= 0
+        if not found.any():
+            continue
+        a = old.iloc[:, old_positions[i0:i1][found]].to_numpy(dtype=np.float64)
+        b = new.iloc[:, new_positions[i0:i1][found]].to_numpy(dtype=np.float64)
+        unchanged[i0:i1][found] = ((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=0)
+    return columns[unchanged]
+
+
+def _raw_data_positions(data_frame, columns):
+    """ :return: np.ndarray (position of the raw_data column of every column in data_frame, -1 if missing) """
+    _cols = data_frame.columns
+    positions = np.flatnonzero(_cols.get_level_values('spectrum') == 'raw_data')
+    indexer = _cols[positions].droplevel('spectrum').get_indexer(columns)
+    return np.where(indexer >= 0, positions[indexer], -1)
@@ -1,22 +1,28 @@
-import numpy as np
 import plotly.express as px
 
-from src.helpers import datetime_index_to_hour_of_year, upper_ci, lower_ci
+from src.helpers import flexibility_requirements, grouped_confidence_interval
+from src.helpers.flex_requirements import DEFAULT_PERCENTILES
+from src.helpers.instrumentation import instrumented
 from .base_dashboard import DashboardBaseClass
 
-DEFAULT_PERCENTILES = list(range(0, 80, 5)) + list(range(80, 101, 1))
-
-
-def percentile_func(percentile):
-    filtr = lambda x: np.where(x <= 0, x, np.nan)
-    perc = lambda x: np.nanpercentile(np.abs(filtr(x)), percentile)
-    return perc
-
 
 class FlexibilityRequirementDashboard(DashboardBaseClass):
     def __init__(self, data_frame):
         super().__init__(data_frame)
 
+    @staticmethod
+    def _flexibility_requirements(data, confidence_interval=False):
+        """ Mean (or upper_ci, mean, lower_ci) of the yearly flexibility requirements per percentile. """
+        data = flexibility_requirements(data, DEFAULT_PERCENTILES)
+        _cols = list(data.columns.names)
+        if confidence_interval:
+            data = grouped_confidence_interval(data, level='percentile')
+        else:
+            data = data.groupby(level='percentile').agg(['mean'])
+        data.columns.names = _cols + ['aggregation']
+        return data
+
+    @instrumented()
     def _specific_plot_from_interact(self):
         _regions = self.fig_regions
         _variables = self.fig_variables
@@ -27,32 +33,22 @@ class FlexibilityRequirementDashboard(DashboardBaseClass):
         _line_dash = self.fig_line_dash
         _line_dash_map = self.fig_line_dash_map
 
-        if _line_dash == 'confidence interval':
-            agg = [upper_ci, 'mean', lower_ci]
-            print('# NOTE: You chose to show the confidence intervals, this significantly increases plot-time. '
-                  'Please be prepared to wait a couple of minutes. :)')
+        _confidence_interval = _line_dash == 'confidence interval'
+        if _confidence_interval:
             _line_dash = 'aggregation'
-        else:
-            agg = ['mean']
 
         # FLEX REQ DATA prep
-        data = self.data_frame.loc(axis=1)[_regions, _variables, _spectra]
-        data = datetime_index_to_hour_of_year(data)
-        _cols = data.columns.names
-        _percentile_aggregation = [(p, percentile_func(p)) for p in DEFAULT_PERCENTILES]
-        data = data.groupby(level='year', axis=0).agg(_percentile_aggregation)
-        data.columns.names = _cols + ['percentile']
-        data = data.stack('percentile')
-        _cols = data.columns.names
-        data = data.groupby(level='percentile', axis=0).agg(agg)
-        data.columns.names = _cols + ['aggregation']
+        data = self._aggregate_selection(
+            ('percentile', 'confidence interval' if _confidence_interval else 'mean'),
+            lambda df: self._flexibility_requirements(df, _confidence_interval),
+        )
 
         # PLOT
         cat_order = {'spectrum': _spectra}
         if _line_dash == 'aggregation':
             cat_order.update({'aggregation': ['upper_ci', 'mean', 'lower_ci']})
 
-        plot_df = (data / 1e3).round(2).reset_index().melt(id_vars='percentile').sort_values('percentile')
+        plot_df = (data / 1e3).round(2).melt(ignore_index=False).reset_index().sort_values('percentile')
         num_rows = len(plot_df[_facet_row].unique()) if _facet_row is not None else 1
         fig = px.line(
             plot_df,
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.colors import qualitative
+from plotly.subplots import make_subplots
+
+from src.helpers.downsampling import downsample
+from src.helpers.instrumentation import get_logger, instrumented
+
+DEFAULT_PLOT_WIDTH = 1200  # pixels
+DEFAULT_MAX_POINTS = 60000  # points of all traces together
+MIN_POINTS_PER_TRACE = 200
+LINE_DASH_SEQUENCE = ['solid', 'dot', 'dash', 'longdash', 'dashdot', 'longdashdot']
+
+logger = get_logger(__name__)
+
+
+class DownsampledLineFigure(object):
+    """
+    Line plot of all columns of a wide dataframe, faceted and styled by column levels like plotly.express.line, with
+    every trace decimated to about two points per pixel of its facet (re-decimated on zoom as go.FigureWidget).
+    """
+    def __init__(self, data, facet_row=None, facet_col=None, color=None, line_dash=None, category_orders=None,
+                 line_dash_map=None, y_label='value', width=DEFAULT_PLOT_WIDTH, max_points=DEFAULT_MAX_POINTS,
+                 method='minmax'):
+        """
+        :param data: pd.DataFrame (x values as index, one trace per column)
+        :param facet_row: str or None (column level)
+        :param facet_col: str or None (column level)
+        :param color: str or None (column level)
+        :param line_dash: str or None (column level)
+        :param category_orders: dict (column level -> list of values, as in plotly.express)
+        :param line_dash_map: dict (value -> dash style, as in plotly.express)
+        :param y_label: str
+        :param width: int (pixels of the plot area)
+        :param max_points: int (points of all traces together)
+        :param method: str ('minmax' or 'lttb', see helpers.downsampling)
+        """
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
+        self.x = data.index.to_numpy()
+        self.x_label = data.index.name
+        self.y = data.to_numpy(dtype=np.float64).T  # (traces, points)
+        self.y_label = y_label
+        self.method = method
+        self.category_orders = category_orders or {}
+        self.line_dash_map = line_dash_map or {}
+
+        _cols = data.columns
+        self.levels = [l for l in (facet_row, facet_col, color, line_dash) if l is not None]
+        self.labels = {l: _cols.get_level_values(l) for l in dict.fromkeys(self.levels)}
+        self.rows, self.row_codes = self._categories(facet_row)
+        self.cols, self.col_codes = self._categories(facet_col)
+        self.colors, self.color_codes = self._categories(color)
+        self.dashes, self.dash_codes = self._categories(line_dash)
+        self.facet_row = facet_row
+        self.facet_col = facet_col
+        self.color = color
+        self.line_dash = line_dash
+
+        n_traces = max(len(self.y), 1)
+        self.points_per_trace = int(max(min(2 * width // len(self.cols), max_points // n_traces), MIN_POINTS_PER_TRACE))
+        self.figure_widget = None
+
+    @property
+    def n_rows(self):
+        return len(self.rows)
+
+    def _categories(self, level):
+        """ :return: tuple (list of values in plotting order, np.ndarray of the value code of every trace) """
+        if level is None:
+            return [None], np.zeros(len(self.y), dtype=int)
+        values = self.labels[level]
+        categories = [v for v in self.category_orders.get(level, []) if v in set(values)]
+        categories += [v for v in pd.unique(values) if v not in categories]
+        return categories, pd.Index(categories).get_indexer(values)
+
+    def decimated(self, x_range=None):
+        """ :return: tuple (x values, y values) of all traces, see helpers.downsampling.downsample """
+        return downsample(self.x, self.y, self.points_per_trace, self.method, x_range)
+
+    @instrumented()
+    def figure(self, widget=False):
+        """
+        :param widget: bool (go.FigureWidget that re-decimates the traces on zoom, otherwise or without anywidget a
+            static go.Figure)
+        :return: go.Figure or go.FigureWidget
+        """
+        fig = make_subplots(
+            rows=len(self.rows),
+            cols=len(self.cols),
+            shared_xaxes='all',
+            shared_yaxes='all',
+            row_titles=[f'{self.facet_row}={v}' for v in self.rows] if self.facet_row else None,
+            column_titles=[f'{self.facet_col}={v}' for v in self.cols] if self.facet_col else None,
+            vertical_spacing=0.03,
+            horizontal_spacing=0.02,
+        )
+        legend_levels = list(dict.fromkeys(l for l in (self.color, self.line_dash) if l is not None))
+        colorway = fig.layout.template.layout.colorway or qualitative.Plotly  # colours of the plotly template
+        shown = set()
+        for i, (xs, ys) in enumerate(zip(*self.decimated())):
+            labels = {l: self.labels[l][i] for l in self.labels}
+            name = ', '.join(str(labels[l]) for l in legend_levels)
+            dash_value = self.dashes[self.dash_codes[i]]
+            hover = '<br>'.join([f'{l}={labels[l]}' for l in labels] + [f'{self.x_label}=%{{x}}', f'{self.y_label}=%{{y}}'])
+            fig.add_trace(
+                go.Scatter(
+                    x=xs,
+                    y=ys,
+                    mode='lines',
+                    name=name,
+                    legendgroup=name,
+                    showlegend=bool(legend_levels) and name not in shown,
+                    line=dict(
+                        color=colorway[self.color_codes[i] % len(colorway)],
+                        dash=self.line_dash_map.get(dash_value, LINE_DASH_SEQUENCE[self.dash_codes[i] % len(LINE_DASH_SEQUENCE)]),
+                    ),
+                    hovertemplate=hover + '<extra></extra>',
+                ),
+                row=self.row_codes[i] + 1,
+                col=self.col_codes[i] + 1,
+            )
+            shown.add(name)
+        fig.update_xaxes(title_text=self.x_label, row=len(self.rows))
+        fig.update_yaxes(title_text=self.y_label, col=1)
+        fig.update_layout(legend_title_text=', '.join(legend_levels))
+        if not widget:
+            return fig
+
+        try:
+            self.figure_widget = go.FigureWidget(fig)
+        except ImportError as e:  # anywidget (ipywidgets for older plotly versions) is not installed
+            logger.warning("No zoom resampling, the figure shows the decimated traces only: %s", e)
+            return fig
+        self._x_range = None
+        for axis in self.figure_widget.layout:
+            if axis.startswith('xaxis'):
+                self.figure_widget.layout.on_change(self._on_zoom, f'{axis}.range', f'{axis}.autorange')
+        return self.figure_widget
+
+    def _on_zoom(self, layout, x_range, autorange):
+        """ Re-decimates all traces for the visible range. The x axes are shared, a zoom changes the range of every
+        x axis, so the traces are only decimated for the first of them. """
+        x_range = None if autorange or x_range is None else tuple(x_range)
+        if x_range == self._x_range:
+            return
+        self._x_range = x_range
+        xs, ys = self.decimated(x_range)
+        with self.figure_widget.batch_update():
+            for trace, x, y in zip(self.figure_widget.data, xs, ys):
+                trace.x = x
+                trace.y = y
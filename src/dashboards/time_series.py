@@ -1,13 +1,26 @@
-import plotly.express as px
+from IPython.display import display
 
-from src.helpers import datetime_index_to_hour_of_year, upper_ci, lower_ci
+from src.helpers.instrumentation import instrumented
+from src.helpers.time_model import aggregate_by_hour_of_year
 from .base_dashboard import DashboardBaseClass
+from .line_figure import DEFAULT_PLOT_WIDTH, DownsampledLineFigure
 
 
 class TimeSeriesDashboard(DashboardBaseClass):
-    def __init__(self, data_frame):
+    def __init__(self, data_frame, plot_width=DEFAULT_PLOT_WIDTH, downsampling='minmax', zoom_resampling=False):
+        """
+        :param data_frame: pd.DataFrame (decomposed time series)
+        :param plot_width: int (pixels, the traces are decimated to about two points per pixel of their facet)
+        :param downsampling: str ('minmax' or 'lttb')
+        :param zoom_resampling: bool (interactive figure that shows zoomed ranges at a higher resolution, needs
+            anywidget)
+        """
         super().__init__(data_frame)
+        self.plot_width = plot_width
+        self.downsampling = downsampling
+        self.zoom_resampling = zoom_resampling
 
+    @instrumented()
     def _specific_plot_from_interact(self):
         _regions = self.fig_regions
         _variables = self.fig_variables
@@ -18,41 +31,38 @@ class TimeSeriesDashboard(DashboardBaseClass):
         _line_dash = self.fig_line_dash
         _line_dash_map = self.fig_line_dash_map
 
-        if _line_dash == 'confidence interval':
-            agg = [upper_ci, 'mean', lower_ci]
-            print('# NOTE: You chose to show the confidence intervals, this significantly increases plot-time. '
-                  'Please be prepared to wait a couple of minutes. :)')
+        _confidence_interval = _line_dash == 'confidence interval'
+        if _confidence_interval:
             _line_dash = 'aggregation'
-        else:
-            agg = ['mean']
 
-        data = self.data_frame.loc(axis=1)[_regions, _variables, _spectra]
-        data = datetime_index_to_hour_of_year(data)
-        _cols = list(data.columns.names)
-        data = data.groupby(level='hour_of_year', axis=0).agg(agg)
-        data.columns.names = _cols + ['aggregation']
+        data = self._aggregate_selection(
+            ('hour_of_year', 'confidence interval' if _confidence_interval else 'mean'),
+            lambda df: aggregate_by_hour_of_year(df, _confidence_interval, time_model=self.time_model),
+        )
 
         cat_order = {'spectrum': _spectra}
         if _line_dash == 'aggregation':
             cat_order.update({'aggregation': ['upper_ci', 'mean', 'lower_ci']})
 
-        plot_df = (data / 1e3).round(2).reset_index().melt(id_vars='hour_of_year').sort_values('hour_of_year')
-        num_rows = len(plot_df[_facet_row].unique()) if _facet_row is not None else 1
-        fig = px.line(
-            plot_df,
-            x='hour_of_year',
-            y='value',
-            line_dash=_line_dash,
-            color=_color,
+        figure = DownsampledLineFigure(
+            (data / 1e3).round(2),
             facet_row=_facet_row,
             facet_col=_facet_col,
-            labels={'value': 'power [GW]'},
+            color=_color,
+            line_dash=_line_dash,
             category_orders=cat_order,
             line_dash_map=_line_dash_map,
-            height=250 * num_rows + 150,
+            y_label='power [GW]',
+            width=self.plot_width,
+            method=self.downsampling,
         )
+        fig = figure.figure(widget=self.zoom_resampling)
         fig.update_layout(
+            height=250 * figure.n_rows + 150,
             title_text=f'<b>Decomposed Time Series</b>',
             title_x=0.5,
         )
-        fig.show()
+        if figure.figure_widget is not None:
+            display(fig)
+        else:
+            fig.show()
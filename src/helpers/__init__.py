@@ -1,5 +1,23 @@
-from .expando import Expando
-from .fft import add_decomposed_ts
-from .time_model import datetime_index_to_hour_of_year
-from .confidence_interval import upper_ci, lower_ci
-from .read_widget_values import detect_none_string
+from .lazy_imports import lazy_exports
+
+# name -> module, imported on first use (see lazy_imports)
+_EXPORTS = {
+    'Expando': '.expando',
+    'add_decomposed_ts': '.fft',
+    'decompose_to_store': '.decomposition_store',
+    'DecompositionStore': '.decomposition_store',
+    'LazyDecomposition': '.lazy_decomposition',
+    'CompactDecomposition': '.compact_decomposition',
+    'iter_windowed_decomposition': '.windowed_fft',
+    'windowed_decomposition': '.windowed_fft',
+    'windowed_flexibility_requirements': '.windowed_fft',
+    'datetime_index_to_hour_of_year': '.time_model',
+    'flexibility_requirements': '.flex_requirements',
+    'energy_yields': '.energy_yield',
+    'upper_ci': '.confidence_interval',
+    'lower_ci': '.confidence_interval',
+    'grouped_confidence_interval': '.confidence_interval',
+    'detect_none_string': '.read_widget_values',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
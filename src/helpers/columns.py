@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+
+def append_column_level(columns, labels, name):
+    """ Builds the columns of a frame in which every column is followed by all labels as an appended level,
+    e.g. the spectra of the decomposed dataframe. The MultiIndex is built from the codes of columns, without tuples.
+    :param columns: pd.Index or pd.MultiIndex
+    :param labels: list
+    :param name: str (name of the new level)
+    :return: pd.MultiIndex
+    """
+    if not isinstance(columns, pd.MultiIndex):
+        columns = pd.MultiIndex.from_arrays([columns])
+    n_labels = len(labels)
+    return pd.MultiIndex(
+        levels=list(columns.levels) + [pd.Index(labels)],
+        codes=[np.repeat(c, n_labels) for c in columns.codes] + [np.tile(np.arange(n_labels), len(columns))],
+        names=list(columns.names) + [name],
+        verify_integrity=False,
+    )
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from .fft import (DURATION_CUTS, band_slices, decomposed_columns, duration_cuts_to_freq_cuts, empty_bands,
+                  fill_decomposition, spectrum_positions)
+from .instrumentation import instrumented
+from .lazy_frame import LazyFrame
+
+DEFAULT_CHUNK_BYTES = 256 * 2**20  # float64 working memory while decomposing or converting
+
+
+class CompactDecomposition(LazyFrame):
+    """ Float32 version of the dataframe returned by add_decomposed_ts, in one (columns, spectra, time) block with
+    integer axis maps per column level. Selections are returned, and sums accumulated, in float64.
+    """
+    def __init__(self, values, index, base_columns, spectra):
+        """
+        :param values: np.ndarray (float32, shape (base columns, spectra, time))
+        :param index: pd.DatetimeIndex
+        :param base_columns: pd.MultiIndex (columns without the spectrum level)
+        :param spectra: list of str
+        """
+        super().__init__(index, decomposed_columns(base_columns, spectra))
+        self.values = values
+        self.base_columns = base_columns
+        self.spectra = pd.Index(spectra)
+        # axis maps: the labels of every level, and per base column the code of its label on every level
+        if not isinstance(base_columns, pd.MultiIndex):
+            base_columns = pd.MultiIndex.from_arrays([base_columns])
+        self.levels = [base_columns.levels[i][np.unique(c)] for i, c in enumerate(base_columns.codes)]
+        self.codes = [level.get_indexer(base_columns.get_level_values(i)) for i, level in enumerate(self.levels)]
+        self._lookup = np.full([len(level) for level in self.levels], -1, dtype=np.int64)
+        self._lookup[tuple(self.codes)] = np.arange(len(self.base_columns))
+        self._label_codes = [{label: i for i, label in enumerate(level)} for level in self.levels + [self.spectra]]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @classmethod
+    def from_frame(cls, df, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        """ Converts a decomposed dataframe (see add_decomposed_ts), every column must have all spectra.
+        :param df: pd.DataFrame (columns with 'spectrum' as last level)
+        :param chunk_bytes: int (float64 working memory of the conversion)
+        :return: CompactDecomposition
+        """
+        spectra = list(df.columns.get_level_values(-1).unique())
+        base_columns = df.columns.droplevel(-1).unique()
+        positions = df.columns.get_indexer(decomposed_columns(base_columns, spectra))
+        if (positions < 0).any() or len(positions) != df.shape[1]:
+            raise ValueError('Every column of the decomposed dataframe needs all spectra')
+        n = len(df)
+        values = np.empty((len(base_columns), len(spectra), n), dtype=np.float32)
+        flat = values.reshape(-1, n)
+        step = max(1, int(chunk_bytes // (n * 8)))
+        for i0 in range(0, len(positions), step):
+            flat[i0:i0 + step] = df.iloc[:, positions[i0:i0 + step]].to_numpy(dtype=np.float64).T
+        return cls(values, df.index, base_columns, spectra)
+
+    @classmethod
+    @instrumented()
+    def from_timeseries(cls, df, duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True, workers=None,
+                        chunk_bytes=DEFAULT_CHUNK_BYTES):
+        """ Decomposes df (see add_decomposed_ts) in chunks of columns in float64 and stores the bands as float32,
+        so the float64 decomposition is never held in memory as a whole.
+        :param df: pd.DataFrame (time-series dataframe)
+        :param duration_cuts: dict
+        :param remove_dc: bool
+        :param accumulate_spectra: bool
+        :param workers: int (threads of the scipy.fft transforms, -1 for all cores)
+        :param chunk_bytes: int (float64 working memory)
+        :return: CompactDecomposition
+        """
+        spectra, positions = spectrum_positions(duration_cuts)
+        columns, indexer = df.columns.sort_values(return_indexer=True)
+        n, n_spectra = len(df), len(spectra)
+        slices = band_slices(n, duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra))
+        values = np.empty((len(columns), n_spectra, n), dtype=np.float32)
+        step = max(1, int(chunk_bytes // ((4 + n_spectra) * n * 8)))
+        for i0 in range(0, len(columns), step):
+            chunk = df.iloc[:, indexer[i0:i0 + step]].to_numpy(dtype=np.float64)
+            out = empty_bands(chunk.shape, n_spectra)
+            fill_decomposition(chunk, slices, out, positions, remove_dc, workers=workers)
+            values[i0:i0 + step] = out.transpose(1, 2, 0)
+        return cls(values, df.index, columns, spectra)
+
+    def column_positions(self, key):
+        """ Like LazyFrame.column_positions, but a tuple with one label, list or full slice per level is resolved
+        with the axis maps. """
+        if not isinstance(key, tuple) or len(key) != len(self.levels) + 1:
+            return super().column_positions(key)
+        codes = [self._codes(label_codes, k) for label_codes, k in zip(self._label_codes, key)]
+        if any(c is None for c in codes):
+            return super().column_positions(key)
+        base = self._lookup[np.ix_(*codes[:-1])].ravel()
+        base = base[base >= 0]
+        # level by level in the order of the lists in key (and of the columns for full slices), as _in_key_order
+        return (base[:, np.newaxis] * len(self.spectra) + codes[-1]).ravel()
+
+    @staticmethod
+    def _codes(label_codes, key):
+        """ :return: np.ndarray of the (unique) codes of the labels in key, None for keys that are not labels or
+            lists """
+        if isinstance(key, slice):
+            return np.arange(len(label_codes)) if key == slice(None) else None
+        labels = [key] if np.ndim(key) == 0 else dict.fromkeys(key)
+        missing = [label for label in labels if label not in label_codes]
+        if missing:
+            raise KeyError(f"{missing} not in columns")
+        return np.array([label_codes[label] for label in labels], dtype=np.int64)
+
+    def _column_values(self, positions):
+        return self.values.reshape(-1, len(self.index))[positions].astype(np.float64).T
+
+    def sum(self, key=slice(None)):
+        """ Sum over time of the selected columns, accumulated in float64.
+        :param key: column selection (as for loc(axis=1))
+        :return: pd.Series
+        """
+        positions = self.column_positions(key)
+        values = self.values.reshape(-1, len(self.index))[positions]
+        return pd.Series(values.sum(axis=1, dtype=np.float64), index=self.columns[positions])
+
+    def mean(self, key=slice(None)):
+        """ Mean over time of the selected columns, accumulated in float64.
+        :param key: column selection (as for loc(axis=1))
+        :return: pd.Series
+        """
+        return self.sum(key) / len(self.index)
@@ -1,14 +1,64 @@
 import numpy as np
-import scipy.stats as st
+import pandas as pd
+
+from .columns import append_column_level
+from .instrumentation import instrumented
+
+
+CI_AGGREGATIONS = ['upper_ci', 'mean', 'lower_ci']
 
 
 def upper_ci(x):
+    import scipy.stats as st
     return st.t.interval(0.95, len(x) - 1, loc=np.mean(x), scale=st.sem(x))[1]
 
 
 def lower_ci(x):
+    import scipy.stats as st
     return st.t.interval(0.95, len(x) - 1, loc=np.mean(x), scale=st.sem(x))[0]
 
 
 upper_ci.__name__ = 'upper_ci'
 lower_ci.__name__ = 'lower_ci'
+
+
+@instrumented()
+def grouped_confidence_interval(df, level, confidence=0.95):
+    """ Vectorized version of df.groupby(level=level).agg([upper_ci, 'mean', lower_ci]).
+    Mean and standard error are computed for all groups and columns at once; the t-quantile is only evaluated once
+    per distinct group size. Groups without variance get upper_ci == lower_ci == mean.
+    :param df: pd.DataFrame
+    :param level: str (index level to group by)
+    :param confidence: float
+    :return: pd.DataFrame (index: groups, columns: df.columns with an appended 'aggregation' level)
+    """
+    codes, groups = pd.factorize(df.index.get_level_values(level), sort=True)
+    order = np.argsort(codes, kind='stable')
+    values = df.to_numpy(dtype=np.float64)[order]
+    counts = np.bincount(codes, minlength=len(groups))
+    starts = np.cumsum(counts) - counts
+
+    n = counts[:, np.newaxis]
+    mean = np.add.reduceat(values, starts, axis=0) / n
+    values -= np.repeat(mean, counts, axis=0)
+    sem = np.sqrt(np.add.reduceat(values ** 2, starts, axis=0) / (n - 1)) / np.sqrt(n)
+
+    result = confidence_interval_bounds(mean, sem, n, confidence)
+    columns = append_column_level(df.columns, CI_AGGREGATIONS, 'aggregation')
+    return pd.DataFrame(result.reshape(len(groups), -1), index=pd.Index(groups, name=level), columns=columns)
+
+
+def confidence_interval_bounds(mean, sem, counts, confidence=0.95):
+    """ Student-t confidence interval from mean and standard error, evaluating the t-quantile once per sample size.
+    :param mean: np.ndarray
+    :param sem: np.ndarray (same shape as mean)
+    :param counts: np.ndarray of int (sample sizes, broadcastable to the shape of mean)
+    :param confidence: float
+    :return: np.ndarray (shape mean.shape + (3, ), upper_ci, mean and lower_ci as in CI_AGGREGATIONS)
+    """
+    import scipy.stats as st
+    sizes, size_idx = np.unique(counts, return_inverse=True)
+    size_idx = size_idx.reshape(np.shape(counts))
+    t_lower = st.t.ppf((1 - confidence) / 2, sizes - 1)[size_idx]
+    t_upper = st.t.ppf((1 + confidence) / 2, sizes - 1)[size_idx]
+    return np.stack([t_upper * sem + mean, mean, t_lower * sem + mean], axis=-1)
@@ -0,0 +1,93 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .files import replacing
+from .fft import (DURATION_CUTS, band_slices, decomposed_columns, duration_cuts_to_freq_cuts, empty_bands,
+                  fill_decomposition, spectrum_positions)
+from .instrumentation import instrumented
+from .lazy_frame import LazyFrame
+
+DEFAULT_MEMORY_BUDGET = 512 * 2**20  # bytes
+
+
+@instrumented()
+def decompose_to_store(df, path, duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True,
+                       memory_budget=DEFAULT_MEMORY_BUDGET, workers=None):
+    """
+    Out-of-core version of add_decomposed_ts: decomposes df in chunks of columns and writes the bands of every chunk
+    straight into a memory-mapped array on disk. The working memory is bounded by memory_budget, independent of the
+    number of columns.
+    :param df: pd.DataFrame (time-series dataframe, may itself be memory-mapped, e.g. from read_pecd_xls_file)
+    :param path: str (directory of the store, is created or overwritten)
+    :param duration_cuts: dict
+    :param remove_dc: bool
+    :param accumulate_spectra: bool
+    :param memory_budget: int (bytes of working memory)
+    :param workers: int (threads of the scipy.fft transforms, -1 for all cores)
+    :return: DecompositionStore (frame-like, use e.g. store.loc(axis=1)[regions, variables, spectra])
+    """
+    freq_cuts = duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra)
+    spectra, positions = spectrum_positions(duration_cuts)
+    n, n_spectra = len(df), len(spectra)
+
+    columns, indexer = df.columns.sort_values(return_indexer=True)
+    store = DecompositionStore.create(path, df.index, decomposed_columns(columns, spectra))
+    slices = band_slices(n, freq_cuts)
+    # per column: the input, the complex spectrum, the buffer and the result of each inverse transform (about n
+    # floats each) and the decomposed output (n floats per spectrum)
+    chunk_size = max(1, int(memory_budget // ((4 + n_spectra) * n * 8)))
+    # The bands of a chunk of columns are one contiguous range of the column-major block on disk, so every chunk is
+    # written with a single write instead of through the memory map (whose dirty pages would count as memory used).
+    with open(store.values_path, 'r+b') as f:
+        for i0 in range(0, len(columns), chunk_size):
+            chunk = indexer[i0:i0 + chunk_size]
+            values = df.iloc[:, chunk].to_numpy(dtype=np.float64)
+            out = empty_bands(values.shape, n_spectra)
+            fill_decomposition(values, slices, out, positions, remove_dc, workers=workers)
+            f.seek(store.values.offset + i0 * n_spectra * n * 8)
+            f.write(out.transpose(1, 2, 0).data)
+    return DecompositionStore(path)
+
+
+class DecompositionStore(LazyFrame):
+    """ Decomposed time series stored on disk: a column-major .npy block (memory-mapped), the index and the columns.
+    Behaves like a read-only dataframe; selected columns are read from disk into a pd.DataFrame.
+    """
+    def __init__(self, path, mode='r'):
+        self.path = path
+        with open(os.path.join(path, 'columns.json')) as f:
+            meta = json.load(f)
+        columns = pd.MultiIndex.from_tuples([tuple(c) for c in meta['columns']], names=meta['names'])
+        index = pd.DatetimeIndex(np.load(os.path.join(path, 'index.npy')), name=meta['index_name'])
+        super().__init__(index, columns)
+        self.values = np.load(self.values_path, mmap_mode=mode)
+
+    @property
+    def values_path(self):
+        return os.path.join(self.path, 'values.npy')
+
+    @classmethod
+    def create(cls, path, index, columns):
+        """ Allocates an empty store on disk. Its files are written next to the old ones and moved onto them, so a
+        store that is still open keeps the old files mapped.
+        :param path: str (directory)
+        :param index: pd.DatetimeIndex
+        :param columns: pd.MultiIndex
+        :return: DecompositionStore
+        """
+        os.makedirs(path, exist_ok=True)
+        with replacing(os.path.join(path, 'index.npy')) as tmp_path:
+            np.save(tmp_path, np.asarray(index.values).astype('datetime64[ns]'))
+        with replacing(os.path.join(path, 'columns.json')) as tmp_path, open(tmp_path, 'w') as f:
+            json.dump({'columns': [list(c) for c in columns], 'names': list(columns.names), 'index_name': index.name}, f)
+        with replacing(os.path.join(path, 'values.npy')) as tmp_path:
+            values = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64,
+                                               shape=(len(index), len(columns)), fortran_order=True)
+            del values
+        return cls(path)
+
+    def _column_values(self, positions):
+        return np.asarray(self.values.T[positions]).T
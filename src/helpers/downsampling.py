@@ -0,0 +1,96 @@
+import numpy as np
+
+
+def min_max_indices(y, n_out):
+    """
+    Shape-preserving decimation: splits every series into buckets of equal length and keeps the minimum and the
+    maximum of each bucket (in their original order) plus the first and the last point. Peaks are never lost, so a
+    line plot of the result looks like the full series at a resolution of about n_out / 2 pixels.
+    :param y: np.ndarray (shape (series, points))
+    :param n_out: int (target number of points per series)
+    :return: np.ndarray of int (shape (series, n), indices into the points axis, sorted per series)
+    """
+    n_series, n = y.shape
+    n_buckets = max(1, (n_out - 2) // 2)
+    if n <= n_out or n_buckets >= n:
+        return np.broadcast_to(np.arange(n), (n_series, n))
+    size = -(-n // n_buckets)
+    n_buckets = -(-n // size)
+    padded = np.full((n_series, n_buckets * size), np.nan)
+    padded[:, :n] = y
+    padded = padded.reshape(n_series, n_buckets, size)
+    nan = np.isnan(padded)
+    offset = np.arange(n_buckets) * size
+    lo = np.where(nan, np.inf, padded).argmin(axis=2) + offset
+    hi = np.where(nan, -np.inf, padded).argmax(axis=2) + offset
+    idx = np.empty((n_series, 2 * n_buckets + 2), dtype=int)
+    idx[:, 0] = 0
+    idx[:, 1:-1:2] = np.minimum(lo, hi)
+    idx[:, 2:-1:2] = np.maximum(lo, hi)
+    idx[:, -1] = n - 1
+    return np.minimum(idx, n - 1)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets decimation: keeps the first and the last point and, per bucket, the point that
+    spans the largest triangle with the point kept in the previous bucket and the average of the next bucket.
+    The buckets are processed in sequence, every step is vectorized over all series.
+    :param x: np.ndarray (shape (points, ), increasing)
+    :param y: np.ndarray (shape (series, points))
+    :param n_out: int (number of points per series)
+    :return: np.ndarray of int (shape (series, n_out), indices into the points axis, sorted per series)
+    """
+    n_series, n = y.shape
+    if n <= n_out or n_out < 3:
+        return np.broadcast_to(np.arange(n), (n_series, n))
+    x = np.asarray(x, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    edges = np.append(edges, n)  # the last "bucket" is the last point
+    rows = np.arange(n_series)
+    idx = np.empty((n_series, n_out), dtype=int)
+    idx[:, 0] = 0
+    idx[:, -1] = n - 1
+    a = idx[:, 0]
+    for i in range(n_out - 2):
+        lo, hi, next_hi = edges[i], edges[i + 1], edges[i + 2]
+        cx = x[hi:next_hi].mean()
+        with np.errstate(invalid='ignore'):
+            cy = np.nanmean(y[:, hi:next_hi], axis=1) if next_hi - hi > 1 else y[:, hi]
+        ax, ay = x[a], y[rows, a]
+        area = np.abs(
+            (ax - cx)[:, np.newaxis] * (y[:, lo:hi] - ay[:, np.newaxis])
+            - (ax[:, np.newaxis] - x[lo:hi]) * (cy - ay)[:, np.newaxis]
+        )
+        a = np.nan_to_num(area, nan=-1).argmax(axis=1) + lo
+        idx[:, i + 1] = a
+    return idx
+
+
+DOWNSAMPLING_METHODS = {
+    'minmax': lambda x, y, n_out: min_max_indices(y, n_out),
+    'lttb': lttb_indices,
+}
+
+
+def downsample(x, y, n_out, method='minmax', x_range=None):
+    """
+    Decimates several series that share the same x values to about n_out points each. If x_range is given, only the
+    points in this range are considered, so zooming into a range shows it at full resolution as soon as it holds no
+    more than n_out points.
+    :param x: np.ndarray (shape (points, ), increasing)
+    :param y: np.ndarray (shape (series, points))
+    :param n_out: int
+    :param method: str (see DOWNSAMPLING_METHODS)
+    :param x_range: tuple (x_min, x_max) or None (all points)
+    :return: tuple (x values, y values), both np.ndarray (shape (series, n))
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x_range is not None:
+        # one point beyond each side, so the lines reach the edges of the plot
+        i0 = max(np.searchsorted(x, x_range[0], side='left') - 1, 0)
+        i1 = min(np.searchsorted(x, x_range[1], side='right') + 1, len(x))
+        x, y = x[i0:i1], y[:, i0:i1]
+    idx = DOWNSAMPLING_METHODS[method](x, y, n_out)
+    return x[idx], np.take_along_axis(y, idx, axis=1)
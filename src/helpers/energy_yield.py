@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrumented
+from .time_model import HOURS_PER_YEAR, get_time_model
+
+
+@instrumented()
+def energy_yields(df, time_model=None):
+    """
+    Energy per climate year and annualized energy yield of every column, computed with one reduction over the time
+    axis (on the (year, hour, column) view of the data if possible).
+    :param df: pd.DataFrame (hourly power [MW] with DatetimeIndex)
+    :param time_model: TimeModel (of df.index, looked up or computed if not given)
+    :return: tuple (pd.DataFrame energy per year [TWh] (index 'year', same columns as df),
+        pd.Series annualized energy yield [TWh] (energy per 8760 hours))
+    """
+    time_model = time_model or get_time_model(df.index)
+    values = df.to_numpy(dtype=np.float64)
+    cube = time_model.reshape(values)
+    if cube is not None:
+        per_year = cube.sum(axis=1)
+    else:
+        _, year_idx, counts = np.unique(time_model.year, return_inverse=True, return_counts=True)
+        order = np.argsort(year_idx, kind='stable')
+        per_year = np.add.reduceat(values[order], np.concatenate([[0], np.cumsum(counts)[:-1]]), axis=0)
+    per_year = pd.DataFrame(per_year / 1e6, index=pd.Index(time_model.years, name='year'), columns=df.columns)
+    annualized = per_year.sum() / len(df) * HOURS_PER_YEAR
+    return per_year, annualized
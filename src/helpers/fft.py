@@ -1,6 +1,9 @@
 import numpy as np
-import pandas as pd
-from scipy.fftpack import rfft, irfft, rfftfreq
+
+from .instrumentation import get_logger, instrumented
+
+# pandas and scipy.fft are imported where they are used, so that worker processes that only transform arrays
+# (see parallel_fft) start without them
 
 
 # Add default frequency cuts in unit hours, define labels along with it
@@ -12,56 +15,194 @@ DURATION_CUTS = {
     'daily':        (4,         24),
     'hourly':       (0.25,      4),
 }
+DT = 3600  # seconds of one time step
+
+logger = get_logger(__name__)
 
 
-def add_decomposed_ts(df, duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True):
+@instrumented()
+def add_decomposed_ts(df, duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True, n_jobs=1,
+                      workers=None, lazy=False, compact=False, window=None, overlap=0.5):
     """
     Applies Fourier and appends a level to the dataframe with the decomposed time-series in the defined duration cuts.
     Removes the DC component (mean) before applying Fourier.
     :param df: pd.DataFrame (time-series dataframe)
     :param duration_cuts: dict
     :param remove_dc: bool
-    :return: pd.DataFrame
+    :param accumulate_spectra: bool (each spectrum includes all spectra with longer durations)
+    :param n_jobs: int (number of processes the columns are split across, see parallel_fft)
+    :param workers: int (number of threads of the scipy.fft transforms, -1 for all cores)
+    :param lazy: bool (only compute the spectra now and the bands when they are selected, see LazyDecomposition,
+        not with compact or n_jobs > 1)
+    :param compact: bool (store the bands as float32, see CompactDecomposition, not with n_jobs > 1)
+    :param window: 'year' or int (decompose every climate year or overlapping windows of this many hours on their own,
+        see windowed_fft, not with lazy or compact)
+    :param overlap: float (fraction of overlap of the windows, only for window lengths)
+    :return: pd.DataFrame (or LazyDecomposition if lazy, CompactDecomposition if compact)
+    """
+    import pandas as pd
+    modes = [mode for mode, on in [('lazy', lazy), ('compact', compact), ('window', window is not None)] if on]
+    if len(modes) > 1:
+        raise ValueError(f"{' and '.join(modes)} can not be combined")
+    if (lazy or compact) and n_jobs > 1:
+        raise ValueError(f"n_jobs={n_jobs} is not supported with {'lazy' if lazy else 'compact'}, "
+                         f"use workers (threads of the transforms) instead")
+    if lazy:
+        from .lazy_decomposition import LazyDecomposition
+        return LazyDecomposition(df, duration_cuts, remove_dc, accumulate_spectra, workers=workers)
+    if compact:
+        from .compact_decomposition import CompactDecomposition
+        return CompactDecomposition.from_timeseries(df, duration_cuts, remove_dc, accumulate_spectra, workers=workers)
+    if window is not None:
+        from .windowed_fft import windowed_decomposition
+        return windowed_decomposition(df, window, overlap, duration_cuts, remove_dc, accumulate_spectra, n_jobs=n_jobs,
+                                      workers=workers)
+    freq_cuts = duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra)
+    spectra, positions = spectrum_positions(duration_cuts)
+
+    columns = df.columns
+    values = df.to_numpy(dtype=np.float64)
+    if not columns.is_monotonic_increasing:
+        columns, indexer = columns.sort_values(return_indexer=True)
+        values = values.T[indexer].T
+
+    slices = band_slices(len(df), freq_cuts)
+    if n_jobs > 1:
+        from .parallel_fft import parallel_decomposition
+        out = parallel_decomposition(values, slices, len(spectra), positions, remove_dc, n_jobs=n_jobs)
+    else:
+        out = empty_bands(values.shape, len(spectra))
+        fill_decomposition(values, slices, out, positions, remove_dc, workers=workers)
+    return pd.DataFrame(
+        out.reshape(len(df), -1),
+        index=df.index,
+        columns=decomposed_columns(columns, spectra),
+        copy=False,
+    )
+
+
+def spectrum_positions(duration_cuts):
+    """
+    Orders the spectra of the decomposed dataframe like df.sort_index(axis=1) would.
+    :param duration_cuts: dict
+    :return: tuple (sorted list of spectra incl. 'raw_data', np.ndarray with the position of each duration cut
+        followed by the position of 'raw_data')
+    """
+    spectra = list(duration_cuts.keys()) + ['raw_data']
+    spectrum_order = np.argsort(spectra)
+    positions = np.empty(len(spectra), dtype=int)
+    positions[spectrum_order] = np.arange(len(spectra))
+    return [spectra[i] for i in spectrum_order], positions
+
+
+def fill_decomposition(values, slices, out, positions, remove_dc=True, workers=None):
+    """
+    Writes the raw data and all bands of the columns in values into out.
+    :param values: np.ndarray (shape (time, columns))
+    :param slices: list of slices (see band_slices)
+    :param out: np.ndarray (shape (time, columns, spectra), see empty_bands)
+    :param positions: np.ndarray (see spectrum_positions)
+    :param remove_dc: bool
+    :param workers: int (threads of the scipy.fft transforms)
+    """
+    out[:, :, positions[-1]] = values
+    decompose_values(values, slices, out=out, positions=positions[:-1], workers=workers)
+    if not remove_dc:
+        out[:, :, positions[:-1]] += values.mean(axis=0)[:, np.newaxis]
+
+
+@instrumented()
+def decompose_values(values, slices, out=None, positions=None, workers=None):
+    """
+    Splits the columns of a 2d array into frequency bands with one forward FFT.
+    The DC component (mean) is removed. Bands that share their lower bin (as with accumulate_spectra) are built as
+    prefix sums, so every frequency bin is only transformed back once.
+    :param values: np.ndarray (shape (time, columns))
+    :param slices: list of slices (frequency bins of each band, see band_slices)
+    :param out: np.ndarray (shape (time, columns, bands) or more bands, if the bands are written to positions,
+        see empty_bands)
+    :param positions: list of int (position of each band in the last axis of out)
+    :param workers: int (threads of the scipy.fft transforms, -1 for all cores)
+    :return: np.ndarray (out)
+    """
+    from scipy.fft import irfft, rfft
+    n = values.shape[0]
+    if out is None:
+        out = empty_bands(values.shape, len(slices))
+    if positions is None:
+        positions = range(len(slices))
+    # The transforms run along the last axis of the transposed (columns, time) arrays, which is much faster
+    # than transforming along the first axis of a (time, columns) array.
+    spectrum = rfft(values.T, axis=-1, workers=workers)
+    spectrum[:, 0] = 0  # DC component
+    buffer = np.zeros_like(spectrum)
+    out_t = out.transpose(1, 2, 0)
+
+    done = {}  # start bin -> (stop bin, position) of the widest band computed so far
+    for k in sorted(range(len(slices)), key=lambda i: (slices[i].start, slices[i].stop)):
+        sl, pos = slices[k], positions[k]
+        prev_stop, prev_pos = done.get(sl.start, (sl.start, None))
+        segment = slice(prev_stop, sl.stop)
+        buffer[:, segment] = spectrum[:, segment]
+        out_t[:, pos, :] = irfft(buffer, n, axis=-1, workers=workers)
+        buffer[:, segment] = 0
+        if prev_pos is not None:
+            out_t[:, pos, :] += out_t[:, prev_pos, :]
+        done[sl.start] = (sl.stop, pos)
+    return out
+
+
+def empty_bands(shape, n_bands):
+    """
+    Allocates the (time, columns, bands) array for decompose_values.
+    It is a view of a (columns, bands, time) array, so that every band of every column is contiguous in memory and
+    out.reshape(time, -1) is the (column major) value block of the decomposed dataframe.
+    :param shape: tuple (time, columns)
+    :param n_bands: int
+    :return: np.ndarray
+    """
+    n, c = shape
+    return np.empty((c, n_bands, n)).transpose(2, 0, 1)
+
+
+def band_slices(n, freq_cuts):
+    """
+    Translates frequency cuts into the slices of rfft bins that lie within each cut (bounds included).
+    :param n: int (number of time steps)
+    :param freq_cuts: np.ndarray (shape (bands, 2)) lower and upper cut in Hz
+    :return: list of slices
+    """
+    freq = np.arange(n // 2 + 1) / float(n * DT)  # frequency vector for rfft
+    return [
+        slice(int(np.searchsorted(freq, lo, side='left')), int(np.searchsorted(freq, hi, side='right')))
+        for lo, hi in freq_cuts
+    ]
+
+
+def decomposed_columns(columns, spectra):
+    """
+    Builds the columns of the decomposed dataframe: every column followed by all spectra as the last level.
+    :param columns: pd.Index or pd.MultiIndex
+    :param spectra: list of str
+    :return: pd.MultiIndex
+    """
+    from .columns import append_column_level
+    return append_column_level(columns, spectra, 'spectrum')
+
+
+def duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra=True):
+    """
+    Translates the duration cuts dict into frequency cuts, accumulating the spectra if requested.
+    :param duration_cuts: dict
+    :param accumulate_spectra: bool
+    :return: np.ndarray (shape (bands, 2))
     """
     if accumulate_spectra:
-        _max = max(i[1] for i in DURATION_CUTS.values())
-        duration_cut_values = [(i[0], _max) for i in DURATION_CUTS.values()]
+        _max = max(i[1] for i in duration_cuts.values())
+        duration_cut_values = [(i[0], _max) for i in duration_cuts.values()]
     else:
         duration_cut_values = list(duration_cuts.values())
-    freq_cuts = set_frequency_spectrum(duration_cut_values)
-    temp = df.copy()
-    temp.values[:, :] = rfft(df.subtract(df.mean()).values, axis=0)
-
-    dc_component = 0 if remove_dc else df.mean()
-    d = {
-        k: process_freq_cut(temp, freq_cuts[i]) + dc_component
-        for i, k in enumerate(duration_cuts.keys())
-    }
-    d.update({f'raw_data': df})
-    dff = pd.concat(d, names=['spectrum'], axis=1)
-    lvl_order = list(dff.columns.names)
-    lvl_order.remove('spectrum')
-    lvl_order.append('spectrum')  # So that spectrum is the last level in the dataframe
-    dff = dff.reorder_levels(lvl_order, axis=1).sort_index(axis=1)
-    return dff
-
-
-def process_freq_cut(df, freq_cut):
-    """
-    Cut a time series dataframe into the freq_cut.
-    :param df: pd.DataFrame
-    :param freq_cut: np.ndarray (shape (2, )) lower and upper cut
-    :return: pd.DataFrame
-    """
-    dT = 3600  # seconds of one time step
-    n = len(df)  # window size
-    freq = rfftfreq(n, dT)  # frequency vector for fft
-    
-    temp = df.copy()
-    temp[abs(freq) < freq_cut[0]] = 0
-    temp[abs(freq) > freq_cut[1]] = 0
-    temp.values[:, :] = irfft(temp.values, axis=0)
-    return temp
+    return set_frequency_spectrum(duration_cut_values)
 
 
 def set_frequency_spectrum(duration_cuts, verbose=True):
@@ -70,17 +211,16 @@ def set_frequency_spectrum(duration_cuts, verbose=True):
     :param duration_cuts: list of 2-elements tuples
     :return:
     """
-    """ 
+    """
 
     Parameters
     ----------
     duration_cuts : list/bool
         list of duration cuts (each a 2-element list) in hours
     """
-    dT = 3600  # seconds of one time step
-    freq_cuts = np.sort(1/(2.*np.array(duration_cuts))/dT)  # Hz
+    freq_cuts = np.sort(1/(2.*np.array(duration_cuts))/DT)  # Hz
     if np.max(duration_cuts) >= 1e6:
         freq_cuts[freq_cuts == np.min(freq_cuts)] = 0
     if verbose:
-        print(f"In total: {len(freq_cuts)} frequency cuts have been created")
+        logger.info("In total: %d frequency cuts have been created", len(freq_cuts))
     return freq_cuts
@@ -0,0 +1,26 @@
+import contextlib
+import os
+
+
+def temporary_path(path):
+    """ Path of a temporary file in the directory of path, with the same extension (np.save appends .npy otherwise).
+    :param path: str
+    :return: str
+    """
+    root, extension = os.path.splitext(path)
+    return f'{root}.{os.getpid()}.tmp{extension}'
+
+
+@contextlib.contextmanager
+def replacing(path):
+    """ Yields a temporary path that is moved onto path (os.replace) when the block finishes. Memory maps of the old
+    file keep its inode and content, instead of seeing the new file being written (or crashing if it is smaller).
+    :param path: str
+    """
+    tmp_path = temporary_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from .instrumentation import instrumented
+from .time_model import get_time_model
+
+
+DEFAULT_PERCENTILES = list(range(0, 80, 5)) + list(range(80, 101, 1))
+
+
+@instrumented()
+def flexibility_requirements(df, percentiles=DEFAULT_PERCENTILES):
+    """
+    Upward flexibility requirements: per climate year and column, the percentiles of the absolute values of all
+    hours in which the time series is <= 0, read from one sorted (year, hour, column) array (as np.nanpercentile).
+    :param df: pd.DataFrame (time-series dataframe with DatetimeIndex)
+    :param percentiles: list of numbers in [0, 100]
+    :return: pd.DataFrame (index (year, percentile), same columns as df)
+    """
+    years, cube = year_hour_cube(df)
+    requirements = np.where(cube <= 0, np.abs(cube), np.nan)
+    del cube
+    requirements.sort(axis=1)  # nan to the end
+    result = sorted_percentiles(requirements, percentiles, axis=1)  # (percentile, year, column)
+    index = pd.MultiIndex.from_product([years, list(percentiles)], names=['year', 'percentile'])
+    return pd.DataFrame(result.transpose(1, 0, 2).reshape(len(index), -1), index=index, columns=df.columns)
+
+
+def year_hour_cube(df):
+    """
+    Reshapes a time-series dataframe into a (year, hour, column) array. Years with fewer hours are padded with nan.
+    :param df: pd.DataFrame (with DatetimeIndex)
+    :return: tuple (np.ndarray of years, np.ndarray (shape (years, hours, columns)))
+    """
+    values = df.to_numpy(dtype=np.float64)
+    time_model = get_time_model(df.index)
+    if time_model.is_regular:
+        return time_model.years, time_model.reshape(values)
+    years, year_idx, counts = np.unique(time_model.year, return_inverse=True, return_counts=True)
+    order = np.argsort(year_idx, kind='stable')
+    hour_idx = np.empty(len(order), dtype=int)
+    hour_idx[order] = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    cube = np.full((len(years), counts.max(), values.shape[1]), np.nan)
+    cube[year_idx, hour_idx] = values
+    return years, cube
+
+
+def sorted_percentiles(sorted_values, percentiles, axis=0):
+    """
+    Percentiles along axis of an array that is sorted along this axis, with nan values at the end (as np.sort does).
+    Uses the same linear interpolation as np.nanpercentile, nan where there are no values.
+    :param sorted_values: np.ndarray
+    :param percentiles: list of numbers in [0, 100]
+    :param axis: int
+    :return: np.ndarray (percentiles as first axis, followed by the remaining axes of sorted_values)
+    """
+    sorted_values = np.moveaxis(sorted_values, axis, 0)
+    count = (~np.isnan(sorted_values)).sum(axis=0)
+    q = np.asarray(percentiles, dtype=np.float64).reshape((-1, ) + (1, ) * count.ndim) / 100
+    virtual = (count - 1) * q
+    lower = np.floor(virtual)
+    gamma = virtual - lower
+    lower = np.clip(lower.astype(int), 0, None)
+    upper = np.clip(np.minimum(lower + 1, count - 1), 0, None)
+    a = np.take_along_axis(sorted_values, lower, axis=0)
+    b = np.take_along_axis(sorted_values, upper, axis=0)
+    diff = b - a
+    result = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+    result[np.broadcast_to(count == 0, result.shape)] = np.nan
+    return result
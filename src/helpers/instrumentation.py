@@ -0,0 +1,269 @@
+""" Lightweight instrumentation of the import, decomposition, aggregation and plotting paths, switched off by default
+(see enable() and the FUTURE_* environment variables in the README).
+"""
+import atexit
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ENV_INSTRUMENT = 'FUTURE_INSTRUMENT'
+ENV_PROFILE = 'FUTURE_PROFILE'
+ENV_FLAMEGRAPH = 'FUTURE_FLAMEGRAPH'
+ENV_LOG_LEVEL = 'FUTURE_LOG_LEVEL'
+
+_enabled = False
+_records = []  # one dict per finished stage, see stage
+_local = threading.local()  # per thread: stack (names of the running stages), peaks (traced peak of each so far)
+_profiler = None
+_start_time = time.perf_counter()
+
+
+def get_logger(name):
+    """ Logger of a module of the src package. Unless the application configured the src logger before, the messages
+    go to stdout only (like the former prints, also in the output widgets of the dashboards), not to the root logger.
+    :param name: str (module name)
+    :return: logging.Logger
+    """
+    root = logging.getLogger('src')
+    if not root.handlers and root.level == logging.NOTSET:  # not configured by the application
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        root.addHandler(handler)
+        root.setLevel(os.environ.get(ENV_LOG_LEVEL, 'INFO').upper())
+        root.propagate = False  # printed once, also if the application calls logging.basicConfig
+    return logging.getLogger(name)
+
+
+def enable(profile=False, trace_memory=False):
+    """ Starts recording the instrumented stages.
+    :param profile: bool (also run cProfile, see write_profile)
+    :param trace_memory: bool (record the peak of the allocations of every stage with tracemalloc, slower)
+    """
+    global _enabled, _profiler
+    _enabled = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if profile and _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def disable():
+    """ Stops recording, the records are kept until reset. """
+    global _enabled, _profiler
+    _enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    if _profiler is not None:
+        _profiler.disable()
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """ Drops all records and the profile. """
+    global _profiler, _start_time
+    del _records[:]
+    _start_time = time.perf_counter()
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler = cProfile.Profile()
+        if _enabled:
+            _profiler.enable()
+
+
+@contextmanager
+def stage(name, **info):
+    """ Records the block as a stage (nested in the running stages of the same thread), if instrumentation is enabled.
+    :param name: str
+    :param info: additional values stored in the record (e.g. shape=df.shape)
+    """
+    if not _enabled:
+        yield info
+        return
+    stack, peaks = _thread_state()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        traced_start, traced_peak = tracemalloc.get_traced_memory()
+        if peaks:  # tracemalloc only keeps one peak, the running stage keeps its peak so far
+            peaks[-1] = max(peaks[-1], traced_peak)
+        peaks.append(0)
+        tracemalloc.reset_peak()
+    stack.append(name)
+    path = ';'.join(stack)
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        rss_end = rss_mb()
+        record = {'name': name, 'path': path, 'start': start - _start_time, 'seconds': seconds, 'rss_mb': rss_end,
+                  'rss_delta_mb': rss_end - rss_start if rss_end is not None else None,
+                  'process_peak_rss_mb': peak_rss_mb()}  # peak of the process lifetime, not of the stage
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], peaks.pop())
+            record['traced_peak_mb'] = (peak - traced_start) / 2**20
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+        record.update(info)
+        _records.append(record)
+
+
+def _thread_state():
+    """ :return: tuple (names of the running stages, their traced peaks so far) of the current thread """
+    if not hasattr(_local, 'stack'):
+        _local.stack, _local.peaks = [], []
+    return _local.stack, _local.peaks
+
+
+def instrumented(name=None):
+    """ Decorator that records every call of the function as a stage, with the shape of the first argument that has
+    one (e.g. a dataframe or array) and of the result.
+    :param name: str (default: module.qualname of the function, without the package)
+    """
+    def decorator(func):
+        stage_name = name or f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            shape = next((_shape(a) for a in args if _shape(a) is not None), None)
+            with stage(stage_name, shape=shape) as info:
+                result = func(*args, **kwargs)
+                info['result_shape'] = _shape(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _shape(obj):
+    shape = getattr(obj, 'shape', None)
+    return list(shape) if isinstance(shape, tuple) else None
+
+
+def rss_mb():
+    """ Current resident memory of the process in MB (Linux only, None elsewhere). """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb(children=False):
+    """ Peak resident memory of the current process in MB, None if it can not be determined.
+    :param children: bool (peak of the largest terminated child process instead, e.g. of the import workers)
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        if children:
+            return None
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10  # bytes on macOS, kB on Linux
+
+
+def report():
+    """ :return: dict (stages: one record per finished stage in order of completion, summary: per stage name the
+        number of calls, total and maximum seconds, the largest resident memory increase of one call and the peak
+        resident memory of the process at the end of the last call) """
+    summary = {}
+    for r in _records:
+        s = summary.setdefault(r['name'], {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'max_rss_delta_mb': None,
+                                           'process_peak_rss_mb': None})
+        s['calls'] += 1
+        s['seconds'] += r['seconds']
+        s['max_seconds'] = max(s['max_seconds'], r['seconds'])
+        if r['rss_delta_mb'] is not None:
+            s['max_rss_delta_mb'] = max(r['rss_delta_mb'], s['max_rss_delta_mb'] or -float('inf'))
+        if r['process_peak_rss_mb'] is not None:
+            s['process_peak_rss_mb'] = max(s['process_peak_rss_mb'] or 0, r['process_peak_rss_mb'])
+        if 'traced_peak_mb' in r:
+            s['traced_peak_mb'] = max(s.get('traced_peak_mb', 0), r['traced_peak_mb'])
+    return {'stages': list(_records), 'summary': summary}
+
+
+def format_report():
+    """ :return: str (one line per stage name, sorted by total time) """
+    summary = report()['summary']
+    lines = [f"{'stage':<60} {'calls':>6} {'total [s]':>10} {'max [s]':>9} {'max RSS +[MB]':>14} "
+             f"{'process peak RSS [MB]':>22}"]
+    for name, s in sorted(summary.items(), key=lambda i: -i[1]['seconds']):
+        delta = f"{s['max_rss_delta_mb']:.0f}" if s['max_rss_delta_mb'] is not None else '-'
+        peak = f"{s['process_peak_rss_mb']:.0f}" if s['process_peak_rss_mb'] is not None else '-'
+        lines.append(f"{name:<60} {s['calls']:>6} {s['seconds']:>10.3f} {s['max_seconds']:>9.3f} {delta:>14} "
+                     f"{peak:>22}")
+    return '\n'.join(lines)
+
+
+def write_report(path):
+    """ Writes report() as JSON. """
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=2, default=str)
+
+
+def write_profile(path):
+    """ Writes the cProfile stats (e.g. for pstats, snakeviz or flameprof), if profiling was enabled. """
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _profiler.dump_stats(path)
+    if _enabled:
+        _profiler.enable()
+
+
+def write_flamegraph(path):
+    """ Writes the stages as collapsed stacks ('outer;inner microseconds' per line, self time of every stage), which
+    flamegraph.pl and speedscope read. """
+    self_time = {}
+    for r in _records:
+        self_time[r['path']] = self_time.get(r['path'], 0.0) + r['seconds']
+        parent = r['path'].rpartition(';')[0]
+        if parent:
+            self_time[parent] = self_time.get(parent, 0.0) - r['seconds']
+    with open(path, 'w') as f:
+        for path_, seconds in self_time.items():
+            f.write(f"{path_} {max(0, int(round(seconds * 1e6)))}\n")
+
+
+def _write_at_exit(pid, report_path, profile_path, flamegraph_path):
+    if os.getpid() != pid:  # e.g. a worker process forked from the process that enabled the instrumentation
+        return
+    if report_path:
+        write_report(report_path)
+    if profile_path:
+        write_profile(profile_path)
+    if flamegraph_path:
+        write_flamegraph(flamegraph_path)
+
+
+def _enable_from_environment():
+    instrument = os.environ.get(ENV_INSTRUMENT, '')
+    profile = os.environ.get(ENV_PROFILE, '')
+    flamegraph = os.environ.get(ENV_FLAMEGRAPH, '')
+    if instrument.lower() in ('', '0', 'false', 'no') and not profile and not flamegraph:
+        return
+    enable(profile=bool(profile))
+    report_path = instrument if instrument.lower().endswith('.json') else None
+    if report_path or profile or flamegraph:
+        atexit.register(_write_at_exit, os.getpid(), report_path, profile, flamegraph)
+
+
+_enable_from_environment()
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from .fft import DURATION_CUTS, band_slices, decomposed_columns, duration_cuts_to_freq_cuts, spectrum_positions
+from .instrumentation import instrumented
+from .lazy_frame import LazyFrame
+
+DEFAULT_CACHE_BYTES = 512 * 2**20
+
+
+class LazyDecomposition(LazyFrame):
+    """
+    Lazy version of the dataframe returned by add_decomposed_ts (same columns and index).
+    Only the forward spectrum of every column is computed upfront. A band is transformed back when it is selected,
+    e.g. with decomposition.loc(axis=1)[regions, variables, spectra], and kept in an LRU cache bounded by cache_bytes.
+    The bands equal the ones of add_decomposed_ts up to floating point precision.
+    """
+    def __init__(self, df, duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True,
+                 cache_bytes=DEFAULT_CACHE_BYTES, workers=None):
+        """
+        :param df: pd.DataFrame (time-series dataframe)
+        :param duration_cuts: dict
+        :param remove_dc: bool
+        :param accumulate_spectra: bool
+        :param cache_bytes: int (memory cap of the cached bands)
+        :param workers: int (threads of the scipy.fft transforms, -1 for all cores)
+        """
+        from scipy.fft import rfft
+        spectra, positions = spectrum_positions(duration_cuts)
+        base_columns, indexer = df.columns.sort_values(return_indexer=True)
+        super().__init__(df.index, decomposed_columns(base_columns, spectra))
+        self.base_columns = base_columns
+        self.spectra = spectra
+        self.remove_dc = remove_dc
+        self.cache_bytes = cache_bytes
+        self.workers = workers
+
+        self._values = df.to_numpy(dtype=np.float64).T[indexer]  # (columns, time)
+        self._mean = self._values.mean(axis=1)
+        self._spectrum = rfft(self._values, axis=-1, workers=workers)
+        self._spectrum[:, 0] = 0  # DC component
+        self._slices = band_slices(len(df), duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra))
+        # spectrum level code -> index of the duration cut (band), None for the raw data
+        self._bands = [None] * len(spectra)
+        for band, pos in enumerate(positions[:-1]):
+            self._bands[pos] = band
+        self._cache = OrderedDict()  # (column, band) -> np.ndarray
+        self._cached_bytes = 0
+
+    @property
+    def cached_bytes(self):
+        return self._cached_bytes
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._cached_bytes = 0
+
+    def append_columns(self, columns, weights, base_columns):
+        """
+        Appends derived columns that are linear combinations of existing ones (e.g. custom regions or variables, see
+        ColumnAggregation). Their spectra are combined from the spectra of the existing columns, so no new forward
+        transform is needed, and the cached bands stay valid.
+        :param columns: pd.MultiIndex (new columns, without the spectrum level)
+        :param weights: scipy.sparse matrix or np.ndarray (shape (len(base_columns), len(columns)))
+        :param base_columns: pd.MultiIndex (existing columns, without the spectrum level, that weights refer to)
+        """
+        indexer = self.base_columns.get_indexer(base_columns)
+        if (indexer < 0).any():
+            raise KeyError(f'{list(base_columns[indexer < 0])} not in columns')
+        if columns.isin(self.base_columns).any():
+            raise ValueError(f'{list(columns[columns.isin(self.base_columns)])} already in columns')
+        weights = weights.T
+        self._values = np.concatenate([self._values, weights @ self._values[indexer]])
+        self._mean = np.concatenate([self._mean, weights @ self._mean[indexer]])
+        self._spectrum = np.concatenate([self._spectrum, weights @ self._spectrum[indexer]])
+        self.base_columns = self.base_columns.append(columns)
+        self.columns = decomposed_columns(self.base_columns, self.spectra)
+
+    def _column_values(self, positions):
+        n_spectra = len(self._bands)
+        requested = [(p // n_spectra, self._bands[p % n_spectra]) for p in positions]
+        missing = {}
+        for column, band in requested:
+            if band is not None and (column, band) not in self._cache:
+                missing.setdefault(band, set()).add(column)
+        computed = {}
+        for band, columns in missing.items():
+            columns = sorted(columns)
+            for column, values in zip(columns, self._inverse_transform(band, columns)):
+                computed[(column, band)] = values
+
+        out = np.empty((len(positions), len(self.index)))
+        for i, key in enumerate(requested):
+            column, band = key
+            if band is None:
+                out[i] = self._values[column]
+            elif key in computed:
+                out[i] = computed[key]
+            else:
+                out[i] = self._cache[key]
+                self._cache.move_to_end(key)
+        for key, values in computed.items():
+            self._store(key, values)
+        return out.T
+
+    @instrumented()
+    def _inverse_transform(self, band, columns):
+        """ Transforms one band of several columns back into the time domain.
+        :return: np.ndarray (shape (columns, time))
+        """
+        from scipy.fft import irfft
+        sl = self._slices[band]
+        buffer = np.zeros((len(columns), self._spectrum.shape[1]), dtype=self._spectrum.dtype)
+        buffer[:, sl] = self._spectrum[columns, sl]
+        values = irfft(buffer, len(self.index), axis=-1, workers=self.workers)
+        if not self.remove_dc:
+            values += self._mean[columns, np.newaxis]
+        return values
+
+    def _store(self, key, values):
+        if values.nbytes > self.cache_bytes:
+            return
+        # values is a row of the batch of _inverse_transform, a view would keep the whole batch alive
+        self._cache[key] = values.copy()
+        self._cached_bytes += values.nbytes
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
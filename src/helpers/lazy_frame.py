@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+
+class LazyFrame(object):
+    """ Base class for read-only, frame-like objects whose columns are only materialized when they are selected.
+    Supports the column selections used in the dashboards, e.g. frame.loc(axis=1)[regions, variables, spectra],
+    which return a regular pd.DataFrame. Child classes implement _column_values.
+    """
+    def __init__(self, index, columns):
+        self.index = index
+        self.columns = columns
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.columns)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def loc(self):
+        return _LocIndexer(self)
+
+    @property
+    def iloc(self):
+        return _ILocIndexer(self)
+
+    def __getitem__(self, key):
+        return self.loc(axis=1)[key]
+
+    def to_frame(self):
+        """ Materializes all columns.
+        :return: pd.DataFrame
+        """
+        return self.take_columns(np.arange(len(self.columns)))
+
+    def take_columns(self, positions):
+        """ Materializes the columns at the given positions.
+        :param positions: np.ndarray of int
+        :return: pd.DataFrame
+        """
+        positions = np.asarray(positions, dtype=int)
+        return pd.DataFrame(self._column_values(positions), index=self.index, columns=self.columns[positions],
+                            copy=False)
+
+    def column_positions(self, key):
+        """ Translates a column selection (as used with df.loc(axis=1)[key]) into column positions.
+        :param key: label, list, slice or tuple of those (one per column level), or boolean mask
+        :return: np.ndarray of int (ordered like the lists in key, as df.loc)
+        """
+        if isinstance(key, (np.ndarray, pd.Index, list)) and np.asarray(key).dtype == bool:
+            return np.flatnonzero(key)
+        if isinstance(self.columns, pd.MultiIndex):
+            if not isinstance(key, tuple):
+                key = (key, )
+            return _in_key_order(self.columns, key, np.asarray(self.columns.get_locs(key), dtype=int))
+        if isinstance(key, slice):
+            return np.arange(len(self.columns))[self.columns.slice_indexer(key.start, key.stop, key.step)]
+        if np.ndim(key) == 0:
+            key = [key]
+        positions = self.columns.get_indexer(key)
+        if (positions < 0).any():
+            raise KeyError(f"{list(np.asarray(key)[positions < 0])} not in columns")
+        return positions
+
+    def _column_values(self, positions):
+        """ :return: np.ndarray (shape (time, len(positions))) """
+        raise NotImplementedError
+
+
+class _LocIndexer(object):
+    """ Mimics the column selection of pd.DataFrame.loc: frame.loc(axis=1)[key] and frame.loc[rows, key]. """
+    def __init__(self, frame, axis=0):
+        self.frame = frame
+        self.axis = axis
+
+    def __call__(self, axis=0):
+        return _LocIndexer(self.frame, axis)
+
+    def __getitem__(self, key):
+        if self.axis in (1, 'columns'):
+            rows, cols = slice(None), key
+        elif isinstance(key, tuple) and len(key) == 2:
+            rows, cols = key
+        else:
+            rows, cols = key, slice(None)
+        df = self.frame.take_columns(self.frame.column_positions(cols))
+        if isinstance(rows, slice) and rows == slice(None):
+            return df
+        return df.loc[rows]
+
+
+class _ILocIndexer(object):
+    """ Mimics the column selection by position of pd.DataFrame.iloc: frame.iloc[:, positions]. """
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __getitem__(self, key):
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        positions = np.arange(len(self.frame.columns))[cols]
+        df = self.frame.take_columns(np.atleast_1d(positions))
+        if isinstance(rows, slice) and rows == slice(None):
+            return df
+        return df.iloc[rows]
+
+
+def _in_key_order(columns, key, positions):
+    """ Orders the positions of a MultiIndex selection level by level like the lists in key, levels selected by a
+    label or slice in the order of the columns (MultiIndex.get_locs does so in recent pandas versions only).
+    :param columns: pd.MultiIndex
+    :param key: tuple (one label, list or slice per level)
+    :param positions: np.ndarray of int
+    :return: np.ndarray of int
+    """
+    ranks = []
+    for i, k in enumerate(key):
+        labels = columns.get_level_values(i)[positions]
+        if isinstance(k, (list, np.ndarray, pd.Index)):
+            ranks.append(pd.Index(list(dict.fromkeys(k))).get_indexer(labels))
+        else:
+            ranks.append(pd.factorize(labels)[0])
+    return positions[np.lexsort([positions] + ranks[::-1])]
@@ -0,0 +1,24 @@
+""" Lazy re-exports of the packages: a module behind a name is only imported when the name is first used. The import
+budget is checked by benchmarks/import_time.py.
+"""
+import importlib
+import sys
+
+
+def lazy_exports(package, exports):
+    """ Module __getattr__ and __dir__ (PEP 562) of a package whose names are imported on first access.
+    :param package: str (__name__ of the package)
+    :param exports: dict (name -> module relative to the package, e.g. '.fft')
+    :return: tuple (__getattr__, __dir__)
+    """
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        setattr(sys.modules[package], name, value)  # later lookups do not go through __getattr__
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(exports))
+
+    return __getattr__, __dir__
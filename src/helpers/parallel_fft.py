@@ -0,0 +1,78 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .fft import fill_decomposition
+from .instrumentation import instrumented
+
+SHARED_MEMORY_DIR = '/dev/shm'  # memory-backed files on Linux, a temporary directory is used elsewhere
+
+
+@instrumented()
+def parallel_decomposition(values, slices, n_bands, positions, remove_dc=True, n_jobs=2):
+    """
+    Same as fft.fill_decomposition into fft.empty_bands, but splits the columns across n_jobs worker processes.
+    The workers write the bands into a memory-mapped file, which is returned as the result without a copy.
+    :param values: np.ndarray (shape (time, columns))
+    :param slices: list of slices (see fft.band_slices)
+    :param n_bands: int (number of spectra incl. 'raw_data')
+    :param positions: np.ndarray (see fft.spectrum_positions)
+    :param remove_dc: bool
+    :param n_jobs: int (number of worker processes)
+    :return: np.ndarray (shape (time, columns, spectra), a view of a (columns, spectra, time) np.memmap)
+    """
+    n, c = values.shape
+    directory = SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) else None
+    fd, path = tempfile.mkstemp(suffix='.bands', dir=directory)
+    os.close(fd)
+    try:
+        bands = np.memmap(path, dtype=np.float64, mode='w+', shape=(c, n_bands, n))
+        with SharedArray((c, n)) as shared_in:
+            shared_in.array[:] = values.T
+            # a few chunks per worker, so that the workers are balanced if some finish early
+            bounds = np.unique(np.linspace(0, c, min(4 * n_jobs, c) + 1).astype(int))
+            tasks = [
+                (shared_in.name, path, n, c, n_bands, i0, i1, slices, positions, remove_dc)
+                for i0, i1 in zip(bounds[:-1], bounds[1:])
+            ]
+            with ProcessPoolExecutor(n_jobs) as executor:
+                list(executor.map(_fill_chunk, tasks))
+        if os.name == 'nt':  # an open file can not be removed, the bands are copied into memory
+            bands = np.array(bands)
+    finally:
+        os.remove(path)  # elsewhere the memory map keeps the content until the bands are freed
+    return bands.transpose(2, 0, 1)
+
+
+def _fill_chunk(task):
+    """ Worker: decomposes the columns i0:i1 of the shared input into the memory-mapped bands. """
+    in_name, out_path, n, c, n_bands, i0, i1, slices, positions, remove_dc = task
+    with SharedArray((c, n), name=in_name) as shared_in:
+        bands = np.memmap(out_path, dtype=np.float64, mode='r+', shape=(c, n_bands, n))
+        fill_decomposition(shared_in.array[i0:i1].T, slices, bands[i0:i1].transpose(2, 0, 1), positions, remove_dc)
+        bands.flush()
+        del bands
+
+
+class SharedArray(object):
+    """ float64 array in shared memory. Creates (and finally unlinks) the memory block if no name is given,
+    otherwise attaches to the existing block with that name.
+    """
+    def __init__(self, shape, name=None):
+        size = max(int(np.prod(shape)) * 8, 1)
+        self._owner = name is None
+        self._shm = SharedMemory(name=name, create=self._owner, size=size if self._owner else 0)
+        self.name = self._shm.name
+        self.array = np.ndarray(shape, dtype=np.float64, buffer=self._shm.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
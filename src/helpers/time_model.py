@@ -1,11 +1,110 @@
+import numpy as np
 import pandas as pd
 
+from .columns import append_column_level
+from .confidence_interval import CI_AGGREGATIONS, confidence_interval_bounds, grouped_confidence_interval
+from .instrumentation import instrumented
+
+HOURS_PER_YEAR = 8760
+_TIME_MODELS = []  # the most recently used TimeModels, see get_time_model
+_MAX_TIME_MODELS = 4
+
+
+def datetime_index_to_hour_of_year(df, time_model=None):
+    """ Replaces the DatetimeIndex of df by a (year, hour_of_year) MultiIndex.
+    :param df: pd.DataFrame (with DatetimeIndex)
+    :param time_model: TimeModel (of df.index, looked up or computed if not given)
+    :return: pd.DataFrame
+    """
+    time_model = time_model or get_time_model(df.index)
+    return df.set_axis(time_model.index, axis=0)
+
+
+def hour_of_year(index):
+    """ Hour of the year (1 to 8760) on a calendar without leap days, so that the hours of all years line up.
+    In leap years the hours after February 28 are shifted back by one day, the hours of February 29 are counted
+    as the ones of February 28.
+    :param index: pd.DatetimeIndex
+    :return: np.ndarray of int
+    """
+    day = np.asarray(index.dayofyear) - 1
+    after_feb_28 = np.asarray(index.is_leap_year) & (day >= 59)
+    day = day - after_feb_28
+    return day * 24 + np.asarray(index.hour) + 1
+
+
+class TimeModel(object):
+    """ Year and hour of the year of every timestamp of a DatetimeIndex, computed once per dataset.
+    If every year consists of the hours 1 to 8760 in order, the data can be viewed as a (year, hour, column) cube
+    without copying it.
+    """
+    def __init__(self, datetime_index):
+        self.datetime_index = datetime_index
+        self.year = np.asarray(datetime_index.year)
+        self.hour_of_year = hour_of_year(datetime_index)
+        self.index = pd.MultiIndex.from_arrays([self.year, self.hour_of_year], names=['year', 'hour_of_year'])
+        self.years = np.unique(self.year)
+        n_years = len(self.years)
+        self.is_regular = (
+            len(self.year) == n_years * HOURS_PER_YEAR
+            and (self.year.reshape(n_years, HOURS_PER_YEAR) == self.years[:, np.newaxis]).all()
+            and (self.hour_of_year.reshape(n_years, HOURS_PER_YEAR) == np.arange(1, HOURS_PER_YEAR + 1)).all()
+        )
+
+    def reshape(self, values):
+        """ (year, hour, column) view of a (time, column) array with this time index.
+        :param values: np.ndarray
+        :return: np.ndarray (or None if the time index is not regular)
+        """
+        if not self.is_regular:
+            return None
+        return values.reshape(len(self.years), HOURS_PER_YEAR, -1)
+
+
+def get_time_model(datetime_index):
+    """ Returns the TimeModel of datetime_index, reusing it if it has been computed recently for the same index.
+    Column selections of a dataframe have an equal index, so the dashboards compute the time model only once.
+    :param datetime_index: pd.DatetimeIndex
+    :return: TimeModel
+    """
+    for time_model in _TIME_MODELS:
+        if time_model.datetime_index is datetime_index or time_model.datetime_index.equals(datetime_index):
+            return time_model
+    time_model = TimeModel(datetime_index)
+    _TIME_MODELS.insert(0, time_model)
+    del _TIME_MODELS[_MAX_TIME_MODELS:]
+    return time_model
+
+
+@instrumented()
+def aggregate_by_hour_of_year(df, confidence_interval=False, time_model=None):
+    """ Mean (or upper_ci, mean, lower_ci) over all years for every hour of the year.
+    Works on the (year, hour, column) view of the data if possible, otherwise groups by the hour_of_year.
+    :param df: pd.DataFrame (with DatetimeIndex)
+    :param confidence_interval: bool
+    :param time_model: TimeModel (of df.index, looked up or computed if not given)
+    :return: pd.DataFrame (index: hour_of_year, columns: df.columns with an appended 'aggregation' level)
+    """
+    time_model = time_model or get_time_model(df.index)
+    cube = time_model.reshape(df.to_numpy(dtype=np.float64))
+    if cube is None:
+        data = datetime_index_to_hour_of_year(df, time_model)
+        if confidence_interval:
+            return grouped_confidence_interval(data, level='hour_of_year')
+        data = data.groupby(level='hour_of_year').agg(['mean'])
+        data.columns.names = list(df.columns.names) + ['aggregation']
+        return data
+
+    mean = cube.mean(axis=0)
+    if confidence_interval:
+        n_years = cube.shape[0]
+        sem = cube.std(axis=0, ddof=1) / np.sqrt(n_years)
+        result = confidence_interval_bounds(mean, sem, np.array(n_years))
+        aggregations = CI_AGGREGATIONS
+    else:
+        result = mean[:, :, np.newaxis]
+        aggregations = ['mean']
+    index = pd.Index(np.arange(1, HOURS_PER_YEAR + 1), name='hour_of_year')
+    columns = append_column_level(df.columns, aggregations, 'aggregation')
+    return pd.DataFrame(result.reshape(HOURS_PER_YEAR, -1), index=index, columns=columns)
 
-def datetime_index_to_hour_of_year(df):
-    dff = df.copy()
-    ref = pd.Timestamp('2018-01-01 00:00:00')
-    dff.loc[:, 'year'] = dff.index.year
-    hour_of_year = lambda x: (x.replace(year=2018) - ref).total_seconds() / 3600
-    dff.loc[:, 'hour_of_year'] = dff.index.map(hour_of_year).astype(int) + 1
-    dff = dff.set_index(['year', 'hour_of_year'])
-    return dff
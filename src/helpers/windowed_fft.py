@@ -0,0 +1,292 @@
+""" Windowed (short-time) Fourier decomposition, per climate year or in overlapping tapered windows joined by
+overlap-add. Bands whose slowest period does not fit MIN_PERIODS_PER_WINDOW times into a window raise a ValueError.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .fft import (DT, DURATION_CUTS, band_slices, decomposed_columns, duration_cuts_to_freq_cuts, empty_bands,
+                  fill_decomposition, spectrum_positions)
+from .flex_requirements import DEFAULT_PERCENTILES, flexibility_requirements
+from .instrumentation import instrumented
+from .time_model import get_time_model
+
+WINDOW_YEAR = 'year'
+MIN_PERIODS_PER_WINDOW = 8  # periods of the slowest variation of a band within a window (see check_resolved_bands)
+
+
+def iter_windowed_decomposition(df, window=WINDOW_YEAR, overlap=0.5, duration_cuts=DURATION_CUTS, remove_dc=True,
+                                accumulate_spectra=True, n_jobs=1, workers=None):
+    """
+    Decomposes df window by window and yields the decomposed rows in order: one block per climate year (window='year',
+    no taper), or per hop between Hann-tapered windows of a length in hours, joined by overlap-add (the ends mirrored).
+    The variations slower than the window are added to the bands without upper duration cut.
+    :param df: pd.DataFrame (time-series dataframe, sorted by time, may be memory-mapped, e.g. from
+        read_pecd_xls_file, then only the windows in flight are read)
+    :param window: 'year' or int (window length in hours)
+    :param overlap: float (fraction of the window shared with the next one, in [0, 1), only for window lengths)
+    :param duration_cuts: dict
+    :param remove_dc: bool (if False, the mean of every year or of the whole history is added to the bands)
+    :param accumulate_spectra: bool
+    :param n_jobs: int (number of windows decomposed concurrently in threads, the transforms release the GIL)
+    :param workers: int (threads of the scipy.fft transforms of each window)
+    :return: generator of pd.DataFrame (columns as add_decomposed_ts, a slice of df.index)
+    """
+    freq_cuts = duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra)
+    windows, (length, hop) = checked_windows(df.index, window, overlap, duration_cuts, freq_cuts)
+    spectra, positions = spectrum_positions(duration_cuts)
+    columns, indexer = df.columns.sort_values(return_indexer=True)
+    out_columns = decomposed_columns(columns, spectra)
+    values = df.to_numpy(dtype=np.float64)  # no copy for frames with a single float64 block
+    n = len(values)
+
+    def block_frame(start, block):
+        return pd.DataFrame(block.reshape(len(block), -1), index=df.index[start:start + len(block)],
+                            columns=out_columns, copy=False)
+
+    if window == WINDOW_YEAR:
+        slices = {stop - start: band_slices(stop - start, freq_cuts) for start, stop in windows}
+
+        def decompose(bounds):
+            start, stop = bounds
+            return _decompose_window(values[start:stop, indexer], slices[stop - start], positions, remove_dc, workers)
+
+        for (start, _), block in zip(windows, _ordered_thread_map(decompose, windows, n_jobs)):
+            yield block_frame(start, block)
+        return
+
+    taper = hann_taper(length) if hop < length else np.ones(length)
+    slices = band_slices(length, freq_cuts)
+    starts = tapered_window_starts(n, length, hop)
+    mean = values.mean(axis=0)[indexer]
+    open_positions = positions[:-1][freq_cuts[:, 0] == 0]
+
+    def decompose(start):
+        rows = mirrored_rows(start, length, n)
+        out = _decompose_window(values[np.ix_(rows, indexer)], slices, positions, True, workers, taper)
+        trend = out[:, :, positions[-1]].sum(axis=0) / taper.sum() - mean  # mean of the window - mean of the history
+        out[:, :, open_positions] += taper[:, np.newaxis, np.newaxis] * trend[:, np.newaxis]
+        if not remove_dc:
+            out[:, :, positions[:-1]] += taper[:, np.newaxis, np.newaxis] * mean[:, np.newaxis]
+        return out
+
+    # accumulated bands and tapers of the rows start:start + length of the current window
+    acc = np.zeros((length, len(columns), len(spectra)))
+    weight = np.zeros(length)
+    for start, bands in zip(starts, _ordered_thread_map(decompose, starts, n_jobs)):
+        acc += bands
+        weight += taper
+        # rows before the start of the next window are complete
+        done = hop if start + hop < n else length
+        lo, hi = max(start, 0), min(start + done, n)
+        if lo < hi:
+            block = acc[lo - start:hi - start] / weight[lo - start:hi - start, np.newaxis, np.newaxis]
+            yield block_frame(lo, block)
+        acc[:length - hop] = acc[hop:]
+        acc[length - hop:] = 0
+        weight[:length - hop] = weight[hop:]
+        weight[length - hop:] = 0
+
+
+@instrumented()
+def windowed_decomposition(df, window=WINDOW_YEAR, overlap=0.5, duration_cuts=DURATION_CUTS, remove_dc=True,
+                           accumulate_spectra=True, n_jobs=1, workers=None, path=None):
+    """
+    Whole-history output of iter_windowed_decomposition, written block by block into one dataframe or, if a path is
+    given, into a DecompositionStore on disk (then only the windows in flight are held in memory).
+    :param df: pd.DataFrame (time-series dataframe)
+    :param window: 'year' or int (window length in hours)
+    :param overlap: float
+    :param duration_cuts: dict
+    :param remove_dc: bool
+    :param accumulate_spectra: bool
+    :param n_jobs: int
+    :param workers: int
+    :param path: str (directory of a DecompositionStore, optional)
+    :return: pd.DataFrame (columns as add_decomposed_ts, or DecompositionStore if path is given)
+    """
+    spectra, _ = spectrum_positions(duration_cuts)
+    columns = decomposed_columns(df.columns.sort_values(), spectra)
+    blocks = iter_windowed_decomposition(df, window, overlap, duration_cuts, remove_dc, accumulate_spectra, n_jobs,
+                                         workers)
+    if path is None:
+        out = empty_bands((len(df), len(df.columns)), len(spectra)).reshape(len(df), -1)
+        row = 0
+        for block in blocks:
+            out[row:row + len(block)] = block.to_numpy()
+            row += len(block)
+        return pd.DataFrame(out, index=df.index, columns=columns, copy=False)
+
+    from .decomposition_store import DecompositionStore
+    checked_windows(df.index, window, overlap, duration_cuts,
+                    duration_cuts_to_freq_cuts(duration_cuts, accumulate_spectra))  # before the store is created
+    store = DecompositionStore.create(path, df.index, columns)
+    n, offset = len(df), store.values.offset
+    # The store is column-major: every column of a block is one contiguous range on disk, written directly instead of
+    # through the memory map (whose dirty pages would count as memory used).
+    with open(store.values_path, 'r+b') as f:
+        row = 0
+        for block in blocks:
+            values = block.to_numpy()
+            for j in range(values.shape[1]):
+                f.seek(offset + (j * n + row) * 8)
+                f.write(np.ascontiguousarray(values[:, j]).data)
+            row += len(block)
+    return DecompositionStore(path)
+
+
+@instrumented()
+def windowed_flexibility_requirements(df, percentiles=DEFAULT_PERCENTILES, window=WINDOW_YEAR, overlap=0.5,
+                                      duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True, n_jobs=1,
+                                      workers=None):
+    """
+    Flexibility requirements per climate year of the windowed decomposition, computed from the stream: the blocks of
+    a climate year are collected until the year is complete, so at most one year of bands is held in memory.
+    :param df: pd.DataFrame (time-series dataframe)
+    :param percentiles: list of numbers in [0, 100]
+    :param window: 'year' or int (window length in hours)
+    :param overlap: float
+    :param duration_cuts: dict
+    :param remove_dc: bool
+    :param accumulate_spectra: bool
+    :param n_jobs: int
+    :param workers: int
+    :return: pd.DataFrame (index (year, percentile), columns as add_decomposed_ts, see flexibility_requirements)
+    """
+    results, year_blocks = [], []
+    blocks = iter_windowed_decomposition(df, window, overlap, duration_cuts, remove_dc, accumulate_spectra, n_jobs,
+                                         workers)
+    for block in blocks:
+        year = np.asarray(block.index.year)
+        # a block of a tapered window may span the turn of a year
+        for part in np.split(np.arange(len(block)), np.flatnonzero(np.diff(year)) + 1):
+            if year_blocks and year_blocks[-1].index[0].year != year[part[0]]:
+                results.append(flexibility_requirements(pd.concat(year_blocks), percentiles))
+                year_blocks = []
+            year_blocks.append(block.iloc[part])
+    if year_blocks:
+        results.append(flexibility_requirements(pd.concat(year_blocks), percentiles))
+    return pd.concat(results)
+
+
+def checked_windows(datetime_index, window, overlap, duration_cuts, freq_cuts):
+    """ Checks the window and that it resolves all bands (see check_resolved_bands).
+    :return: tuple (list of (start, stop) of the years or None, (window length, hop) or (None, None) for years)
+    """
+    if window == WINDOW_YEAR:
+        windows = year_windows(datetime_index)
+        check_resolved_bands(duration_cuts, freq_cuts, min(stop - start for start, stop in windows))
+        return windows, (None, None)
+    length, hop = window_length_and_hop(window, overlap, len(datetime_index))
+    check_resolved_bands(duration_cuts, freq_cuts, length)
+    return None, (length, hop)
+
+
+def check_resolved_bands(duration_cuts, freq_cuts, length):
+    """ Raises a ValueError for the bands whose slowest variation does not fit MIN_PERIODS_PER_WINDOW times into a
+    window of length hours (bands without an upper duration cut are not limited).
+    :param duration_cuts: dict
+    :param freq_cuts: np.ndarray (see duration_cuts_to_freq_cuts)
+    :param length: int (hours of the shortest window)
+    """
+    lowest = freq_cuts[:, 0] * DT  # per hour
+    periods = np.divide(1, lowest, out=np.zeros_like(lowest), where=lowest > 0)
+    unresolved = [name for name, period in zip(duration_cuts, periods) if period * MIN_PERIODS_PER_WINDOW > length]
+    if unresolved:
+        raise ValueError(f"Windows of {length} hours can not resolve the bands {unresolved}, they need windows of at "
+                         f"least {int(np.ceil(periods.max() * MIN_PERIODS_PER_WINDOW))} hours. Use a longer window, "
+                         f"accumulate_spectra or add_decomposed_ts without window.")
+
+
+def year_windows(datetime_index):
+    """
+    Row ranges of the climate years of a sorted DatetimeIndex.
+    :param datetime_index: pd.DatetimeIndex
+    :return: list of tuples (start, stop)
+    """
+    year = get_time_model(datetime_index).year
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(year)) + 1, [len(year)]])
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def window_length_and_hop(window, overlap, n):
+    """
+    :param window: int (window length in hours)
+    :param overlap: float (in [0, 1))
+    :param n: int (number of time steps)
+    :return: tuple (window length, hop between the starts of two windows)
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError(f"overlap must be in [0, 1), got {overlap}")
+    length = int(window)
+    if not 2 <= length <= n:
+        raise ValueError(f"window must be 'year' or between 2 and {n} hours, got {window}")
+    return length, max(1, length - int(round(length * overlap)))
+
+
+def hann_taper(length):
+    """ Periodic Hann window: the windows add up to a constant for an overlap of 1/2 (and 2/3, 3/4, ...).
+    :param length: int
+    :return: np.ndarray
+    """
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)
+
+
+def tapered_window_starts(n, length, hop):
+    """ Starts of the overlapping windows. The first windows start before the first row, so that every row is covered
+    by as many windows as the rows in the middle.
+    :param n: int (number of time steps)
+    :param length: int
+    :param hop: int
+    :return: list of int
+    """
+    first = -((length - 1) // hop) * hop
+    return list(range(first, n, hop))
+
+
+def mirrored_rows(start, length, n):
+    """ Rows start:start + length, mirrored at the first and the last row.
+    :param start: int
+    :param length: int
+    :param n: int
+    :return: np.ndarray of int
+    """
+    period = 2 * (n - 1)
+    rows = np.abs(np.arange(start, start + length)) % period
+    return np.where(rows >= n, period - rows, rows)
+
+
+def _decompose_window(values, slices, positions, remove_dc, workers, taper=None):
+    """ Decomposes the (time, columns) values of one window into a (time, columns, spectra) array.
+    With a taper, the (taper weighted) mean of the window is removed before the values are tapered, otherwise the
+    tapered mean would leak into the lowest bands; 'raw_data' holds the tapered values.
+    """
+    out = empty_bands(values.shape, len(positions))
+    if taper is None:
+        fill_decomposition(values, slices, out, positions, remove_dc, workers=workers)
+        return out
+    mean = taper @ values / taper.sum()
+    fill_decomposition((values - mean) * taper[:, np.newaxis], slices, out, positions, workers=workers)
+    out[:, :, positions[-1]] = values * taper[:, np.newaxis]
+    return out
+
+
+def _ordered_thread_map(func, items, n_jobs):
+    """ Lazy map over a thread pool that yields the results in order and keeps at most 2 * n_jobs of them in flight.
+    :param func: callable
+    :param items: list
+    :param n_jobs: int
+    """
+    if n_jobs == 1:
+        yield from map(func, items)
+        return
+    with ThreadPoolExecutor(n_jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
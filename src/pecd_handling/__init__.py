@@ -1,3 +1,15 @@
-from .pecd_import import read_pecd_xls_file
-from .custom_variables import add_custom_variable
-from .custom_region import add_custom_region
+from src.helpers.lazy_imports import lazy_exports
+
+# name -> module, imported on first use (see src.helpers.lazy_imports)
+_EXPORTS = {
+    'read_pecd_xls_file': '.pecd_import',
+    'add_custom_variable': '.custom_variables',
+    'add_custom_region': '.custom_region',
+    'ColumnAggregation': '.aggregation',
+    'read_capacity_scenarios': '.capacity_scenarios',
+    'capacity_grid': '.capacity_scenarios',
+    'iter_scenario_flexibility_requirements': '.capacity_scenarios',
+    'scenario_flexibility_requirements': '.capacity_scenarios',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from src.helpers.columns import append_column_level
+from src.helpers.instrumentation import instrumented
+from src.helpers.lazy_decomposition import LazyDecomposition
+
+
+class ColumnAggregation(object):
+    """ Derived columns (custom regions, countries, custom variables) as a sparse weight matrix over the base columns,
+    computed in one matrix product. Later definitions may build on earlier ones.
+    """
+    def __init__(self, columns):
+        """
+        :param columns: pd.Index or pd.MultiIndex (base columns)
+        """
+        from scipy import sparse
+        self.flat = not isinstance(columns, pd.MultiIndex)
+        self.base_columns = pd.MultiIndex.from_arrays([columns], names=[columns.name]) if self.flat else columns
+        self.columns = self.base_columns
+        self.weights = sparse.identity(len(columns), format='csc')  # (base columns, columns)
+        self._custom_regions = set()
+
+    @classmethod
+    def from_decomposition(cls, df):
+        """ Aggregation over the columns of a decomposed dataframe (or LazyDecomposition), without the spectra.
+        Declaring e.g. a custom region and applying it to the decomposition adds its bands without any new FFT.
+        :param df: pd.DataFrame or LazyDecomposition (see add_decomposed_ts)
+        :return: ColumnAggregation
+        """
+        return cls(df.columns.droplevel('spectrum').unique())
+
+    @property
+    def derived_columns(self):
+        return self._output_columns(self.columns[len(self.base_columns):])
+
+    def _output_columns(self, columns):
+        return columns.get_level_values(0) if self.flat else columns
+
+    def add_columns(self, columns, weights):
+        """
+        Adds derived columns as linear combinations of the columns declared so far.
+        :param columns: pd.MultiIndex (new columns, same levels as the base columns)
+        :param weights: scipy.sparse matrix or np.ndarray (shape (len(self.columns), len(columns)))
+        """
+        from scipy import sparse
+        if not isinstance(columns, pd.MultiIndex):
+            columns = pd.MultiIndex.from_arrays([columns], names=self.columns.names)
+        duplicated = columns[columns.isin(self.columns) | columns.duplicated()]
+        if len(duplicated):
+            raise ValueError(f'columns {list(duplicated)} are already defined')
+        weights = sparse.csc_matrix(weights)
+        self.weights = sparse.hstack([self.weights, self.weights @ weights], format='csc')
+        self.columns = self.columns.append(columns)
+
+    def add_aggregate(self, level, mapping, weights=None, method='sum', positions=None):
+        """
+        Per combination of the other levels, aggregates the columns whose label on level is a key of mapping into a
+        new column labelled with the corresponding value of mapping.
+        :param level: str (column level)
+        :param mapping: dict (label -> label of the aggregate)
+        :param weights: dict (label -> multiplier, default 1)
+        :param method: str ('sum' or 'mean', the mean is weighted by the multipliers)
+        :param positions: np.ndarray of int (positions of the columns that may be aggregated, default all)
+        :return: pd.MultiIndex (the added columns)
+        """
+        from scipy import sparse
+        lvl = self.columns.names.index(level)
+        labels = self.columns.get_level_values(lvl)
+        if positions is None:
+            positions = np.arange(len(self.columns))
+        positions = positions[labels[positions].isin(list(mapping))]
+        if not len(positions):
+            return self.columns[:0]
+        labels = labels[positions]
+        arrays = [self.columns.get_level_values(i)[positions] for i in range(self.columns.nlevels)]
+        arrays[lvl] = labels.map(mapping)
+        keys, columns = pd.factorize(pd.MultiIndex.from_arrays(arrays))
+        columns = columns.set_names(self.columns.names)
+        values = np.ones(len(positions)) if weights is None else labels.map(weights).to_numpy(dtype=np.float64)
+        if method == 'mean':
+            values = values / np.bincount(keys, weights=values)[keys]
+        elif method != 'sum':
+            raise ValueError(f"method must be 'sum' or 'mean', not {method!r}")
+        m = sparse.csc_matrix((values, (positions, keys)), shape=(len(self.columns), len(columns)))
+        self.add_columns(columns, m)
+        return columns
+
+    def add_region(self, name, group, method='sum'):
+        """ Custom region: per variable (and other levels), the sum or mean of the regions in group.
+        :param name: str (name of new region)
+        :param group: list (e.g. ['DE00', 'AT00', 'FR00'])
+        :param method: str ('mean' or 'sum')
+        """
+        regions = self.columns.get_level_values('region')
+        unknown = [r for r in group if r not in regions]
+        if unknown:
+            raise KeyError(f'regions {unknown} not in columns')
+        self.add_aggregate('region', {r: name for r in group}, method=method)
+        self._custom_regions.add(name)
+
+    def add_variable(self, name, sum_of):
+        """ Custom variable: per region (and other levels), the sum of existing variables with multipliers.
+        :param name: str (name of new variable (e.g. residual_load))
+        :param sum_of: dict (multipliers of the variables (e.g. {'load': 1, 'pv': -1, ...}))
+        """
+        self.add_aggregate('variable', {v: name for v in sum_of}, weights=sum_of)
+
+    def add_countries(self, method='sum'):
+        """ Aggregates the PECD zones (all regions but the custom ones) by country, the first two characters of the
+        zone names (e.g. DE00 -> DE).
+        :param method: str ('sum' or 'mean')
+        :return: pd.Index (the added country columns)
+        """
+        regions = self.columns.get_level_values('region')
+        positions = np.flatnonzero(~regions.isin(list(self._custom_regions)))
+        zones = regions[positions].unique()
+        return self._output_columns(self.add_aggregate('region', dict(zip(zones, zones.str[:2])), method=method,
+                                                       positions=positions))
+
+    @instrumented()
+    def apply(self, df, columns=None):
+        """ Computes the derived columns in one sparse matrix product. The FFT is linear, so the bands of a decomposed
+        df (or LazyDecomposition) are combined like the raw data, without any new transform.
+        :param df: pd.DataFrame (with the base columns, in any order, optionally decomposed) or LazyDecomposition
+        :param columns: pd.Index (columns of the result, default: the columns of df followed by all derived columns)
+        :return: pd.DataFrame (or LazyDecomposition, with the derived columns appended in place)
+        """
+        if columns is None:
+            positions = np.arange(len(self.base_columns), len(self.columns))
+        else:
+            positions = self._positions(columns)
+        weights = self.weights[:, positions]
+        used = np.unique(weights.indices)  # only the base columns that contribute are read
+        weights = weights.tocsr()[used]
+        if isinstance(df, LazyDecomposition):
+            if columns is not None:
+                raise ValueError('columns can not be selected for a LazyDecomposition')
+            df.append_columns(self.columns[positions], weights, self.base_columns[used])
+            return df
+
+        if df.columns.nlevels > self.base_columns.nlevels:
+            result = self._apply_decomposed(df, weights, used, positions)
+        else:
+            values = df.loc[:, self._output_columns(self.base_columns[used])].to_numpy(dtype=np.float64)
+            result = pd.DataFrame(
+                (weights.T @ values.T).T,
+                index=df.index,
+                columns=self._output_columns(self.columns[positions]),
+                copy=False,
+            )
+        if columns is None:
+            return pd.concat([df, result], axis=1)
+        return result
+
+    def _apply_decomposed(self, df, weights, used, positions):
+        """ Derived columns of a decomposed dataframe: every spectrum is combined like the raw data. """
+        spectra = df.columns.get_level_values(-1).unique()
+        name = df.columns.names[-1]
+        n, n_spectra = len(df), len(spectra)
+        values = df.loc[:, append_column_level(self.base_columns[used], spectra, name)].to_numpy(dtype=np.float64)
+        # (time, used columns, spectra) -> (used columns, time * spectra), so that one product combines all spectra
+        values = values.reshape(n, len(used), n_spectra).transpose(1, 0, 2).reshape(len(used), -1)
+        derived = (weights.T @ values).reshape(len(positions), n, n_spectra).transpose(1, 0, 2)
+        return pd.DataFrame(
+            derived.reshape(n, -1),
+            index=df.index,
+            columns=append_column_level(self.columns[positions], spectra, name),
+            copy=False,
+        )
+
+    def _positions(self, columns):
+        if self.flat and not isinstance(columns, pd.MultiIndex):
+            columns = pd.MultiIndex.from_arrays([columns], names=self.columns.names)
+        positions = self.columns.get_indexer(columns)
+        if (positions < 0).any():
+            raise KeyError(f'{list(columns[positions < 0])} not declared')
+        return positions
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.helpers.files import replacing, temporary_path
+
+
+CACHE_FORMAT_VERSION = 1
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_fingerprint(path, with_hash=True):
+    """ Collects the properties of a source file that the cache is keyed on.
+    :param path: str
+    :param with_hash: bool (hashing reads the whole file, so it is only done when needed)
+    :return: dict
+    """
+    stat = os.stat(path)
+    fingerprint = {
+        'source': os.path.basename(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+    if with_hash:
+        fingerprint['sha1'] = file_hash(path)
+    return fingerprint
+
+
+def file_hash(path):
+    """ sha1 hex digest of a file, read in chunks.
+    :param path: str
+    :return: str
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CacheBackend(object):
+    """ Base class for the caches of parsed PECD files.
+    A cache lives next to the file it was parsed from and carries a small json meta file with the fingerprint
+    (name, size, mtime and hash) of that source file. A cache is only reused if the fingerprint still matches.
+    Files are written next to their destination and moved onto it, frames loaded earlier keep the old files mapped.
+    """
+    name = None
+    extension = None
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.cache_path = os.path.splitext(source_path)[0] + self.extension
+
+    @property
+    def meta_path(self):
+        return self.cache_path + '.json'
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def read_meta(self):
+        if not os.path.isfile(self.meta_path):
+            return None
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def write_meta(self, meta):
+        with replacing(self.meta_path) as tmp_path, open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+
+    def is_valid(self):
+        """ Checks whether the cache exists and was created from the current version of the source file.
+        Size and mtime are compared first; the (expensive) hash is only computed if the mtime changed,
+        e.g. after a copy or a checkout. If the content turns out to be unchanged, the stored mtime is refreshed.
+        :return: bool
+        """
+        meta = self.read_meta()
+        if meta is None or meta.get('version') != CACHE_FORMAT_VERSION or not os.path.exists(self.cache_path):
+            return False
+        current = file_fingerprint(self.source_path, with_hash=False)
+        if meta['source'] != current['source'] or meta['size'] != current['size']:
+            return False
+        if meta['mtime_ns'] == current['mtime_ns']:
+            return True
+        if meta.get('sha1') != file_hash(self.source_path):
+            return False
+        meta['mtime_ns'] = current['mtime_ns']
+        self.write_meta(meta)
+        return True
+
+    def invalidate(self):
+        """ Removes the meta file, so the cache will not be reused. The cached data is overwritten on the next save. """
+        if os.path.isfile(self.meta_path):
+            os.remove(self.meta_path)
+
+    def load(self):
+        meta = self.read_meta()
+        df = self._load(meta)
+        df.columns = _columns_from_meta(meta)
+        return df
+
+    def save(self, df):
+        """ Stores df and marks the cache as valid for the current version of the source file.
+        :param df: pd.DataFrame (with DatetimeIndex)
+        """
+        self.invalidate()
+        self._save(df)
+        self.mark_valid(df.columns, index_name=df.index.name)
+
+    def mark_valid(self, columns, index_name=None):
+        """ Writes the meta file with the fingerprint of the current source file once the data is stored.
+        :param columns: pd.Index
+        :param index_name: str
+        """
+        meta = file_fingerprint(self.source_path)
+        meta.update(_columns_to_meta(columns))
+        meta['index_name'] = index_name
+        meta['version'] = CACHE_FORMAT_VERSION
+        meta['backend'] = self.name
+        self.write_meta(meta)
+
+    def writer(self, index, capacity, columns_name='region'):
+        """ Returns a writer that columns can be streamed into one at a time (see FrameWriter).
+        :param index: pd.DatetimeIndex (shared by all columns)
+        :param capacity: int (maximum number of columns that will be written)
+        :param columns_name: str
+        :return: FrameWriter
+        """
+        return FrameWriter(index, columns_name=columns_name, backend=self)
+
+    def _load(self, meta):
+        raise NotImplementedError
+
+    def _save(self, df):
+        raise NotImplementedError
+
+
+class NpyCache(CacheBackend):
+    """ Stores the values as one column-major .npy block (plus the index as a separate .npy) in a directory.
+    Loading memory-maps the block, so a cold start does not copy or parse anything.
+    """
+    name = 'npy'
+    extension = '.npycache'
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.cache_path, 'meta.json')
+
+    @property
+    def values_path(self):
+        return os.path.join(self.cache_path, 'values.npy')
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_path, 'index.npy')
+
+    def _load(self, meta):
+        # copy-on-write: the frame can be modified in memory without touching the file
+        values = np.load(self.values_path, mmap_mode='c')
+        index = pd.DatetimeIndex(np.load(self.index_path), name=meta.get('index_name'))
+        # a block written by NpyWriter is allocated for all sheets of the file, the columns of the empty sheets at
+        # its end were never written
+        return pd.DataFrame(values[:, :len(meta['columns'])], index=index, copy=False)
+
+    def _save(self, df):
+        os.makedirs(self.cache_path, exist_ok=True)
+        with replacing(self.index_path) as tmp_path:
+            np.save(tmp_path, df.index.values.astype('datetime64[ns]'))
+        with replacing(self.values_path) as tmp_path:
+            values = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=df.shape,
+                                               fortran_order=True)
+            for i in range(df.shape[1]):
+                values[:, i] = df.iloc[:, i].values
+            values.flush()
+            del values
+
+    def writer(self, index, capacity, columns_name='region'):
+        return NpyWriter(index, capacity, columns_name=columns_name, backend=self)
+
+
+class ParquetCache(CacheBackend):
+    """ Parquet file, requires pyarrow. Only supports single-level columns. """
+    name = 'parquet'
+    extension = '.parquet'
+
+    @classmethod
+    def is_available(cls):
+        return _pyarrow_available()
+
+    def _load(self, meta):
+        return pd.read_parquet(self.cache_path, memory_map=True)
+
+    def _save(self, df):
+        with replacing(self.cache_path) as tmp_path:
+            df.set_axis(df.columns.astype(str), axis=1).to_parquet(tmp_path)
+
+
+class FeatherCache(CacheBackend):
+    """ Feather (arrow IPC) file, requires pyarrow. Only supports single-level columns. """
+    name = 'feather'
+    extension = '.feather'
+
+    @classmethod
+    def is_available(cls):
+        return _pyarrow_available()
+
+    def _load(self, meta):
+        from pyarrow import feather
+        df = feather.read_table(self.cache_path, memory_map=True).to_pandas()
+        return df.set_index(df.columns[0]).rename_axis(meta.get('index_name'))
+
+    def _save(self, df):
+        with replacing(self.cache_path) as tmp_path:
+            df.set_axis(df.columns.astype(str), axis=1).reset_index(names='__index__').to_feather(tmp_path)
+
+
+class FrameWriter(object):
+    """ Collects columns one at a time and builds the DataFrame when closed. Stores it in the cache if there is one. """
+    def __init__(self, index, columns_name='region', backend=None):
+        self.index = index
+        self.columns_name = columns_name
+        self.backend = backend
+        self._columns = {}
+
+    def write_column(self, label, values):
+        self._columns[label] = values
+
+    def discard(self):
+        """ Drops what was written so far, e.g. when parsing fails. """
+        self._columns = {}
+
+    def close(self):
+        """ :return: pd.DataFrame """
+        df = pd.DataFrame(self._columns, index=self.index)
+        df.columns.name = self.columns_name
+        if self.backend is not None:
+            self.backend.save(df)
+        return df
+
+
+class NpyWriter(FrameWriter):
+    """ Writes every column straight into the memory-mapped block of a NpyCache, so only one column is held in memory.
+    The block is allocated for capacity columns; if fewer are written (e.g. empty PECD zones), the unused
+    columns at the end are simply not read when loading. The block is written to a temporary file that replaces
+    values.npy when the writer is closed.
+    """
+    def __init__(self, index, capacity, columns_name='region', backend=None):
+        super().__init__(index, columns_name=columns_name, backend=backend)
+        backend.invalidate()
+        os.makedirs(backend.cache_path, exist_ok=True)
+        with replacing(backend.index_path) as tmp_path:
+            np.save(tmp_path, np.asarray(index.values).astype('datetime64[ns]'))
+        self._values_path = temporary_path(backend.values_path)
+        self._values = np.lib.format.open_memmap(self._values_path, mode='w+', dtype=np.float64,
+                                                 shape=(len(index), max(capacity, 1)), fortran_order=True)
+        self._labels = []
+
+    def write_column(self, label, values):
+        self._values[:, len(self._labels)] = values
+        self._labels.append(label)
+
+    def discard(self):
+        del self._values
+        os.remove(self._values_path)
+
+    def close(self):
+        self._values.flush()
+        del self._values
+        os.replace(self._values_path, self.backend.values_path)
+        self.backend.mark_valid(pd.Index(self._labels, name=self.columns_name), index_name=self.index.name)
+        return self.backend.load()
+
+
+CACHE_BACKENDS = {
+    NpyCache.name: NpyCache,
+    ParquetCache.name: ParquetCache,
+    FeatherCache.name: FeatherCache,
+}
+
+
+def get_cache_backend(name, source_path):
+    """ Instantiates the cache backend registered under name for the source file.
+    :param name: str (one of CACHE_BACKENDS) or None / False for no caching
+    :param source_path: str
+    :return: CacheBackend or None
+    """
+    if not name:
+        return None
+    if name not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend '{name}', choose one of {list(CACHE_BACKENDS)}")
+    backend = CACHE_BACKENDS[name]
+    if not backend.is_available():
+        raise ImportError(f"The '{name}' cache backend requires pyarrow to be installed")
+    return backend(source_path)
+
+
+def _pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _columns_to_meta(columns):
+    return {
+        'columns': [list(c) if isinstance(c, tuple) else c for c in columns],
+        'column_names': list(columns.names),
+    }
+
+
+def _columns_from_meta(meta):
+    names = meta['column_names']
+    if len(names) > 1:
+        return pd.MultiIndex.from_tuples([tuple(c) for c in meta['columns']], names=names)
+    return pd.Index(meta['columns'], name=names[0])
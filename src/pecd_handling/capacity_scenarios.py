@@ -0,0 +1,191 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from src.helpers.fft import DURATION_CUTS, add_decomposed_ts
+from src.helpers.flex_requirements import DEFAULT_PERCENTILES, flexibility_requirements
+from src.helpers.instrumentation import get_logger, instrumented
+
+CAPACITY_SCENARIOS_PATH = 'data/RES_capacity_scenarios.xlsx'
+TEMPLATE_SHEET = 'scenario_template'
+# variables derived per scenario: multipliers of the (capacity-scaled) variables
+SCENARIO_VARIABLES = {
+    'RES_sum': {'offshore': 1, 'onshore': 1, 'pv': 1},
+    'residual_load': {'load': 1, 'offshore': -1, 'onshore': -1, 'pv': -1},
+}
+DEFAULT_MEMORY_BUDGET = 1024 * 2**20  # bytes
+
+logger = get_logger(__name__)
+
+
+def read_capacity_scenarios(path=CAPACITY_SCENARIOS_PATH, sheet_names=None):
+    """ Reads the capacity scenarios (one per sheet, regions as rows, technologies as columns, see the template sheet).
+    :param path: str
+    :param sheet_names: list of str (default: all scenario sheets but the template)
+    :return: pd.DataFrame (index scenario, columns (region, variable))
+    """
+    sheets = pd.read_excel(path, sheet_name=sheet_names, index_col=0)
+    capacities = {}
+    for name, sheet in sheets.items():
+        if sheet_names is None and (name == TEMPLATE_SHEET or sheet.index.name != 'region'):
+            continue  # e.g. the overview sheet
+        sheet.columns.name = 'variable'
+        capacities[name] = sheet.stack()
+    return pd.DataFrame(capacities).T.rename_axis('scenario')
+
+
+def capacity_grid(capacities, multipliers):
+    """ Sensitivity grid: every combination of the multipliers of the technologies, applied to one scenario.
+    :param capacities: pd.Series (index (region, variable), e.g. read_capacity_scenarios(...).loc['MAF_2030'])
+    :param multipliers: dict (technology -> list of multipliers, e.g. {'pv': [0.5, 1, 1.5], 'onshore': [1, 2]})
+    :return: pd.DataFrame (index scenario (e.g. 'pv=0.5, onshore=2'), columns (region, variable))
+    """
+    technologies = list(multipliers)
+    combinations = list(itertools.product(*multipliers.values()))
+    variables = capacities.index.get_level_values('variable')
+    factors = np.ones((len(combinations), len(capacities)))
+    for i, technology in enumerate(technologies):
+        factors[:, variables == technology] = np.array([c[i] for c in combinations])[:, np.newaxis]
+    names = [', '.join(f'{t}={m}' for t, m in zip(technologies, c)) for c in combinations]
+    return pd.DataFrame(capacities.to_numpy() * factors, index=pd.Index(names, name='scenario'),
+                        columns=capacities.index)
+
+
+def iter_scenario_flexibility_requirements(df, capacities, variables=SCENARIO_VARIABLES, percentiles=DEFAULT_PERCENTILES,
+                                           duration_cuts=DURATION_CUTS, remove_dc=True, accumulate_spectra=True,
+                                           decomposition=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                                           custom_regions=None):
+    """
+    Flexibility requirements of the derived variables (e.g. RES_sum and residual_load) of every region for many
+    capacity scenarios, as capacity-weighted sums of the per-technology bands (the FFT is linear). Scenarios are
+    processed in batches (and regions in blocks) that fit into memory_budget.
+    :param df: pd.DataFrame (unscaled time series, columns (region, variable), e.g. capacity factors and load)
+    :param capacities: pd.DataFrame (index scenario, columns (region, variable), see read_capacity_scenarios).
+        Variables without capacities (e.g. load) are not scaled, regions without capacity for a technology do not
+        get it, regions without any capacities are left out (as when scaling with one capacity sheet).
+    :param variables: dict (derived variable -> multipliers of the variables)
+    :param percentiles: list of numbers in [0, 100]
+    :param duration_cuts: dict
+    :param remove_dc: bool
+    :param accumulate_spectra: bool
+    :param decomposition: pd.DataFrame or LazyFrame (decomposition of df, e.g. from add_decomposed_ts or
+        decompose_to_store, is computed if not given)
+    :param memory_budget: int (bytes)
+    :param custom_regions: dict (name -> {'group': list of regions, 'method': 'sum' or 'mean'}, as in the pipeline
+        config), appended after the regions. The mean is taken over the members with capacity for the technology.
+    :return: generator of pd.DataFrame (one per batch of scenarios, index (year, percentile),
+        columns (scenario, region, variable, spectrum))
+    """
+    technologies = list(dict.fromkeys(v for multipliers in variables.values() for v in multipliers))
+    derived = list(variables)
+    # multipliers of the technologies per derived variable, shape (technologies, derived)
+    coefficients = np.array([[variables[d].get(t, 0) for d in derived] for t in technologies], dtype=np.float64)
+
+    _cols = df.columns
+    used = _cols.get_level_values('variable').isin(technologies)
+    if decomposition is None:
+        decomposition = add_decomposed_ts(df.loc[:, used], duration_cuts, remove_dc, accumulate_spectra)
+    spectra = list(decomposition.columns.get_level_values('spectrum').unique())
+    regions = list(_cols.get_level_values('region')[used].unique())
+    scaled = np.isin(technologies, capacities.columns.get_level_values('variable'))
+    if scaled.any():
+        missing = [r for r in regions if r not in capacities.columns.get_level_values('region')]
+        if missing:
+            logger.warning("Regions %s have no capacities in the scenarios and are left out", missing)
+            regions = [r for r in regions if r not in missing]
+    n, n_tech, n_spectra = len(df), len(technologies), len(spectra)
+
+    # (region, technology, spectrum) -> position in the decomposition, missing columns get zero weight
+    wanted = pd.MultiIndex.from_product([regions, technologies, spectra], names=['region', 'variable', 'spectrum'])
+    positions = decomposition.columns.get_indexer(wanted).reshape(len(regions), n_tech, n_spectra)
+    available = (positions >= 0).all(axis=2)
+    positions[positions < 0] = 0
+
+    # capacities per (scenario, region, technology), 1 for variables that are not in the scenarios (e.g. load)
+    caps_columns = pd.MultiIndex.from_product([regions, technologies], names=['region', 'variable'])
+    caps = capacities.reindex(columns=caps_columns).to_numpy(dtype=np.float64).reshape(-1, len(regions), n_tech)
+    has_caps = np.where(scaled, ~np.isnan(caps), True) & available
+    caps = np.where(scaled, np.nan_to_num(caps), 1) * available
+    groups = {name: _custom_region_group(regions, region) for name, region in (custom_regions or {}).items()}
+
+    # per region: the gathered bands; per (scenario, region): the derived bands and the temporary arrays of
+    # flexibility_requirements (about three times the bands)
+    region_bytes = n * n_tech * n_spectra * 8
+    block = int(max(1, min(len(regions), memory_budget // 2 // region_bytes)))
+    batch = int(max(1, memory_budget // 2 // (4 * n * len(derived) * n_spectra * 8 * block)))
+    for s0 in range(0, len(capacities), batch):
+        scenarios = capacities.index[s0:s0 + batch]
+        results = []
+        for r0 in range(0, len(regions), block):
+            r1 = min(r0 + block, len(regions))
+            bands = decomposition.iloc[:, positions[r0:r1].ravel()].to_numpy(dtype=np.float64)
+            bands = bands.reshape(n, r1 - r0, n_tech, n_spectra)
+            # weights per (scenario, region, technology, derived variable)
+            weights = caps[s0:s0 + batch, r0:r1, :, np.newaxis] * coefficients
+            values = _weighted_bands(bands, weights)
+            del bands
+            columns = pd.MultiIndex.from_product([scenarios, regions[r0:r1], derived, spectra],
+                                                 names=['scenario', 'region', 'variable', 'spectrum'])
+            results.append(flexibility_requirements(
+                pd.DataFrame(values.reshape(n, -1), index=df.index, columns=columns, copy=False), percentiles))
+            del values
+        for name, (group, method) in groups.items():
+            # multipliers per (scenario, member, technology), as if the scaled members were aggregated
+            factors = has_caps[s0:s0 + batch][:, group].astype(np.float64)
+            if method == 'mean':
+                factors /= np.maximum(factors.sum(axis=1, keepdims=True), 1)
+            values = np.zeros((n, len(scenarios), 1, len(derived), n_spectra))
+            for i, r in enumerate(group):
+                bands = decomposition.iloc[:, positions[r].ravel()].to_numpy(dtype=np.float64)
+                weights = (factors[:, i] * caps[s0:s0 + batch, r])[:, np.newaxis, :, np.newaxis] * coefficients
+                values += _weighted_bands(bands.reshape(n, 1, n_tech, n_spectra), weights)
+            columns = pd.MultiIndex.from_product([scenarios, [name], derived, spectra],
+                                                 names=['scenario', 'region', 'variable', 'spectrum'])
+            results.append(flexibility_requirements(
+                pd.DataFrame(values.reshape(n, -1), index=df.index, columns=columns, copy=False), percentiles))
+            del values
+        result = pd.concat(results, axis=1) if len(results) > 1 else results[0]
+        if len(results) > 1:
+            result = result.iloc[:, np.argsort(result.columns.get_level_values('scenario').map(
+                {s: i for i, s in enumerate(scenarios)}), kind='stable')]
+        yield result
+
+
+def _weighted_bands(bands, weights):
+    """
+    :param bands: np.ndarray (shape (time, regions, technologies, spectra))
+    :param weights: np.ndarray (shape (scenarios, regions, technologies, derived variables))
+    :return: np.ndarray (shape (time, scenarios, regions, derived variables, spectra))
+    """
+    n, n_regions, n_tech, n_spectra = bands.shape
+    values = np.zeros((n, len(weights), n_regions, weights.shape[3], n_spectra))
+    for t in range(n_tech):
+        values += bands[:, np.newaxis, :, t, np.newaxis, :] * weights[np.newaxis, :, :, t, :, np.newaxis]
+    return values
+
+
+def _custom_region_group(regions, region):
+    """ Checks a custom region as ColumnAggregation.add_region does.
+    :param regions: list of str
+    :param region: dict (group: list of regions, method: 'sum' or 'mean', default 'sum')
+    :return: tuple (positions of the members in regions, method)
+    """
+    unknown = [r for r in region['group'] if r not in regions]
+    if unknown:
+        raise KeyError(f'regions {unknown} not in columns (or without capacities)')
+    method = region.get('method', 'sum')
+    if method not in ('sum', 'mean'):
+        raise ValueError(f"method must be 'sum' or 'mean', not {method!r}")
+    return [regions.index(r) for r in region['group']], method
+
+
+@instrumented()
+def scenario_flexibility_requirements(df, capacities, **kwargs):
+    """
+    Flexibility requirements of all capacity scenarios in one dataframe, see iter_scenario_flexibility_requirements.
+    :param df: pd.DataFrame (unscaled time series, columns (region, variable))
+    :param capacities: pd.DataFrame (index scenario, columns (region, variable))
+    :return: pd.DataFrame (index (year, percentile), columns (scenario, region, variable, spectrum))
+    """
+    return pd.concat(list(iter_scenario_flexibility_requirements(df, capacities, **kwargs)), axis=1)
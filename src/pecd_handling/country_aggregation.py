@@ -1,4 +1,7 @@
-import pandas as pd
+from src.helpers.instrumentation import get_logger
+from .aggregation import ColumnAggregation
+
+logger = get_logger(__name__)
 
 
 def aggregate_pecd_zones_by_country(df, method='sum'):
@@ -8,20 +11,8 @@ def aggregate_pecd_zones_by_country(df, method='sum'):
     :return: pd.DataFrame
     """
     if 'region' not in df.columns.names:
-        print('region not found in column levels')
+        logger.warning('region not found in column levels')
         return df
-    lvl = df.columns.names.index('region')
-    if len(df.columns.names) == 1:
-        df.columns = [(i,) for i in df.columns.values]
-        df.columns.names = ['region']
-    cols = [list(tup)+[tup[lvl]] for tup in df.columns.values]
-    for i in range(len(cols)):
-        cols[i][lvl] = cols[i][lvl][:2]
-    df.columns = pd.MultiIndex.from_tuples(cols, names=list(df.columns.names)+['temp'])
-    on_levels = list(df.columns.names)
-    on_levels.remove('temp')
-    if method == 'sum':
-        df = df.sum(level=on_levels, axis=1)
-    else:  # (method == 'mean')
-        df = df.mean(level=on_levels, axis=1)
-    return df
\ No newline at end of file
+    aggregation = ColumnAggregation(df.columns)
+    countries = aggregation.add_countries(method=method)
+    return aggregation.apply(df, columns=countries).sort_index(axis=1)
\ No newline at end of file
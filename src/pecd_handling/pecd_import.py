@@ -1,55 +1,229 @@
 import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
 
+from src.helpers.instrumentation import get_logger, instrumented
+from .cache import FrameWriter, get_cache_backend
+
 
 PECD_TECHS = ['PV', 'Offshore', 'Onshore']  # optionally you could also add 'CSP' here
+PECD_HEADER_ROWS = 10  # rows above the column header in the sheets of a PECD excel file
 
+logger = get_logger(__name__)
+_workbook = None  # (path, read-only workbook) opened once per process, see _open_workbook
 
 
-def read_pecd_xls_file(path):
+@instrumented()
+def read_pecd_xls_file(path, cache='npy', n_jobs=None):
     """ Reads one xls file in the PECD format and combines all sheets to a dataframe.
+    The parsed data is cached in a binary format next to the file, later imports only read the cache.
+    If there is no .xlsx file but a .csv version of it (as for the sample data), the .csv is used as source. A .csv
+    next to the .xlsx that is not older than it (the cache of earlier versions) is read instead of the excel file.
     :param path: str (file should be in folder)
+    :param cache: str (one of cache.CACHE_BACKENDS, e.g. 'npy', 'parquet', 'feather') or None to disable caching
+    :param n_jobs: int (number of processes parsing the excel sheets, defaults to the cores available to this process)
     :return: pd.DataFrame
     """
-    print("Now opening file:", path)
-    csv_filepath = path.replace('.xlsx', '.csv')
-    # pickle_filepath = path.replace('.xlsx', '.pkl')
-    if os.path.isfile(csv_filepath):
-        print("Cached .csv version found, this import will be fast.")
-        df = pd.read_csv(csv_filepath, index_col=0, header=[0], parse_dates=True)
+    logger.info("Now opening file: %s", path)
+    source_path = _find_source_file(path)
+    backend = get_cache_backend(cache, source_path)
+    if backend is not None and backend.is_valid():
+        logger.info("Cached .%s version found, this import will be fast.", backend.name)
+        return backend.load()
+
+    csv_path = source_path if source_path.endswith('.csv') else _legacy_csv_file(source_path)
+    if csv_path is not None:
+        if csv_path != source_path:
+            logger.info("Cached .csv version found, this import will be fast.")
+        df = pd.read_csv(csv_path, index_col=0, header=[0], parse_dates=True)
         df.columns.name = 'region'
+        if backend is not None:
+            backend.save(df)
     else:
-        print("Seems like you are importing for the first time, this may take up to an hour. "
-              "Future imports will be faster as we are storing a .csv version.")
+        logger.info("Seems like you are importing for the first time, this may take a while. "
+                    "Future imports will be faster as we are storing a cached version.")
         start_time = time.time()
-        xls = pd.read_excel(path, sheet_name=None, skiprows=10)
-        print(f"File {path} took {(time.time() - start_time)/60:.1f} minutes to load")
-        for sheet in list(xls.keys()):
-            # Let's drop sheets that are empty (some PECD zones are empty in the DB)
-            if xls[sheet].dropna().empty or sheet in []:  # list of sheetnames that do not contain PECD timeseries.
-                del xls[sheet]
-        regions = xls.keys()
-        df = pd.concat([sheet_to_series(xls[r]) for r in regions], keys=[r for r in regions], names=['region'], axis=1)
-        df.to_csv(csv_filepath)
+        df = read_pecd_sheets(source_path, backend=backend, n_jobs=n_jobs)
+        logger.info("File %s took %.1f minutes to load", source_path, (time.time() - start_time) / 60)
     return df
 
 
+@instrumented()
+def read_pecd_sheets(path, backend=None, n_jobs=None):
+    """ Parses the sheets (PECD zones) of a PECD excel file in a process pool (the workbook opened once per process)
+    and streams each finished zone into the cache, so about one sheet per worker is held in memory.
+    Empty zones are skipped.
+    :param path: str (.xlsx file)
+    :param backend: cache.CacheBackend or None
+    :param n_jobs: int (number of worker processes, defaults to the cores available to this process; 1 parses in
+        this process, as on a single core)
+    :return: pd.DataFrame
+    """
+    # list of sheetnames that do not contain PECD timeseries.
+    sheet_names = [s for s in _sheet_names(path) if s not in []]
+    n_jobs = max(1, min(n_jobs or _available_cpus(), len(sheet_names)))
+
+    writer = None
+    try:
+        results = _ordered_map(partial(read_pecd_sheet, path), sheet_names, n_jobs, initializer=_open_workbook,
+                               initargs=(path, ))
+        for sheet_name, series in zip(sheet_names, results):
+            if series is None:
+                continue
+            if writer is None:
+                if backend is None:
+                    writer = FrameWriter(series.index)
+                else:
+                    writer = backend.writer(series.index, capacity=len(sheet_names))
+            elif not series.index.equals(writer.index):
+                series = series.reindex(writer.index)
+            writer.write_column(sheet_name, series.values)
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+    finally:
+        _close_workbook()
+    if writer is None:
+        raise ValueError(f"No PECD time series found in {path}")
+    return writer.close()
+
+
+def read_pecd_sheet(path, sheet_name):
+    """ Reads one sheet of a PECD excel file, from the workbook opened in this process (see _open_workbook).
+    Returns None for empty sheets (some PECD zones are empty in the DB), which are detected from their first row
+    without parsing the whole sheet.
+    :param path: str
+    :param sheet_name: str
+    :return: pd.Series or None
+    """
+    ws = _open_workbook(path)[sheet_name]
+    first_row = next(ws.iter_rows(min_row=PECD_HEADER_ROWS + 2, max_row=PECD_HEADER_ROWS + 2, values_only=True), ())
+    if all(v is None for v in first_row[2:]):
+        return None
+    rows = ws.iter_rows(min_row=PECD_HEADER_ROWS + 1, values_only=True)
+    header = next(rows, ())
+    used = [i for i, name in enumerate(header) if name is not None]  # empty trailing columns of the sheet
+    sheet = pd.DataFrame([[row[i] for i in used] for row in rows], columns=[header[i] for i in used])
+    if sheet.dropna().empty:
+        return None
+    return sheet_to_series(sheet)
+
+
+def _open_workbook(path):
+    """ Opens the workbook read-only, once per process: later calls with the same path return the open workbook.
+    Used as initializer of the worker processes of read_pecd_sheets.
+    :param path: str
+    :return: openpyxl.Workbook
+    """
+    global _workbook
+    if _workbook is None or _workbook[0] != path:
+        import openpyxl
+        _close_workbook()
+        _workbook = (path, openpyxl.load_workbook(path, read_only=True, data_only=True))
+    return _workbook[1]
+
+
+def _sheet_names(path):
+    """ Names of the sheets of an .xlsx file, read from the workbook part of the archive without loading the sheets
+    (openpyxl scans every sheet without a stored dimension when the workbook is loaded).
+    :param path: str
+    :return: list of str
+    """
+    import zipfile
+    from xml.etree import ElementTree
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iter() if sheet.tag.rpartition('}')[2] == 'sheet']
+
+
+def _close_workbook():
+    global _workbook
+    if _workbook is not None:
+        _workbook[1].close()
+        _workbook = None
+
+
+def _ordered_map(func, items, n_jobs, initializer=None, initargs=()):
+    """ Lazy map over a process pool that yields the results in order and keeps at most n_jobs of them in flight
+    (submitted but not yet yielded).
+    :param func: callable (must be picklable)
+    :param items: list
+    :param n_jobs: int
+    :param initializer: callable (run once in every worker process, e.g. to open a file)
+    :param initargs: tuple
+    """
+    if n_jobs == 1:
+        yield from map(func, items)
+        return
+    with ProcessPoolExecutor(n_jobs, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _available_cpus():
+    """ :return: int (cores this process may run on, e.g. fewer than os.cpu_count() in a container) """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _find_source_file(path):
+    """ Returns the .xlsx file if it exists, otherwise a .csv version of it.
+    :param path: str
+    :return: str
+    """
+    if os.path.isfile(path):
+        return path
+    csv_filepath = os.path.splitext(path)[0] + '.csv'
+    if os.path.isfile(csv_filepath):
+        return csv_filepath
+    raise FileNotFoundError(f"Neither {path} nor {csv_filepath} exist")
+
+
+def _legacy_csv_file(path):
+    """ Returns the .csv that earlier versions stored the parsed data of an .xlsx file in, if it exists and is not
+    older than the .xlsx file.
+    :param path: str (.xlsx file)
+    :return: str or None
+    """
+    csv_filepath = os.path.splitext(path)[0] + '.csv'
+    if os.path.isfile(csv_filepath) and os.path.getmtime(csv_filepath) >= os.path.getmtime(path):
+        return csv_filepath
+    return None
+
+
 def sheet_to_series(sheet):
     """ Turns one sheet of a PECD excel file into a pandas Series with datetime index.
+    The sheet has one row per hour of the year ('Date' as 'dd.mm.', 'Hour' from 1 to 24) and one column per climate year.
     :param sheet: pd.DataFrame
     :return: pd.Series
     """
-    sheet[['day', 'month']] = sheet.Date.str.split(".", n=1, expand=True)
-    sheet.month = sheet.month.str.split('.').str[0]#.strip('.')
-    sheet.dropna(inplace=True)
-    sheet.drop(labels=['Date'], axis=1, inplace=True)
-    sheet.rename(columns={'Hour': 'hour'}, inplace=True)
-    sheet['hour'] = sheet['hour'].astype(int) - 1
-    sheet = sheet.set_index(['month', 'day', 'hour'])
-    sheet.columns.name = 'year'
-    sheet = sheet.stack('year')
-    sheet = sheet.reorder_levels(['year', 'month', 'day', 'hour'])
-    sheet.index = pd.to_datetime(pd.DataFrame(sheet.index.to_list(), columns=sheet.index.names)).values
-    sheet = sheet.sort_index()
-    return sheet
+    sheet = sheet.dropna()
+    day_month = sheet['Date'].astype(str).str.split('.', expand=True)
+    day = day_month[0].astype(int).values
+    month = day_month[1].astype(int).values
+    hour = sheet['Hour'].astype(int).values - 1
+    year_columns = [c for c in sheet.columns if c not in ('Date', 'Hour')]
+    years = np.array([int(y) for y in year_columns])
+
+    # (year, row) grid of timestamps, built with datetime64 arithmetic
+    dates = (years[:, np.newaxis] - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    dates = dates.astype('datetime64[D]') + (day - 1)
+    dates = dates.astype('datetime64[h]') + hour
+    values = sheet[year_columns].to_numpy(dtype=np.float64).T
+
+    series = pd.Series(values.ravel(), index=pd.DatetimeIndex(dates.ravel().astype('datetime64[ns]')))
+    if not series.index.is_monotonic_increasing:
+        series = series.sort_index()
+    return series
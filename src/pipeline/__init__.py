@@ -0,0 +1,11 @@
+from src.helpers.lazy_imports import lazy_exports
+
+# name -> module, imported on first use (see src.helpers.lazy_imports)
+_EXPORTS = {
+    'load_config': '.config',
+    'run_pipeline': '.runner',
+    'read_frame': '.frames',
+    'write_frame': '.frames',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
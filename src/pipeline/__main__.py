@@ -0,0 +1,26 @@
+""" Headless runner of the FUTURE pipeline: import -> scaling -> custom regions and variables -> decomposition ->
+flexibility requirements and energy yields. The outputs of every stage are stored as binary frames in the output
+directory of the config, stages whose inputs did not change are skipped.
+
+    python -m src.pipeline pipeline_config.json --n-jobs 4
+"""
+import argparse
+
+from .config import load_config
+from .runner import format_report, run_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m src.pipeline', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('config', help='.json or .yaml config file')
+    parser.add_argument('--n-jobs', type=int, default=None, help='stages running at the same time')
+    parser.add_argument('--force', action='store_true', help='run all stages, even if their inputs did not change')
+    args = parser.parse_args()
+
+    report = run_pipeline(load_config(args.config), force=args.force, n_jobs=args.n_jobs)
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
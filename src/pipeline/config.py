@@ -0,0 +1,102 @@
+import json
+import os
+import re
+
+from src.pecd_handling.pecd_import import _find_source_file
+
+DEFAULT_CONFIG = {
+    'output_dir': 'results',
+    'n_jobs': 1,  # stages that run at the same time
+    'cache': 'npy',  # cache backend of the PECD imports
+    'inputs': {},  # variable -> PECD file
+    'capacities': None,  # {'path': ..., 'sheet': ...}
+    'custom_regions': {},  # name -> {'group': [...], 'method': 'sum'}
+    'custom_variables': {},  # name -> multipliers
+    'decomposition': {},  # duration_cuts, remove_dc, accumulate_spectra, workers, window, overlap
+    'flexibility': {},  # percentiles, confidence; false to skip
+    'energy_yield': {},  # false to skip
+}
+
+
+def load_config(path):
+    """
+    Reads a pipeline config (.json, or .yaml / .yml if pyyaml is installed) and fills in the defaults.
+    Relative paths are relative to the directory of the config file; '/' and '\\' are both accepted as separators.
+    :param path: str
+    :return: dict
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('YAML configs require pyyaml to be installed, or use a .json config')
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f'Unknown config keys {sorted(unknown)}, expected some of {list(DEFAULT_CONFIG)}')
+    config = dict(DEFAULT_CONFIG, **config)
+    base = os.path.dirname(os.path.abspath(path))
+    config['output_dir'] = resolve_path(base, config['output_dir'])
+    config['inputs'] = {v: resolve_path(base, p) for v, p in config['inputs'].items()}
+    if config['capacities']:
+        config['capacities'] = dict(config['capacities'], path=resolve_path(base, config['capacities']['path']))
+    return config
+
+
+def resolve_path(base, path):
+    """ Joins a relative path (with '/' or '\\' as separators) to base. """
+    parts = [p for p in re.split(r'[\\/]', path) if p not in ('', '.')]
+    if os.path.isabs(path) or re.match(r'^[A-Za-z]:', path):
+        return os.path.normpath(path)
+    return os.path.join(base, *parts)
+
+
+def build_stages(config):
+    """
+    Translates a config into the stages of the pipeline:
+    import (one per input) -> scale -> custom -> decompose -> flexibility, and custom -> energy_yield.
+    :param config: dict (see load_config)
+    :return: dict (stage name -> dict with function, deps, params and files, the input files the stage reads)
+    """
+    if not config['inputs']:
+        raise ValueError('The config does not define any inputs')
+    stages = {}
+    for variable, path in config['inputs'].items():
+        stages[f'import_{variable}'] = {
+            'function': 'import',
+            'deps': [],
+            'params': {'path': path, 'cache': config['cache']},
+            'files': [_find_source_file(path)],
+        }
+    capacities = config['capacities']
+    stages['scale'] = {
+        'function': 'scale',
+        'deps': [f'import_{v}' for v in config['inputs']],
+        'params': {'variables': list(config['inputs']), 'capacities': capacities},
+        'files': [capacities['path']] if capacities else [],
+    }
+    stages['custom'] = {
+        'function': 'custom',
+        'deps': ['scale'],
+        'params': {'regions': config['custom_regions'], 'variables': config['custom_variables']},
+        'files': [],
+    }
+    stages['decompose'] = {'function': 'decompose', 'deps': ['custom'], 'params': config['decomposition'], 'files': []}
+    if config['flexibility'] is not False:
+        stages['flexibility'] = {
+            'function': 'flexibility',
+            'deps': ['decompose'],
+            'params': config['flexibility'] or {},
+            'files': [],
+        }
+    if config['energy_yield'] is not False:
+        stages['energy_yield'] = {
+            'function': 'energy_yield',
+            'deps': ['custom'],
+            'params': config['energy_yield'] or {},
+            'files': [],
+        }
+    return stages
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.helpers.files import replacing
+from src.pecd_handling.cache import file_hash
+
+
+def write_frame(path, df):
+    """
+    Stores a dataframe as a directory of binary files: the values as one column-major .npy block, every index level
+    as a .npy array and the columns in a small json file (the layout of the .npycache and DecompositionStore).
+    Every file is written next to the old one and moved onto it, frames read earlier keep the old files mapped.
+    :param path: str (directory, is created or overwritten)
+    :param df: pd.DataFrame (float values)
+    :return: str (sha1 hex digest of the content)
+    """
+    os.makedirs(path, exist_ok=True)
+    with replacing(os.path.join(path, 'values.npy')) as tmp_path:
+        np.save(tmp_path, np.asfortranarray(df.to_numpy(dtype=np.float64)))
+    index = df.index
+    for i in range(index.nlevels):
+        with replacing(os.path.join(path, f'index_{i}.npy')) as tmp_path:
+            np.save(tmp_path, _to_numpy(index.get_level_values(i)))
+    meta = {
+        'columns': [list(c) if isinstance(c, tuple) else c for c in df.columns],
+        'column_names': list(df.columns.names),
+        'index_names': list(index.names),
+    }
+    with replacing(os.path.join(path, 'frame.json')) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    return frame_hash(path)
+
+
+def read_frame(path, mmap_mode='c'):
+    """
+    Loads a dataframe stored with write_frame. The values are memory-mapped (copy-on-write) by default.
+    :param path: str (directory)
+    :param mmap_mode: str or None (None reads the values into memory)
+    :return: pd.DataFrame
+    """
+    with open(os.path.join(path, 'frame.json')) as f:
+        meta = json.load(f)
+    levels = [np.load(os.path.join(path, f'index_{i}.npy')) for i in range(len(meta['index_names']))]
+    if len(levels) > 1:
+        index = pd.MultiIndex.from_arrays(levels, names=meta['index_names'])
+    else:
+        index = pd.Index(levels[0], name=meta['index_names'][0])
+    names = meta['column_names']
+    if len(names) > 1:
+        columns = pd.MultiIndex.from_tuples([tuple(c) for c in meta['columns']], names=names)
+    else:
+        columns = pd.Index(meta['columns'], name=names[0])
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode)
+    return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def frame_hash(path):
+    """ sha1 of the files of a stored frame.
+    :param path: str (directory)
+    :return: str
+    """
+    names = sorted(n for n in os.listdir(path) if n.endswith('.npy') or n == 'frame.json')
+    h = hashlib.sha1()
+    for name in names:
+        h.update(file_hash(os.path.join(path, name)).encode())
+    return h.hexdigest()
+
+
+def _to_numpy(index):
+    if isinstance(index, pd.DatetimeIndex):
+        return np.asarray(index.values).astype('datetime64[ns]')
+    values = index.to_numpy()
+    if values.dtype == object or not np.issubdtype(values.dtype, np.number):
+        return values.astype(str)
+    return values
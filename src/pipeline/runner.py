@@ -0,0 +1,177 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from src.helpers import instrumentation
+from src.helpers.files import replacing
+from src.helpers.instrumentation import get_logger, peak_rss_mb
+from src.pecd_handling.cache import file_fingerprint, file_hash
+from .config import build_stages
+from .frames import read_frame, write_frame
+from .stages import STAGE_FUNCTIONS
+
+PIPELINE_VERSION = 1  # bump to invalidate all stored stage outputs
+
+logger = get_logger(__name__)
+
+
+def run_pipeline(config, force=False, n_jobs=None):
+    """ Runs the stages in dependency order, each in a fresh worker process (up to n_jobs at a time), and stores their
+    outputs in output_dir/<stage>/<output>. A stage is skipped if its input hashes and parameters did not change.
+    :param config: dict (see config.load_config)
+    :param force: bool (run all stages)
+    :param n_jobs: int (number of stages running at the same time, default from the config)
+    :return: dict (stage -> report with status, seconds and peak_rss_mb)
+    """
+    stages = build_stages(config)
+    output_dir = config['output_dir']
+    n_jobs = max(1, n_jobs or config['n_jobs'])
+    outputs = {}  # stage -> {output: content hash}
+    report = {}
+    pending = list(stages)
+    running = {}  # future -> stage
+    executors = {}  # future -> executor of its stage
+    start_time = time.perf_counter()
+    context = _worker_context()
+    try:
+        while pending or running:
+            ready = [s for s in pending if all(d in outputs for d in stages[s]['deps'])]
+            if not ready and not running:
+                raise ValueError(f'Stages {pending} depend on stages that do not exist')
+            for name in ready:
+                if len(running) >= n_jobs:
+                    break
+                pending.remove(name)
+                spec = stages[name]
+                stage_dir = os.path.join(output_dir, name)
+                meta = read_stage_meta(stage_dir)
+                key, files = stage_key(spec, outputs, meta)
+                if not force and meta is not None and meta['key'] == key and _outputs_exist(stage_dir, meta):
+                    outputs[name] = meta['outputs']
+                    if files != meta['files']:  # e.g. touched input files, keep the new modification times
+                        write_stage_meta(stage_dir, dict(meta, files=files))
+                    report[name] = {'status': 'skipped', 'seconds': 0.0, 'peak_rss_mb': None}
+                    logger.info("%s: unchanged, skipped", name)
+                    continue
+                inputs = {d: {o: os.path.join(output_dir, d, o) for o in outputs[d]} for d in spec['deps']}
+                logger.info("%s: started", name)
+                executor = ProcessPoolExecutor(1, mp_context=context)  # a fresh process per stage
+                future = executor.submit(run_stage, spec['function'], spec['params'], inputs, stage_dir, key, files)
+                running[future] = name
+                executors[future] = executor
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                executors.pop(future).shutdown()
+                result = future.result()
+                outputs[name] = result.pop('outputs')
+                report[name] = dict(status='ran', **result)
+                logger.info("%s: done in %.1f s", name, result['seconds'])
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=False)
+
+    report['total'] = {'status': '', 'seconds': time.perf_counter() - start_time, 'peak_rss_mb': None}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def run_stage(function, params, inputs, stage_dir, key, files):
+    """
+    Worker: loads the outputs of the stages it depends on (memory-mapped), runs the stage function and stores its
+    outputs together with the key they were computed for. If instrumentation is enabled (see
+    helpers.instrumentation), the report of the stage is written to stage_dir/instrumentation.json.
+    :param function: str (see stages.STAGE_FUNCTIONS)
+    :param params: dict
+    :param inputs: dict (stage -> {output: directory})
+    :param stage_dir: str
+    :param key: str (see stage_key)
+    :param files: dict (fingerprints of the input files, stored to avoid hashing unchanged files again)
+    :return: dict (outputs (output -> content hash), seconds, peak_rss_mb)
+    """
+    start = time.perf_counter()
+    frames = {d: {o: read_frame(path) for o, path in stage_outputs.items()} for d, stage_outputs in inputs.items()}
+    results = STAGE_FUNCTIONS[function](params, frames)
+    meta_path = os.path.join(stage_dir, 'stage.json')
+    if os.path.isfile(meta_path):
+        os.remove(meta_path)
+    hashes = {name: write_frame(os.path.join(stage_dir, name), df) for name, df in results.items()}
+    write_stage_meta(stage_dir, {'key': key, 'outputs': hashes, 'files': files})
+    if instrumentation.is_enabled():
+        instrumentation.write_report(os.path.join(stage_dir, 'instrumentation.json'))
+    return {'outputs': hashes, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}
+
+
+def stage_key(spec, outputs, meta=None):
+    """
+    Content hash of everything a stage depends on: its function and parameters, the content of its input files and
+    the content hashes of the outputs of the stages it depends on.
+    Input files are only hashed again if their size or modification time changed since the last run.
+    :param spec: dict (see config.build_stages)
+    :param outputs: dict (stage -> {output: content hash})
+    :param meta: dict or None (stored meta of the last run of the stage)
+    :return: tuple (str key, dict fingerprints of the input files)
+    """
+    previous = (meta or {}).get('files', {})
+    files = {}
+    for path in spec['files']:
+        fingerprint = file_fingerprint(path, with_hash=False)
+        known = previous.get(path, {})
+        if known.get('size') == fingerprint['size'] and known.get('mtime_ns') == fingerprint['mtime_ns']:
+            fingerprint['sha1'] = known['sha1']
+        else:
+            fingerprint['sha1'] = file_hash(path)
+        files[path] = fingerprint
+    content = {
+        'version': PIPELINE_VERSION,
+        'function': spec['function'],
+        'params': spec['params'],
+        'files': [files[p]['sha1'] for p in spec['files']],
+        'inputs': {d: outputs[d] for d in spec['deps']},
+    }
+    key = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+    return key, files
+
+
+def read_stage_meta(stage_dir):
+    path = os.path.join(stage_dir, 'stage.json')
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_stage_meta(stage_dir, meta):
+    with replacing(os.path.join(stage_dir, 'stage.json')) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+
+
+def _outputs_exist(stage_dir, meta):
+    return all(os.path.isfile(os.path.join(stage_dir, o, 'frame.json')) for o in meta['outputs'])
+
+
+def _worker_context():
+    """ Every stage runs in a fresh process (one short-lived executor per stage). Where available, they are forked
+    from a server process that has imported the stages once, which is much faster than spawning a new interpreter.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['src.pipeline.stages'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def format_report(report):
+    """ :return: str (one line per stage) """
+    lines = [f"{'stage':<20} {'status':<8} {'time [s]':>9} {'peak RSS [MB]':>14}"]
+    for name, r in report.items():
+        rss = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else '-'
+        lines.append(f"{name:<20} {r['status']:<8} {r['seconds']:>9.2f} {rss:>14}")
+    return '\n'.join(lines)
@@ -0,0 +1,89 @@
+import pandas as pd
+
+from src.helpers import energy_yields, flexibility_requirements, grouped_confidence_interval
+from src.helpers.fft import DURATION_CUTS, add_decomposed_ts
+from src.helpers.flex_requirements import DEFAULT_PERCENTILES
+from src.pecd_handling import ColumnAggregation, read_pecd_xls_file
+
+
+def import_stage(params, inputs):
+    """ Reads one PECD file (time series per region).
+    params: path, cache
+    The stage runs in a worker of the pipeline, which already runs n_jobs stages at the same time, so the sheets are
+    parsed in this process.
+    """
+    return {'data': read_pecd_xls_file(params['path'], cache=params.get('cache', 'npy'), n_jobs=1)}
+
+
+def scale_stage(params, inputs):
+    """ Combines the imported variables to a (region, variable) frame and scales it with a capacity scenario, as in
+    the notebook: variables without capacities (e.g. load) are not scaled, columns without a capacity are dropped.
+    params: variables (list, the import stages in order), capacities (dict with path and sheet, optional)
+    """
+    df = pd.concat({v: inputs[f'import_{v}']['data'] for v in params['variables']}, names=['variable'], axis=1)
+    df = df.reorder_levels(['region', 'variable'], axis=1)
+    capacities = params.get('capacities')
+    if capacities:
+        caps = pd.read_excel(capacities['path'], sheet_name=capacities['sheet'], index_col=0)
+        caps.columns.name = 'variable'
+        for v in params['variables']:
+            if v not in caps.columns:
+                caps.loc[:, v] = 1
+        df = df.multiply(caps.stack(), axis=1).dropna(axis=1)
+    return {'data': df}
+
+
+def custom_stage(params, inputs):
+    """ Adds the custom regions and variables in one step (see ColumnAggregation).
+    params: regions (dict name -> {group, method}), variables (dict name -> multipliers)
+    """
+    df = inputs['scale']['data']
+    aggregation = ColumnAggregation(df.columns)
+    for name, region in params.get('regions', {}).items():
+        aggregation.add_region(name, region['group'], method=region.get('method', 'sum'))
+    for name, sum_of in params.get('variables', {}).items():
+        aggregation.add_variable(name, sum_of)
+    return {'data': aggregation.apply(df)}
+
+
+def decompose_stage(params, inputs):
+    """ Fourier decomposition (see add_decomposed_ts).
+    params: duration_cuts (dict name -> [min, max] hours, optional), remove_dc, accumulate_spectra, workers,
+        window ('year' or hours, optional, see windowed_fft), overlap
+    """
+    duration_cuts = {k: tuple(v) for k, v in params['duration_cuts'].items()} if params.get('duration_cuts') \
+        else DURATION_CUTS
+    df = add_decomposed_ts(inputs['custom']['data'], duration_cuts, remove_dc=params.get('remove_dc', True),
+                           accumulate_spectra=params.get('accumulate_spectra', True), workers=params.get('workers'),
+                           window=params.get('window'), overlap=params.get('overlap', 0.5))
+    return {'data': df}
+
+
+def flexibility_stage(params, inputs):
+    """ Upward flexibility requirements per climate year and their confidence interval over the years.
+    params: percentiles (list, optional), confidence (float)
+    """
+    per_year = flexibility_requirements(inputs['decompose']['data'], params.get('percentiles', DEFAULT_PERCENTILES))
+    aggregated = grouped_confidence_interval(per_year, level='percentile', confidence=params.get('confidence', 0.95))
+    return {'per_year': per_year, 'confidence_interval': aggregated}
+
+
+def energy_yield_stage(params, inputs):
+    """ Energy per climate year and annualized energy yield [TWh] of every column (as the energy yield dashboard).
+    params: none
+    """
+    per_year, annualized = energy_yields(inputs['custom']['data'])
+    return {
+        'per_year': per_year,
+        'annualized': annualized.to_frame('annualized').T.rename_axis('aggregation'),
+    }
+
+
+STAGE_FUNCTIONS = {
+    'import': import_stage,
+    'scale': scale_stage,
+    'custom': custom_stage,
+    'decompose': decompose_stage,
+    'flexibility': flexibility_stage,
+    'energy_yield': energy_yield_stage,
+}
@@ -0,0 +1,17 @@
+import pytest
+
+from benchmarks.synthetic import pecd_frame
+
+
+@pytest.fixture(scope='session')
+def pecd_df():
+    """ Two zones, the four PECD variables and two climate years of synthetic data. """
+    return pecd_frame(n_zones=2, n_variables=4, n_years=2)
+
+
+@pytest.fixture(scope='session')
+def regions_df(pecd_df):
+    """ (time, region) frame of one variable, as read from a PECD excel file. """
+    df = pecd_df.xs('pv', axis=1, level='variable')
+    df.columns.name = 'region'
+    return df
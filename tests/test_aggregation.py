@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.helpers.fft import add_decomposed_ts
+from src.pecd_handling.aggregation import ColumnAggregation
+
+
+def test_derived_columns_match_manual_sums(pecd_df):
+    aggregation = ColumnAggregation(pecd_df.columns)
+    aggregation.add_region('both', ['Z000', 'Z001'], method='mean')
+    aggregation.add_variable('residual_load', {'load': 1, 'pv': -1, 'onshore': -1, 'offshore': -1})
+    result = aggregation.apply(pecd_df)
+    assert result.iloc[:, :len(pecd_df.columns)].equals(pecd_df)
+    for region in ['Z000', 'Z001', 'both']:
+        if region == 'both':
+            expected = (result[('Z000', 'pv')] + result[('Z001', 'pv')]) / 2
+            assert np.allclose(result[(region, 'pv')], expected)
+        residual = result[(region, 'load')] - result[region][['pv', 'onshore', 'offshore']].sum(axis=1)
+        assert np.allclose(result[(region, 'residual_load')], residual)
+
+
+def test_countries_sum_their_zones(pecd_df):
+    aggregation = ColumnAggregation(pecd_df.columns)
+    countries = aggregation.add_countries()
+    result = aggregation.apply(pecd_df, columns=countries)
+    assert list(result.columns) == [('Z0', v) for v in pecd_df['Z000'].columns]
+    assert np.allclose(result['Z0'].to_numpy(), (pecd_df['Z000'] + pecd_df['Z001']).to_numpy())
+
+
+def test_decomposition_bands_are_combined_like_raw_data(pecd_df):
+    decomposed = add_decomposed_ts(pecd_df)
+    aggregation = ColumnAggregation.from_decomposition(decomposed)
+    aggregation.add_region('both', ['Z000', 'Z001'])
+    result = aggregation.apply(decomposed)
+    expected = add_decomposed_ts(aggregation.apply(pecd_df, columns=aggregation.derived_columns))
+    assert np.allclose(result.loc(axis=1)[['both']].to_numpy(), expected.to_numpy())
+
+
+def test_unknown_regions_raise():
+    aggregation = ColumnAggregation(pd.Index(['Z000', 'Z001'], name='region'))
+    with pytest.raises(KeyError):
+        aggregation.add_region('custom', ['Z000', 'XX00'])
+
+
+def test_lazy_decomposition_appends_derived_spectra(pecd_df):
+    aggregation = ColumnAggregation(pecd_df.columns)
+    aggregation.add_region('both', ['Z000', 'Z001'])
+    aggregation.add_variable('residual_load', {'load': 1, 'pv': -1})
+    expected = add_decomposed_ts(aggregation.apply(pecd_df), remove_dc=False)
+    lazy = add_decomposed_ts(pecd_df, remove_dc=False, lazy=True)
+    lazy.loc(axis=1)[:, 'pv', 'daily']  # cached bands stay valid when columns are appended
+    lazy = aggregation.apply(lazy)
+    result = lazy.to_frame()
+    assert np.allclose(result.to_numpy(), expected.loc[:, result.columns].to_numpy())
+    with pytest.raises(ValueError):
+        aggregation.apply(lazy)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.suite import compare_results, compare_to_baseline
+
+
+def _results(**seconds):
+    cases = {name: {'seconds': s, 'peak_rss_mb': 100., 'check': {'ok': True}} for name, s in seconds.items()}
+    return {'meta': {'scale': 'small'}, 'cases': cases}
+
+
+def test_small_slowdowns_are_ignored():
+    _, ok = compare_to_baseline(_results(fast=0.008), _results(fast=0.005))
+    assert ok
+
+
+def test_slowdowns_beyond_tolerance_fail():
+    lines, ok = compare_to_baseline(_results(slow=1.5), _results(slow=1.0))
+    assert not ok
+    assert 'SLOWER' in lines[-1]
+
+
+def test_compare_results_detects_nan_mismatch():
+    expected = pd.DataFrame({'a': [1., np.nan]})
+    assert compare_results(expected.copy(), expected)['ok']
+    assert not compare_results(expected.fillna(0), expected)['ok']
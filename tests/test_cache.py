@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.pecd_handling import read_pecd_xls_file
+from src.pecd_handling.cache import NpyCache
+
+
+def _frame(n_rows, n_columns, value):
+    index = pd.DatetimeIndex(pd.date_range('2018-01-01', periods=n_rows, freq='h').values.astype('datetime64[ns]'))
+    return pd.DataFrame(np.full((n_rows, n_columns), value), index=index,
+                        columns=pd.Index([f'R{i}' for i in range(n_columns)], name='region'))
+
+
+def _source(tmp_path, content='x'):
+    path = str(tmp_path / 'pecd.xlsx')
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+
+def test_npy_cache_roundtrip(tmp_path):
+    backend = NpyCache(_source(tmp_path))
+    df = _frame(48, 3, 1.5)
+    backend.save(df)
+    assert backend.is_valid()
+    pd.testing.assert_frame_equal(backend.load(), df, check_freq=False)
+
+
+def test_cache_is_stale_after_source_changes(tmp_path):
+    path = _source(tmp_path)
+    backend = NpyCache(path)
+    backend.save(_frame(48, 3, 1.))
+    with open(path, 'w') as f:
+        f.write('changed')
+    assert not backend.is_valid()
+
+
+def test_touched_source_with_same_content_stays_valid(tmp_path):
+    path = _source(tmp_path)
+    backend = NpyCache(path)
+    backend.save(_frame(48, 3, 1.))
+    os.utime(path, ns=(0, 0))
+    assert backend.is_valid()
+    assert backend.read_meta()['mtime_ns'] == 0
+
+
+def test_rebuilding_the_cache_keeps_loaded_frames(tmp_path):
+    backend = NpyCache(_source(tmp_path))
+    backend.save(_frame(100, 3, 1.))
+    loaded = backend.load()
+    backend.save(_frame(50, 2, 2.))
+    writer = backend.writer(_frame(10, 1, 0.).index, capacity=1)
+    writer.write_column('R0', np.zeros(10))
+    writer.close()
+    assert loaded.to_numpy().sum() == 300.
+    assert sorted(os.listdir(backend.cache_path)) == ['index.npy', 'meta.json', 'values.npy']
+
+
+def test_legacy_csv_is_converted(tmp_path, regions_df):
+    from benchmarks.synthetic import write_pecd_excel
+    path = str(tmp_path / 'pecd.xlsx')
+    write_pecd_excel(path, regions_df)
+    regions_df.to_csv(str(tmp_path / 'pecd.csv'))
+    df = read_pecd_xls_file(path)
+    np.testing.assert_allclose(df.to_numpy(), regions_df.to_numpy())
+    assert NpyCache(path).is_valid()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import pecd_frame
+from src.helpers.fft import add_decomposed_ts
+from src.helpers.flex_requirements import flexibility_requirements
+from src.pecd_handling.aggregation import ColumnAggregation
+from src.pecd_handling.capacity_scenarios import (DEFAULT_MEMORY_BUDGET, SCENARIO_VARIABLES,
+                                                  scenario_flexibility_requirements)
+
+CUSTOM_REGIONS = {'custom': {'group': ['Z000', 'Z001'], 'method': 'mean'}}
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pecd_frame(n_zones=3, n_variables=4, n_years=2)
+
+
+@pytest.fixture(scope='module')
+def capacities():
+    """ Two scenarios for Z000 and Z001, no capacities for Z002. """
+    columns = pd.MultiIndex.from_product([['Z000', 'Z001'], ['offshore', 'onshore', 'pv']],
+                                         names=['region', 'variable'])
+    values = [[1e3, 2e3, 3e3, np.nan, 4e3, 5e3], [2e3, 1e3, 6e3, np.nan, 8e3, 1e3]]
+    return pd.DataFrame(values, index=pd.Index(['A', 'B'], name='scenario'), columns=columns)
+
+
+def _expected(df, caps):
+    """ Flexibility requirements of one scenario as in the notebook: scale, add the custom region and variables,
+    decompose. """
+    scaled = df.multiply(caps.reindex(df.columns).fillna(1).where(df.columns.isin(caps.index) | (
+        df.columns.get_level_values('variable') == 'load')), axis=1).dropna(axis=1)
+    scaled = scaled.loc[:, scaled.columns.get_level_values('region').isin(caps.index.get_level_values('region'))]
+    aggregation = ColumnAggregation(scaled.columns)
+    for name, region in CUSTOM_REGIONS.items():
+        aggregation.add_region(name, region['group'], method=region['method'])
+    for name, sum_of in SCENARIO_VARIABLES.items():
+        aggregation.add_variable(name, sum_of)
+    derived = aggregation.apply(scaled)
+    derived = derived.loc[:, derived.columns.get_level_values('variable').isin(list(SCENARIO_VARIABLES))]
+    return flexibility_requirements(add_decomposed_ts(derived))
+
+
+@pytest.mark.parametrize('memory_budget', [DEFAULT_MEMORY_BUDGET, 1])
+def test_scenarios_match_scaling_each_scenario(df, capacities, memory_budget):
+    result = scenario_flexibility_requirements(df, capacities, custom_regions=CUSTOM_REGIONS,
+                                               memory_budget=memory_budget)
+    assert 'Z002' not in result.columns.get_level_values('region')
+    for scenario in capacities.index:
+        expected = _expected(df, capacities.loc[scenario].dropna())
+        pd.testing.assert_frame_equal(result[scenario].loc[:, expected.columns], expected, rtol=1e-6, atol=1e-6)
+    assert result[capacities.index[0]].shape == expected.shape
+
+
+def test_unknown_custom_region_members_raise(df, capacities):
+    with pytest.raises(KeyError):
+        scenario_flexibility_requirements(df, capacities, custom_regions={'c': {'group': ['Z000', 'Z002']}})
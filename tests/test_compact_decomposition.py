@@ -0,0 +1,38 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src.helpers.compact_decomposition import CompactDecomposition
+from src.helpers.fft import add_decomposed_ts
+from src.helpers.lazy_frame import LazyFrame, _in_key_order
+
+
+@pytest.fixture(scope='module')
+def decomposed(pecd_df):
+    return add_decomposed_ts(pecd_df)
+
+
+def test_from_timeseries_matches_decomposition(pecd_df, decomposed):
+    compact = CompactDecomposition.from_timeseries(pecd_df)
+    assert compact.columns.equals(decomposed.columns)
+    assert np.allclose(compact.loc(axis=1)[:, :, :].to_numpy(), decomposed.to_numpy(), rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.parametrize('key', [
+    (['Z001', 'Z000'], ['pv', 'load'], ['raw_data', 'daily']),
+    ('Z001', slice(None), ['weekly', 'hourly']),
+    (slice(None), ['pv', 'load'], 'daily'),
+])
+def test_column_positions_in_key_order(decomposed, key):
+    """ Level by level in the order of the lists in key, with the axis maps and with get_locs. """
+    levels = [decomposed.columns.get_level_values(i).unique() if k == slice(None) else [k] if np.ndim(k) == 0 else k
+              for i, k in enumerate(key)]
+    expected = decomposed.columns.get_indexer(list(itertools.product(*levels)))
+    compact = CompactDecomposition.from_frame(decomposed)
+    assert np.array_equal(compact.column_positions(key), expected)
+    assert np.array_equal(LazyFrame.column_positions(compact, key), expected)
+    assert np.array_equal(_in_key_order(decomposed.columns, key, np.sort(expected)), expected)  # older pandas
+    selected = compact.loc(axis=1)[key]
+    assert selected.columns.equals(decomposed.columns[expected])
+    assert np.allclose(selected.to_numpy(), decomposed.iloc[:, expected].to_numpy(), rtol=1e-5, atol=1e-3)
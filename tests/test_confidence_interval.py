@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks import original
+from src.helpers.confidence_interval import grouped_confidence_interval
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    index = pd.MultiIndex.from_product([range(5), [0, 50, 100]], names=['year', 'percentile'])
+    df = pd.DataFrame(rng.normal(size=(len(index), 3)), index=index,
+                      columns=pd.Index(['a', 'b', 'c'], name='region'))
+    df['c'] = 1.0  # no variance
+    return df
+
+
+def test_matches_original_confidence_interval():
+    df = _frame()
+    expected = original.percentile_confidence_interval(df.loc(axis=1)[['a', 'b']])
+    result = grouped_confidence_interval(df.loc(axis=1)[['a', 'b']], level='percentile')
+    assert result.columns.equals(expected.columns)
+    assert np.allclose(result.to_numpy(), expected.to_numpy())
+
+
+def test_groups_without_variance_get_the_mean_as_bounds():
+    result = grouped_confidence_interval(_frame(), level='percentile')['c']
+    assert (result.to_numpy() == 1.0).all()
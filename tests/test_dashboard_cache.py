@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.dashboards.base_dashboard import DashboardBaseClass
+from src.helpers.columns import append_column_level
+from src.helpers.fft import add_decomposed_ts
+
+
+@pytest.fixture
+def decomposed_df(pecd_df):
+    return add_decomposed_ts(pecd_df)
+
+
+def counting_mean(calls):
+    def mean(df):
+        calls.append(len(df.columns))
+        return df.mean().to_frame().T.set_axis(append_column_level(df.columns, ['mean'], 'aggregation'), axis=1)
+    return mean
+
+
+def select(dashboard, regions, variables, spectra):
+    dashboard.fig_regions, dashboard.fig_variables, dashboard.fig_spectra = regions, variables, spectra
+
+
+def test_cached_columns_are_not_aggregated_again(decomposed_df):
+    calls = []
+    dashboard = DashboardBaseClass(decomposed_df)
+    select(dashboard, ['Z000'], ['pv'], ['daily', 'raw_data'])
+    first = dashboard._aggregate_selection('mean', counting_mean(calls))
+    assert dashboard._aggregate_selection('mean', counting_mean(calls)).equals(first)
+    select(dashboard, ['Z000', 'Z001'], ['pv'], ['daily', 'raw_data'])
+    result = dashboard._aggregate_selection('mean', counting_mean(calls))
+    assert calls == [2, 2]
+    expected = decomposed_df.loc(axis=1)[['Z000', 'Z001'], ['pv'], ['daily', 'raw_data']].mean()
+    assert np.allclose(result.to_numpy()[0], expected.to_numpy())
+    dashboard.data_frame = decomposed_df
+    dashboard._aggregate_selection('mean', counting_mean(calls))
+    assert calls == [2, 2, 4]
+
+
+def test_cache_stays_within_result_cache_bytes(decomposed_df):
+    calls = []
+    dashboard = DashboardBaseClass(decomposed_df, result_cache_bytes=2 * 8)
+    select(dashboard, ['Z000', 'Z001'], ['pv', 'load'], ['daily'])
+    dashboard._aggregate_selection('mean', counting_mean(calls))
+    assert len(dashboard._result_cache) == 2
+    assert dashboard._result_cache_nbytes <= dashboard.result_cache_bytes
@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.helpers import DecompositionStore, add_decomposed_ts, decompose_to_store
+
+
+def test_store_matches_in_memory_decomposition(tmp_path, pecd_df):
+    df = pecd_df.iloc[:, :3]
+    store = decompose_to_store(df, str(tmp_path / 'store'), memory_budget=1)  # one column per chunk
+    expected = add_decomposed_ts(df)
+    result = store.to_frame()
+    assert result.columns.equals(expected.columns)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def test_rebuilding_a_store_keeps_the_open_one(tmp_path, pecd_df):
+    path = str(tmp_path / 'store')
+    old = decompose_to_store(pecd_df.iloc[:, :2], path)
+    expected = old.to_frame()
+    decompose_to_store(pecd_df.iloc[:24 * 365, :1], path)
+    np.testing.assert_array_equal(old.to_frame().to_numpy(), expected.to_numpy())
+    assert DecompositionStore(path).shape[0] == 24 * 365
@@ -0,0 +1,24 @@
+import numpy as np
+
+from src.dashboards.energy_yield import EnergyYieldDashboard
+from src.helpers.fft import add_decomposed_ts
+from src.pecd_handling.aggregation import ColumnAggregation
+
+
+def test_added_columns_match_a_new_dashboard(pecd_df):
+    decomposed = add_decomposed_ts(pecd_df)
+    dashboard = EnergyYieldDashboard(decomposed)
+    aggregation = ColumnAggregation.from_decomposition(decomposed)
+    aggregation.add_region('custom', ['Z000', 'Z001'])
+    extended = aggregation.apply(decomposed)
+    dashboard.add_columns(extended)
+    expected = EnergyYieldDashboard(extended).yield_per_year
+    assert dashboard.yield_per_year.columns.equals(expected.columns)
+    assert np.allclose(dashboard.yield_per_year, expected)
+
+
+def test_changed_columns_are_recomputed(pecd_df):
+    decomposed = add_decomposed_ts(pecd_df)
+    dashboard = EnergyYieldDashboard(decomposed)
+    dashboard.add_columns(decomposed * 2)
+    assert np.allclose(dashboard.yield_per_year, EnergyYieldDashboard(decomposed).yield_per_year * 2)
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from benchmarks import original
+from src.helpers.fft import add_decomposed_ts
+
+
+@pytest.mark.parametrize('accumulate_spectra', [True, False])
+@pytest.mark.parametrize('remove_dc', [True, False])
+def test_matches_original_decomposition(pecd_df, accumulate_spectra, remove_dc):
+    expected = original.add_decomposed_ts(pecd_df, remove_dc=remove_dc, accumulate_spectra=accumulate_spectra)
+    result = add_decomposed_ts(pecd_df, remove_dc=remove_dc, accumulate_spectra=accumulate_spectra)
+    assert result.columns.equals(expected.columns)
+    assert np.allclose(result.to_numpy(), expected.to_numpy(), rtol=0, atol=1e-9 * pecd_df.abs().max(axis=None))
+
+
+def test_unsorted_columns_are_sorted(pecd_df):
+    shuffled = pecd_df.iloc[:, ::-1]
+    assert add_decomposed_ts(shuffled).equals(add_decomposed_ts(pecd_df))
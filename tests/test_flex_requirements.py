@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import original
+from src.helpers.fft import add_decomposed_ts
+from src.helpers.flex_requirements import flexibility_requirements, sorted_percentiles
+
+
+@pytest.fixture(scope='module')
+def decomposed(pecd_df):
+    return add_decomposed_ts(pecd_df.loc(axis=1)[['Z000'], ['load', 'pv']])
+
+
+@pytest.mark.filterwarnings('ignore:All-NaN slice:RuntimeWarning')  # columns without hours <= 0
+def test_matches_original_percentiles(decomposed):
+    expected = original.flexibility_requirements(decomposed)
+    result = flexibility_requirements(decomposed)
+    assert result.index.equals(expected.index)
+    pd.testing.assert_frame_equal(result.loc[:, expected.columns], expected, check_names=False)
+
+
+def test_sorted_percentiles_match_nanpercentile():
+    values = np.random.default_rng(0).normal(size=(50, 3))
+    values[::3, 1] = np.nan
+    values[:, 2] = np.nan
+    percentiles = [0, 12.5, 50, 99, 100]
+    result = sorted_percentiles(np.sort(values, axis=0), percentiles)
+    with np.errstate(invalid='ignore'), pytest.warns(RuntimeWarning):
+        expected = np.nanpercentile(values, percentiles, axis=0)
+    assert np.allclose(result, expected, equal_nan=True)
@@ -0,0 +1,38 @@
+import io
+import logging
+
+import numpy as np
+
+from src.helpers import instrumentation
+
+
+def test_messages_are_not_repeated_by_the_root_logger(capsys, monkeypatch):
+    src_logger = logging.getLogger('src')
+    monkeypatch.setattr(src_logger, 'handlers', [])
+    monkeypatch.setattr(src_logger, 'level', logging.NOTSET)
+    monkeypatch.setattr(src_logger, 'propagate', True)
+    root_output = io.StringIO()
+    root_handler = logging.StreamHandler(root_output)
+    logging.getLogger().addHandler(root_handler)
+    try:
+        instrumentation.get_logger('src.test').info('hello')
+    finally:
+        logging.getLogger().removeHandler(root_handler)
+    assert capsys.readouterr().out == 'hello\n'
+    assert root_output.getvalue() == ''
+
+
+def test_stage_records_memory_change_and_process_peak():
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        with instrumentation.stage('allocate'):
+            data = np.ones(2**24)  # 128 MB
+    finally:
+        instrumentation.disable()
+    record = instrumentation.report()['stages'][-1]
+    instrumentation.reset()
+    del data
+    if record['rss_mb'] is not None:
+        assert record['rss_delta_mb'] > 100
+    assert 'peak_rss_mb' not in record and 'process_peak_rss_mb' in record
@@ -0,0 +1,25 @@
+import numpy as np
+
+from src.helpers.fft import add_decomposed_ts
+from src.helpers.lazy_decomposition import LazyDecomposition
+
+
+def test_selected_bands_match_decomposition(pecd_df):
+    expected = add_decomposed_ts(pecd_df, remove_dc=False)
+    lazy = add_decomposed_ts(pecd_df, remove_dc=False, lazy=True)
+    assert lazy.columns.equals(expected.columns)
+    key = (['Z000'], ['pv', 'load'], ['daily', 'raw_data', 'seasonally'])
+    selected = lazy.loc(axis=1)[key]
+    assert selected.columns.equals(expected.loc(axis=1)[key].columns)
+    assert np.allclose(selected.to_numpy(), expected.loc(axis=1)[key].to_numpy())
+    assert np.allclose(lazy.to_frame().to_numpy(), expected.to_numpy())
+
+
+def test_cache_stays_within_cache_bytes(pecd_df):
+    band_bytes = len(pecd_df) * 8
+    lazy = LazyDecomposition(pecd_df, cache_bytes=3 * band_bytes)
+    first = lazy.loc(axis=1)[:, 'pv', 'daily'].to_numpy()
+    assert lazy.cached_bytes == 2 * band_bytes
+    lazy.loc(axis=1)[:, ['load', 'onshore'], 'hourly']
+    assert lazy.cached_bytes == 3 * band_bytes
+    assert np.array_equal(lazy.loc(axis=1)[:, 'pv', 'daily'].to_numpy(), first)  # recomputed after eviction
@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.import_time import BUDGETS, measure_import
+import src.helpers
+import src.pecd_handling
+
+
+@pytest.mark.parametrize('module', ['src.helpers', 'src.pecd_handling', 'src.helpers.fft', 'src.helpers.parallel_fft'])
+def test_core_does_not_import_heavy_modules(module):
+    imported = measure_import(module, repeat=1)['modules']
+    assert not [m for m in BUDGETS[module]['forbidden'] if m in imported]
+
+
+def test_names_are_imported_on_first_use():
+    from src.pecd_handling.aggregation import ColumnAggregation
+    assert src.pecd_handling.ColumnAggregation is ColumnAggregation
+    assert 'ColumnAggregation' in dir(src.pecd_handling)
+    with pytest.raises(AttributeError):
+        src.helpers.not_exported
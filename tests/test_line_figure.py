@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.dashboards import line_figure
+from src.dashboards.line_figure import DownsampledLineFigure
+
+
+def _figure():
+    data = pd.DataFrame(np.random.default_rng(0).normal(size=(5000, 2)),
+                        columns=pd.Index(['A', 'B'], name='region'))
+    return DownsampledLineFigure(data, color='region', width=100)
+
+
+def test_traces_are_decimated():
+    fig = _figure().figure()
+    assert isinstance(fig, go.Figure)
+    assert all(len(trace.x) <= 400 for trace in fig.data)
+
+
+def test_static_figure_without_anywidget(monkeypatch):
+    def figure_widget(fig):
+        raise ImportError('Please install anywidget to use the FigureWidget class')
+    monkeypatch.setattr(line_figure.go, 'FigureWidget', figure_widget)
+    figure = _figure()
+    fig = figure.figure(widget=True)
+    assert isinstance(fig, go.Figure)
+    assert figure.figure_widget is None
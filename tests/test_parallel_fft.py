@@ -0,0 +1,22 @@
+import os
+
+import numpy as np
+
+from src.helpers import parallel_fft
+from src.helpers.fft import add_decomposed_ts
+
+
+def test_parallel_decomposition_matches_serial(pecd_df):
+    serial = add_decomposed_ts(pecd_df)
+    parallel = add_decomposed_ts(pecd_df, n_jobs=2)
+    assert parallel.columns.equals(serial.columns)
+    assert np.array_equal(parallel.to_numpy(), serial.to_numpy())
+
+
+def test_bands_are_not_copied_out_of_the_workers_file(pecd_df, tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel_fft, 'SHARED_MEMORY_DIR', str(tmp_path))
+    values = pecd_df.to_numpy()
+    bands = parallel_fft.parallel_decomposition(values, [slice(0, 10)], 2, np.array([0, 1]), n_jobs=2)
+    assert isinstance(bands.base, np.memmap)
+    assert os.listdir(tmp_path) == []  # removed, the memory map keeps the content
+    assert np.allclose(bands[:, :, 1], values)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.original import read_pecd_xls_file as original_read_pecd_xls_file
+from benchmarks.synthetic import write_pecd_excel
+from src.pecd_handling import pecd_import
+
+
+class _Executor(object):
+    """ Runs the submitted calls in this process and counts the results that were not consumed yet. """
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, n_jobs, initializer=None, initargs=()):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def submit(self, func, item):
+        executor = type(self)
+        executor.in_flight += 1
+        executor.max_in_flight = max(executor.max_in_flight, executor.in_flight)
+        return _Future(func(item))
+
+
+class _Future(object):
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        _Executor.in_flight -= 1
+        return self.value
+
+
+def test_ordered_map_keeps_n_jobs_results_in_flight(monkeypatch):
+    monkeypatch.setattr(pecd_import, 'ProcessPoolExecutor', _Executor)
+    results = pecd_import._ordered_map(abs, list(range(-10, 0)), n_jobs=3)
+    assert list(results) == list(range(10, 0, -1))
+    assert _Executor.max_in_flight == 3
+
+
+def test_single_core_parses_in_this_process(tmp_path, monkeypatch, regions_df):
+    path = str(tmp_path / 'pv.xlsx')
+    write_pecd_excel(path, regions_df)
+    monkeypatch.setattr(pecd_import, '_available_cpus', lambda: 1)
+    monkeypatch.setattr(pecd_import, 'ProcessPoolExecutor', None)  # fails if a pool is started
+    df = pecd_import.read_pecd_xls_file(path, cache=None)
+    expected = original_read_pecd_xls_file(path)
+    assert np.allclose(df.to_numpy(), expected.loc[df.index, df.columns].to_numpy())
+    assert df.index.equals(pd.DatetimeIndex(expected.index).as_unit(df.index.unit))
@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_pecd_excel
+from src.pipeline.config import load_config
+from src.pipeline.frames import read_frame, write_frame
+from src.pipeline.runner import run_pipeline
+
+
+def test_frame_roundtrip(tmp_path, pecd_df):
+    path = str(tmp_path / 'frame')
+    write_frame(path, pecd_df)
+    pd.testing.assert_frame_equal(read_frame(path), pecd_df, check_freq=False)
+
+
+def test_rewriting_a_frame_keeps_frames_read_earlier(tmp_path, pecd_df):
+    path = str(tmp_path / 'frame')
+    write_frame(path, pecd_df)
+    old = read_frame(path)
+    write_frame(path, pecd_df.iloc[:100, :1] * 2)
+    np.testing.assert_array_equal(old.to_numpy(), pecd_df.to_numpy())
+
+
+@pytest.fixture
+def config_path(tmp_path, pecd_df):
+    for variable in ('load', 'pv'):
+        df = pecd_df.xs(variable, axis=1, level='variable')
+        write_pecd_excel(str(tmp_path / f'{variable}.xlsx'), df)
+    config = {
+        'output_dir': 'results',
+        'inputs': {'load': 'load.xlsx', 'pv': 'pv.xlsx'},
+        'custom_variables': {'residual_load': {'load': 1, 'pv': -1}},
+    }
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def test_pipeline_skips_unchanged_stages(config_path, tmp_path, pecd_df):
+    config = load_config(config_path)
+    first = run_pipeline(config)
+    assert {r['status'] for s, r in first.items() if s != 'total'} == {'ran'}
+    second = run_pipeline(config)
+    assert {r['status'] for s, r in second.items() if s != 'total'} == {'skipped'}
+
+    write_pecd_excel(str(tmp_path / 'pv.xlsx'), pecd_df.xs('pv', axis=1, level='variable') * 0.5)
+    third = run_pipeline(config)
+    assert third['import_load']['status'] == 'skipped'
+    assert third['import_pv']['status'] == 'ran'
+    assert third['decompose']['status'] == 'ran'
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks import original
+from src.helpers.time_model import datetime_index_to_hour_of_year, get_time_model, hour_of_year
+
+
+def test_matches_original_hour_of_year(regions_df):
+    expected = original.datetime_index_to_hour_of_year(regions_df)
+    result = datetime_index_to_hour_of_year(regions_df)
+    assert np.array_equal(result.index.get_level_values('year'), expected.index.get_level_values('year'))
+    assert np.array_equal(result.index.get_level_values('hour_of_year'),
+                          expected.index.get_level_values('hour_of_year'))
+
+
+def test_leap_days_share_the_hours_of_february_28():
+    index = pd.date_range('2020-02-28', '2020-03-01 23:00', freq='h')
+    hours = hour_of_year(index)
+    assert np.array_equal(hours[:24], hours[24:48])
+    assert hours[48] == 59 * 24 + 1
+
+
+def test_regular_index_is_viewed_as_cube(regions_df):
+    time_model = get_time_model(regions_df.index)
+    values = regions_df.to_numpy()
+    assert time_model.is_regular
+    cube = time_model.reshape(values)
+    assert np.shares_memory(cube, values)
+    assert cube.shape == (len(time_model.years), 8760, values.shape[1])
+    assert get_time_model(regions_df.index.copy()) is time_model
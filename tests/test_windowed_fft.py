@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.helpers.fft import DURATION_CUTS, add_decomposed_ts
+from src.helpers.windowed_fft import windowed_decomposition
+
+SHORT_CUTS = {k: DURATION_CUTS[k] for k in ('daily', 'hourly')}
+
+
+def _relative_rms(result, expected, spectrum):
+    error = result.xs(spectrum, axis=1, level='spectrum') - expected.xs(spectrum, axis=1, level='spectrum')
+    return np.sqrt((error.to_numpy() ** 2).mean() / (expected.xs(spectrum, axis=1, level='spectrum') ** 2).mean(
+        axis=None))
+
+
+@pytest.mark.parametrize('window', ['year', 24 * 28])
+def test_accumulated_bands_close_to_whole_history(pecd_df, window):
+    expected = add_decomposed_ts(pecd_df)
+    result = add_decomposed_ts(pecd_df, window=window)
+    assert result.columns.equals(expected.columns)
+    assert np.allclose(result.xs('raw_data', axis=1, level='spectrum'), pecd_df.sort_index(axis=1))
+    for spectrum in DURATION_CUTS:
+        assert _relative_rms(result, expected, spectrum) < 0.2
+
+
+def test_separate_short_bands_close_to_whole_history(pecd_df):
+    expected = add_decomposed_ts(pecd_df, SHORT_CUTS, accumulate_spectra=False)
+    result = add_decomposed_ts(pecd_df, SHORT_CUTS, accumulate_spectra=False, window=24 * 28, n_jobs=2)
+    for spectrum in SHORT_CUTS:
+        assert _relative_rms(result, expected, spectrum) < 0.15
+
+
+@pytest.mark.parametrize('window', ['year', 24 * 28])
+def test_unresolved_bands_raise(pecd_df, window, tmp_path):
+    with pytest.raises(ValueError, match='monthly'):
+        add_decomposed_ts(pecd_df, accumulate_spectra=False, window=window)
+    path = str(tmp_path / 'store')
+    with pytest.raises(ValueError):
+        windowed_decomposition(pecd_df, window, accumulate_spectra=False, path=path)
+    assert not os.path.exists(path)
+
+
+def test_threads_match_serial(pecd_df):
+    serial = add_decomposed_ts(pecd_df, window='year')
+    threaded = add_decomposed_ts(pecd_df, window='year', n_jobs=3)
+    assert np.array_equal(serial.to_numpy(), threaded.to_numpy())